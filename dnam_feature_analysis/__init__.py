@@ -7,24 +7,35 @@ DNA Methylation Feature Analysis.
 """
 
 __all__ = [
-    "bed_combiner", "bin_generator", "delta_methylation_and_phenotype",
-    "helpers", "methylation_binner", "paired_t_tester", "phenotype_regressor",
-    "user_interface"
+    "bed_combiner", "bed_reader", "bin_generator", "bin_index",
+    "delta_methylation_and_phenotype", "genomic_keys", "helpers",
+    "hit_collector", "matrix_store", "methylation_binner", "paired_t_tester",
+    "permutation_tester", "phenotype_regressor", "result_logger",
+    "shared_arrays", "storage", "user_interface"
 ]
 
 # Native python libs
+import gzip
+import heapq
+import json
 import math
 import multiprocessing
+from multiprocessing import resource_tracker, shared_memory
 import os
+import queue
 import sys
+import tempfile
+import threading
 import timeit
-from typing import List, Tuple
+from typing import Callable, Dict, Iterator, List, TextIO, Tuple
 import warnings
+import zipfile
 
 # External libs
-from natsort import natsorted
+from natsort import natsort_keygen, natsorted
 import numpy as np
 import pandas as pd
 from pandas import DataFrame as df
+import scipy.linalg as spl
 import scipy.stats as sps
 import statsmodels.formula.api as smf
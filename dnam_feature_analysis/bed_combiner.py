@@ -6,72 +6,304 @@ Objective: to combine BED files from all cultivars.
 
 Inputs:
 - List of cultivar names
-- Paths to Lethbridge and Vegreville cultivar BED file directories
+- Paths to Lethbridge and Vegreville cultivar BED file directories, holding
+  plain or gzip/bgzip-compressed BED files (see `bed_reader`)
 
 Output:
-- Write combined output for each location as a TSV file
+- Write combined output for each location as a TSV file (or another
+  `storage` format)
 
 Output Columns:
-- Scaffold_Position
+- Scaffold_Position (or "#Scaffold" and "Position" with the columns key format)
 - 1 column per cultivar, holding the beta value (methylation level) at the
   genomic location.
 
+With a coverage column, a companion coverage table with the same sites and
+layout holds each cultivar's read depth at every site instead. Both columns
+are read from each BED file in the same pass.
+
+Sites are keyed internally by integer genomic keys (see `genomic_keys`); the
+string keys are only built when the output is written.
+
+Merge modes:
+- concat: concatenate each cultivar into the output dataframe and reindex.
+- stream: k-way merge of the coordinate-sorted cultivar BED files, written in
+  a single pass. Memory is bounded by the number of cultivars.
+- pool: parse every (location, cultivar) BED file concurrently in a bounded
+  process pool, then merge the parsed columns on their genomic keys.
+- checkpoint: every cultivar's parsed columns are checkpointed on their own
+  as soon as they are read, then the output is built from the checkpoints
+  and written once at the end. A crashed run resumes from the cultivars
+  already checkpointed.
+
 """
 
-from . import multiprocessing, List, sys, timeit, Tuple, natsorted, df, pd
-from . import helpers
+from . import heapq, multiprocessing, os, Dict, Iterator, List, sys, \
+    tempfile, timeit, Tuple, natsort_keygen, df, np, pd
+from . import bed_reader, genomic_keys, helpers, storage
+
+merge_modes = ("concat", "stream", "pool", "checkpoint")
+levels_table = "sorted_methylation_levels"
+coverage_table = "sorted_methylation_coverage"
+checkpoint_suffix = ".checkpoint"
 
 
 class BedCombiner:
-    def __init__(self, location_label: str, bed_dir_path: str) -> None:
+    def __init__(
+            self, location_label: str, bed_dir_path: str,
+            key_format: str = "string",
+            chunk_size: int = bed_reader.default_chunk_size,
+            output_format: str = "tsv", coverage_column: int = None
+        ) -> None:
         self.location_label = location_label
         self.bed_dir_path = helpers.remove_trailing_slash((bed_dir_path))
-        self.cultivar_df = None
-        self.output_df = df()
+        self.key_format = key_format
+        self.chunk_size = chunk_size
+        self.output_format = output_format
+        self.value_columns = [bed_reader.beta_value_column]
+        self.output_tables = [levels_table]
+        if coverage_column is not None:
+            self.value_columns.append(coverage_column)
+            self.output_tables.append(coverage_table)
+
+        self.scaffold_dictionary = genomic_keys.ScaffoldDictionary()
+        self.cultivar_df = None # Values named by their output table.
+        self.output_dfs = [df() for output_table in self.output_tables]
+
+
+    def __cultivar_bed_file_path(self, cultivar: str) -> str:
+        """
+        Path of the given cultivar's BED file at the current location.
+        """
+        return bed_reader.find_cultivar_bed_file(
+            self.bed_dir_path, cultivar, self.location_label
+        )
 
 
     def __read_current_cultivar_file(
             self, cultivar: str, cultivar_bed_file_path: str
         ) -> None:
         """
-        Reads the current cultivar BED file.
+        Reads the current cultivar BED file, with every value column.
         """
-        self.cultivar_df = pd.read_table(
-            cultivar_bed_file_path, names = ["#Scaffold", "Position", cultivar],
-            usecols = [0, 2, 7] # Scaffold, position, and beta value
+        self.cultivar_df = bed_reader.read_bed_file(
+            cultivar_bed_file_path, self.output_tables, self.chunk_size,
+            self.value_columns
         )
 
 
     def __index_cultivar_df(self) -> None:
         """
-        Combines the "#Scaffold" and "Position" columns and sets the resulting
-        column as the index of the current cultivar dataframe.
+        Packs the "#Scaffold" and "Position" columns into integer genomic keys
+        and sets them as the index of the current cultivar dataframe.
         """
-        self.cultivar_df.index = self.cultivar_df["#Scaffold"] + '_' + \
-            self.cultivar_df["Position"].map(str)
+        self.cultivar_df.index = genomic_keys.pack_keys(
+            self.scaffold_dictionary.encode(self.cultivar_df["#Scaffold"]),
+            self.cultivar_df["Position"].to_numpy()
+        )
 
         self.cultivar_df.drop(
             ["#Scaffold", "Position"], axis = 1, inplace = True
         )
 
-    # `natsort` module used for reindexing.
-    def __concat_cultivar_output_dfs(self) -> None:
+
+    def __concat_cultivar_output_dfs(self, cultivar: str) -> None:
+        """
+        Concatenates the current cultivar's values to the output dataframes,
+        reindexing the output dataframes in natural scaffold order. Every
+        output dataframe holds the same sites.
+        """
+        self.output_dfs = [
+            pd.concat(
+                [output_df, self.cultivar_df[output_table].rename(cultivar)],
+                axis = 1
+            ) for output_df, output_table in zip(
+                self.output_dfs, self.output_tables
+            )
+        ]
+        self.__sort_output_dfs()
+
+
+    def __sort_output_dfs(self) -> None:
+        """
+        Reindexes the output dataframes in natural scaffold order.
+        """
+        print("Reindexing output dataframes...")
+        order = genomic_keys.natural_sort_order(
+            self.output_dfs[0].index.to_numpy(), self.scaffold_dictionary
+        )
+        self.output_dfs = [
+            output_df.iloc[order] for output_df in self.output_dfs
+        ]
+
+
+    def __output_file_name(self, output_table: str) -> str:
+        """
+        Name of a combined output file in the requested storage format.
+        """
+        return storage.output_file_name(
+            helpers.string_builder((output_table, ".tsv")), self.output_format
+        )
+
+
+    def __key_columns(self) -> int:
         """
-        Concatenates the current cultivar dataframe to the output dataframe,
-        reindexing the output dataframe.
+        Number of key columns of the combined tables, counting the string key
+        index. Beta values and read depths alike are stored as values.
         """
-        self.output_df = pd.concat([self.output_df, self.cultivar_df], axis = 1)
+        return 1 if self.key_format == "string" else 2
+
+
+    def __open_output(self, output_table: str) -> storage.TableWriter:
+        """
+        Opens a combined output file for chunked writing.
+        """
+        return helpers.open_output(
+            self.__output_file_name(output_table), self.bed_dir_path,
+            write_index = self.key_format == "string",
+            key_columns = self.__key_columns()
+        )
 
-        print("Reindexing output dataframe...")
-        self.output_df = self.output_df.reindex(
-            index = natsorted(self.output_df.index)
+
+    def __write_output_df(
+            self, output_df: pd.DataFrame, output_table: str
+        ) -> None:
+        """
+        Writes an output dataframe with its genomic keys in the requested key
+        format.
+        """
+        helpers.write_output(
+            output_df = genomic_keys.key_output_df(
+                output_df.index.to_numpy(), output_df,
+                self.scaffold_dictionary, self.key_format
+            ),
+            output_file_name = self.__output_file_name(output_table),
+            output_dir_path = self.bed_dir_path,
+            write_index = self.key_format == "string",
+            key_columns = self.__key_columns()
         )
 
 
-    def loc_bed_combiner(self, cultivars: List[str]) -> None:
+    def __write_output_dfs(self) -> None:
+        """
+        Writes every output dataframe.
+        """
+        for output_df, output_table in zip(
+                self.output_dfs, self.output_tables
+            ):
+            self.__write_output_df(output_df, output_table)
+
+
+    def __checkpoint_dir_path(self) -> str:
+        """
+        Path of the current location's merge checkpoint directory.
+        """
+        return helpers.string_builder((
+            self.bed_dir_path, '/', levels_table, checkpoint_suffix
+        ))
+
+
+    def __checkpoint_file_path(self, cultivar: str) -> str:
+        """
+        Path of a cultivar's checkpoint.
+        """
+        return helpers.string_builder((
+            self.__checkpoint_dir_path(), '/', cultivar, ".npz"
+        ))
+
+
+    def __save_checkpoint(self, cultivar: str) -> None:
+        """
+        Checkpoints the current cultivar on its own: its genomic keys, its
+        values for every output table and the scaffold dictionary so far.
+        The checkpoint is written atomically so a crash never leaves it
+        partial.
+        """
+        os.makedirs(self.__checkpoint_dir_path(), exist_ok = True)
+        checkpoint_file_path = self.__checkpoint_file_path(cultivar)
+        tmp_file_path = helpers.string_builder((checkpoint_file_path, ".tmp"))
+        with open(tmp_file_path, "wb") as checkpoint_file:
+            np.savez(
+                checkpoint_file, keys = self.cultivar_df.index.to_numpy(),
+                values = self.cultivar_df[self.output_tables].to_numpy(
+                    np.float64
+                ),
+                scaffolds = np.array(
+                    self.scaffold_dictionary.scaffolds, dtype = str
+                )
+            )
+
+        os.replace(tmp_file_path, checkpoint_file_path)
+
+
+    def __checkpointed_cultivars(self, cultivars: List[str]) -> List[str]:
+        """
+        Cultivars with a checkpoint, in cultivar order.
+        """
+        return [
+            cultivar for cultivar in cultivars
+            if os.path.isfile(self.__checkpoint_file_path(cultivar))
+        ]
+
+
+    def __restore_scaffold_dictionary(self, cultivars: List[str]) -> None:
+        """
+        Restores the scaffold dictionary from the checkpoints of `cultivars`.
+        The dictionary only grows, so the longest one codes the keys of every
+        checkpoint.
+        """
+        for cultivar in cultivars:
+            with np.load(self.__checkpoint_file_path(cultivar)) as checkpoint:
+                scaffolds = checkpoint["scaffolds"].tolist()
+
+            if len(scaffolds) > len(self.scaffold_dictionary.scaffolds):
+                self.scaffold_dictionary = genomic_keys.ScaffoldDictionary(
+                    scaffolds
+                )
+
+
+    def __load_checkpoints(self, cultivars: List[str]) -> None:
+        """
+        Builds the output dataframes from the checkpoints of `cultivars`.
+        """
+        table_columns = [[] for output_table in self.output_tables]
+        for cultivar in cultivars:
+            with np.load(self.__checkpoint_file_path(cultivar)) as checkpoint:
+                for table_idx, columns in enumerate(table_columns):
+                    columns.append(pd.Series(
+                        checkpoint["values"][:, table_idx],
+                        index = checkpoint["keys"], name = cultivar
+                    ))
+
+        self.output_dfs = [
+            pd.concat(columns, axis = 1) for columns in table_columns
+        ]
+        self.__sort_output_dfs()
+
+
+    def __remove_checkpoints(self, cultivars: List[str]) -> None:
+        """
+        Removes the checkpoints of `cultivars`, then the checkpoint directory
+        once empty.
+        """
+        for cultivar in self.__checkpointed_cultivars(cultivars):
+            os.remove(self.__checkpoint_file_path(cultivar))
+
+        checkpoint_dir_path = self.__checkpoint_dir_path()
+        if os.path.isdir(checkpoint_dir_path) \
+                and not os.listdir(checkpoint_dir_path):
+            os.rmdir(checkpoint_dir_path)
+
+
+    def loc_bed_combiner(
+            self, cultivars: List[str], checkpoint: bool = False
+        ) -> None:
         """
         Performs the steps for combining all cultivar BED files at the current
-        location iteratively.
+        location iteratively. With `checkpoint`, every cultivar is
+        checkpointed on its own instead, skipping cultivars already
+        checkpointed, and the output is built from the checkpoints and
+        written once at the end.
         """
         print(helpers.string_builder((
             self.location_label, " BED combining start."
@@ -84,12 +316,25 @@ class BedCombiner:
             )), 'w'
         )
 
+        completed_cultivars = []
+        if checkpoint:
+            completed_cultivars = self.__checkpointed_cultivars(cultivars)
+            if completed_cultivars:
+                print(helpers.string_builder((
+                    "Resuming from checkpoints of ",
+                    str(len(completed_cultivars)), " completed cultivars."
+                )))
+                self.__restore_scaffold_dictionary(completed_cultivars)
+
         print("Looping through cultivar BED files...")
         for cultivar in cultivars:
-            cultivar_bed_file_path = helpers.string_builder((
-                self.bed_dir_path, "/cultivars/", cultivar, '_',
-                self.location_label, ".bed"
-            ))
+            if cultivar in completed_cultivars:
+                print(helpers.string_builder((
+                    "\nSkipping ", cultivar, ", restored from checkpoint."
+                )))
+                continue
+
+            cultivar_bed_file_path = self.__cultivar_bed_file_path(cultivar)
 
             print(helpers.string_builder(("\nCurrently reading: ", cultivar)))
             self.__read_current_cultivar_file(cultivar, cultivar_bed_file_path)
@@ -97,44 +342,353 @@ class BedCombiner:
             print(helpers.string_builder(("Arranging index for ", cultivar)))
             self.__index_cultivar_df()
 
+            if checkpoint:
+                print(helpers.string_builder(("Checkpointing ", cultivar)))
+                self.__save_checkpoint(cultivar)
+                continue
+
             print(helpers.string_builder((
-                "Concatenating ", cultivar, " data to output dataframe..."
+                "Concatenating ", cultivar, " data to output dataframes..."
             )))
-            self.__concat_cultivar_output_dfs()
+            self.__concat_cultivar_output_dfs(cultivar)
+            self.__write_output_dfs()
+
+        if checkpoint:
+            print("\nBuilding output dataframes from checkpoints...")
+            self.__load_checkpoints(cultivars)
+            self.__write_output_dfs()
+            self.__remove_checkpoints(cultivars)
+
+        sys.stdout.close()
+
+
+    def __iter_cultivar_sites(
+            self, cultivar_idx: int, cultivar_bed_file_path: str
+        ) -> Iterator[Tuple]:
+        """
+        Lazily yields (sort key, cultivar index, scaffold, position, values)
+        for every site in a coordinate-sorted cultivar BED file, reading it in
+        chunks, with one value per output table.
+        """
+        natural_key = natsort_keygen()
+        scaffold_key = None
+        previous_scaffold = None
+        previous_sort_key = None
+        for chunk in bed_reader.read_bed_chunks(
+                cultivar_bed_file_path, self.output_tables, self.chunk_size,
+                self.value_columns
+            ):
+            for scaffold, position, *values in zip(
+                    chunk["#Scaffold"].tolist(), chunk["Position"].tolist(),
+                    *(
+                        chunk[output_table].tolist()
+                        for output_table in self.output_tables
+                    )
+                ):
+                if scaffold != previous_scaffold:
+                    previous_scaffold = scaffold
+                    scaffold_key = natural_key(scaffold)
 
-            helpers.write_output(
-                output_df = self.output_df,
-                output_file_name = "sorted_methylation_levels.tsv",
-                output_dir_path = self.bed_dir_path, write_index = True
+                sort_key = (scaffold_key, position)
+                if previous_sort_key is not None \
+                        and sort_key < previous_sort_key:
+                    raise ValueError(helpers.string_builder((
+                        cultivar_bed_file_path, " is not coordinate-sorted at ",
+                        scaffold, '_', str(position), ". Sort it by natural ",
+                        "scaffold order, then position (sort -k1,1V -k3,3n)."
+                    )))
+
+                previous_sort_key = sort_key
+                yield (sort_key, cultivar_idx, scaffold, position, values)
+
+
+    def __write_merged_chunk(
+            self, output_writers: List[storage.TableWriter],
+            cultivars: List[str], scaffolds: List[str], positions: List[int],
+            table_values: List[List[List[float]]]
+        ) -> None:
+        """
+        Writes a chunk of merged sites to every output table, with their
+        genomic keys in the requested key format.
+        """
+        keys = genomic_keys.pack_keys(
+            self.scaffold_dictionary.encode(pd.Series(scaffolds)),
+            np.array(positions, dtype = np.int64)
+        )
+        for output_writer, values in zip(output_writers, table_values):
+            output_writer.write(genomic_keys.key_output_df(
+                keys, df(values, columns = cultivars),
+                self.scaffold_dictionary, self.key_format
+            ))
+
+
+    def loc_bed_merger(self, cultivars: List[str]) -> None:
+        """
+        Combines all cultivar BED files at the current location with a single
+        k-way merge on (scaffold, position), writing the output tables in one
+        pass. Assumes each BED file is sorted in natural scaffold order, then
+        position.
+        """
+        print(helpers.string_builder((
+            self.location_label, " BED merging start."
+        )))
+
+        # Prints stdout to a separate file.
+        sys.stdout = open(
+            helpers.string_builder((
+                self.location_label, "_bed_combine_stdout.txt"
+            )), 'w'
+        )
+
+        print("Merging cultivar BED files...")
+        site_iterators = [
+            self.__iter_cultivar_sites(
+                cultivar_idx, self.__cultivar_bed_file_path(cultivar)
+            ) for cultivar_idx, cultivar in enumerate(cultivars)
+        ]
+        output_writers = [
+            self.__open_output(output_table)
+            for output_table in self.output_tables
+        ]
+
+        # Sites sharing a (scaffold, position) key arrive consecutively and
+        # are written in chunks of `chunk_size` sites.
+        current_sort_key = None
+        scaffolds = []
+        positions = []
+        table_values = [[] for output_table in self.output_tables]
+        for sort_key, cultivar_idx, scaffold, position, values in \
+                heapq.merge(*site_iterators):
+            if sort_key != current_sort_key:
+                if len(scaffolds) == self.chunk_size:
+                    self.__write_merged_chunk(
+                        output_writers, cultivars, scaffolds, positions,
+                        table_values
+                    )
+                    scaffolds = []
+                    positions = []
+                    table_values = [[] for output_table in self.output_tables]
+
+                current_sort_key = sort_key
+                scaffolds.append(scaffold)
+                positions.append(position)
+                for site_values in table_values:
+                    site_values.append([np.nan] * len(cultivars))
+
+            for site_values, value in zip(table_values, values):
+                site_values[-1][cultivar_idx] = value
+
+        if scaffolds:
+            self.__write_merged_chunk(
+                output_writers, cultivars, scaffolds, positions, table_values
             )
 
+        for output_writer in output_writers:
+            output_writer.close()
+
         sys.stdout.close()
 
 
+    def cultivar_parse_tasks(
+            self, cultivars: List[str], scratch_dir_path: str
+        ) -> List[Tuple[str]]:
+        """
+        Tasks for `parse_cultivar_bed_file`, one per cultivar at the current
+        location.
+        """
+        return [
+            (
+                self.location_label, cultivar,
+                self.__cultivar_bed_file_path(cultivar), scratch_dir_path,
+                self.chunk_size, self.output_tables, self.value_columns
+            ) for cultivar in cultivars
+        ]
+
+
+    def loc_parsed_merger(
+            self, cultivars: List[str],
+            parsed_cultivars: Dict[str, Tuple]
+        ) -> None:
+        """
+        Merges the parsed columns of all cultivar BED files at the current
+        location on their genomic keys and writes every output table once.
+        """
+        print(helpers.string_builder((
+            self.location_label, " parsed BED merging start."
+        )))
+
+        # Prints stdout to a separate file.
+        sys.stdout = open(
+            helpers.string_builder((
+                self.location_label, "_bed_combine_stdout.txt"
+            )), 'w'
+        )
+
+        print("Mapping parsed scaffolds to genomic keys...")
+        cultivar_keys = []
+        for cultivar in cultivars:
+            column_paths, scaffolds = parsed_cultivars[cultivar]
+            global_codes = self.scaffold_dictionary.encode(pd.Series(scaffolds))
+            cultivar_keys.append(genomic_keys.pack_keys(
+                global_codes[np.load(column_paths[0], mmap_mode = 'r')],
+                np.load(column_paths[1], mmap_mode = 'r')
+            ))
+
+        keys = np.unique(np.concatenate(cultivar_keys))
+        order = genomic_keys.natural_sort_order(keys, self.scaffold_dictionary)
+        cultivar_rows = [
+            np.searchsorted(keys, cultivar_keys[cultivar_idx])
+            for cultivar_idx in range(len(cultivars))
+        ]
+        for table_idx, output_table in enumerate(self.output_tables):
+            print(helpers.string_builder((
+                "Merging cultivar columns of ", output_table, "..."
+            )))
+            values = np.full((keys.size, len(cultivars)), np.nan)
+            for cultivar_idx, cultivar in enumerate(cultivars):
+                column_paths = parsed_cultivars[cultivar][0]
+                values[cultivar_rows[cultivar_idx], cultivar_idx] = np.load(
+                    column_paths[2 + table_idx], mmap_mode = 'r'
+                )
+
+            self.__write_output_df(
+                df(values[order], index = keys[order], columns = cultivars),
+                output_table
+            )
+
+        sys.stdout.close()
+
+
+def parse_cultivar_bed_file(task: Tuple[str]) -> Tuple:
+    """
+    Process pool worker: parses one cultivar BED file and saves its scaffold
+    codes, positions and the values of every output table as `.npy` columns
+    in the scratch directory, so only file paths and the scaffold names are
+    sent back.
+    """
+    location_label, cultivar, cultivar_bed_file_path, scratch_dir_path, \
+        chunk_size, output_tables, value_columns = task
+    cultivar_df = bed_reader.read_bed_file(
+        cultivar_bed_file_path, output_tables, chunk_size, value_columns
+    )
+    local_codes, scaffolds = pd.factorize(cultivar_df["#Scaffold"])
+
+    column_prefix = helpers.string_builder((
+        scratch_dir_path, '/', cultivar, '_', location_label
+    ))
+    column_paths = tuple(
+        helpers.string_builder((column_prefix, '_', column, ".npy"))
+        for column in ["codes", "positions"] + output_tables
+    )
+    np.save(column_paths[0], local_codes.astype(np.int32))
+    np.save(column_paths[1], cultivar_df["Position"].to_numpy(np.int64))
+    for table_idx, output_table in enumerate(output_tables):
+        np.save(
+            column_paths[2 + table_idx],
+            cultivar_df[output_table].to_numpy(np.float64)
+        )
+
+    return (location_label, cultivar, column_paths, scaffolds.tolist())
+
+
+def parse_bed_files_in_pool(
+        bed_combiners: List[BedCombiner], cultivars: List[str],
+        scratch_dir_path: str, workers: int = None
+    ) -> Dict[str, Dict[str, Tuple]]:
+    """
+    Parses the BED files of every (location, cultivar) pair concurrently in a
+    bounded process pool. Returns the parsed column paths and scaffold names
+    keyed by location label, then cultivar.
+    """
+    tasks = []
+    parsed_files = {}
+    for bed_combiner_obj in bed_combiners:
+        tasks += bed_combiner_obj.cultivar_parse_tasks(
+            cultivars, scratch_dir_path
+        )
+        parsed_files[bed_combiner_obj.location_label] = {}
+
+    with multiprocessing.Pool(workers) as pool:
+        for location_label, cultivar, column_paths, scaffolds in \
+                pool.imap_unordered(parse_cultivar_bed_file, tasks):
+            print(helpers.string_builder((
+                "Parsed: ", cultivar, '_', location_label
+            )))
+            parsed_files[location_label][cultivar] = (column_paths, scaffolds)
+
+    return parsed_files
+
+
 # Main method.
-def bed_combiner(self, cultivars: List[str], bed_dir_paths: Tuple[str]) -> None:
+def bed_combiner(
+        cultivars: List[str], bed_dir_paths: Tuple[str],
+        merge_mode: str = "concat", key_format: str = "string",
+        workers: int = None, chunk_size: int = bed_reader.default_chunk_size,
+        output_format: str = "tsv", coverage_column: int = None
+    ) -> None:
     """
     Combines BED files at Lethbridge and Vegreville in parallel
-    using the `multiprocessing` module.
+    using the `multiprocessing` module. In pool mode, `workers` bounds the
+    number of BED files parsed at once (defaults to the CPU count). BED files
+    are read `chunk_size` rows at a time. The combined output is written in
+    `output_format` (see `storage`). With a `coverage_column`, that BED column
+    is read in the same pass and combined into the companion coverage table.
     """
     start_time = timeit.default_timer() # Initialize starting time.
+    if merge_mode not in merge_modes:
+        raise ValueError(helpers.string_builder((
+            "Unknown merge mode: ", merge_mode
+        )))
+
+    if key_format not in genomic_keys.key_formats:
+        raise ValueError(helpers.string_builder((
+            "Unknown key format: ", key_format
+        )))
 
     print("\nStart\n") # Initialize BedCombiner objects for the two locations.
-    lethbridge_bed_combiner = BedCombiner('L', bed_dir_paths[0])
-    vegreville_bed_combiner = BedCombiner('V', bed_dir_paths[1])
+    bed_combiner_objs = [
+        BedCombiner(
+            location_label, bed_dir_path, key_format, chunk_size,
+            output_format, coverage_column
+        ) for location_label, bed_dir_path in zip(('L', 'V'), bed_dir_paths)
+    ]
 
-    # Initialize a process for each location's BedCombiner object.
-    lethbridge_process = multiprocessing.Process(
-        target = lethbridge_bed_combiner.loc_bed_combiner, args = (cultivars,)
-    )
-    vegreville_process = multiprocessing.Process(
-        target = vegreville_bed_combiner.loc_bed_combiner, args = (cultivars,)
-    )
+    scratch_dir = None
+    if merge_mode == "pool":
+        scratch_dir = tempfile.TemporaryDirectory(prefix = "bed_combiner_")
+        parsed_files = parse_bed_files_in_pool(
+            bed_combiner_objs, cultivars, scratch_dir.name, workers
+        )
+
+    # Initialize a process for each location's BedCombiner.
+    processes = []
+    for bed_combiner_obj in bed_combiner_objs:
+        target = bed_combiner_obj.loc_bed_combiner
+        args = (cultivars,)
+        if merge_mode == "stream":
+            target = bed_combiner_obj.loc_bed_merger
+
+        elif merge_mode == "checkpoint":
+            args = (cultivars, True)
+
+        elif merge_mode == "pool":
+            target = bed_combiner_obj.loc_parsed_merger
+            args = (
+                cultivars, parsed_files[bed_combiner_obj.location_label]
+            )
+
+        processes.append(
+            multiprocessing.Process(target = target, args = args)
+        )
 
     # Start processes and rejoin them when complete.
-    lethbridge_process.start()
-    vegreville_process.start()
-    lethbridge_process.join()
-    vegreville_process.join()
+    for process in processes:
+        process.start()
+
+    for process in processes:
+        process.join()
+
+    if scratch_dir is not None:
+        scratch_dir.cleanup()
 
     helpers.print_program_runtime("Combining BED files ", start_time)
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Objective: read cultivar BED files in fixed-size chunks with bounded memory,
+and BED files of annotation regions.
+
+Only the scaffold (column 0), position (column 2) and the value columns
+(column 7, the beta value, by default; e.g. also a coverage column) are
+parsed, all in one pass. Plain, gzip- and bgzip-compressed BED files are read
+transparently; compression is detected from the file's magic bytes, so
+`.bed`, `.bed.gz` and `.bed.bgz` files all work.
+
+"""
+
+from . import gzip, os, Iterator, List, pd
+from . import helpers
+
+bed_suffixes = (".bed", ".bed.gz", ".bed.bgz")
+key_columns = [0, 2] # Scaffold and position
+beta_value_column = 7
+default_chunk_size = 1000000 # Rows per chunk.
+region_columns = ["#Scaffold", "Start", "End", "Name"]
+gzip_magic_bytes = b"\x1f\x8b" # Shared by gzip and bgzip.
+header_prefixes = ("#", "track", "browser") # Comment and UCSC header lines.
+
+
+def find_cultivar_bed_file(
+        bed_dir_path: str, cultivar: str, location_label: str
+    ) -> str:
+    """
+    Find the given cultivar's BED file at a location, accepting plain or
+    compressed files at `<dir>/cultivars/<cultivar>_<location>.bed[.gz|.bgz]`.
+    """
+    file_prefix = helpers.string_builder((
+        bed_dir_path, "/cultivars/", cultivar, '_', location_label
+    ))
+    for bed_suffix in bed_suffixes:
+        cultivar_bed_file_path = helpers.string_builder((
+            file_prefix, bed_suffix
+        ))
+        if os.path.isfile(cultivar_bed_file_path):
+            return cultivar_bed_file_path
+
+    raise FileNotFoundError(helpers.string_builder((
+        "No BED file found for ", cultivar, " at ", file_prefix, ".bed"
+    )))
+
+
+def bed_compression(bed_file_path: str) -> str:
+    """
+    Compression of a BED file from its magic bytes: "gzip" (including bgzip)
+    or None.
+    """
+    with open(bed_file_path, "rb") as bed_file:
+        if bed_file.read(2) == gzip_magic_bytes:
+            return "gzip"
+
+    return None
+
+
+def read_bed_chunks(
+        bed_file_path: str, value_names: List[str],
+        chunk_size: int = default_chunk_size,
+        value_columns: List[int] = (beta_value_column,)
+    ) -> Iterator[pd.DataFrame]:
+    """
+    Lazily read a BED file as "#Scaffold", "Position" and `value_names`
+    dataframes of at most `chunk_size` rows each, with the values taken from
+    BED columns `value_columns`.
+    """
+    for value_column in value_columns:
+        if value_column <= key_columns[-1]:
+            raise ValueError(helpers.string_builder((
+                "The value column must come after the position column, got ",
+                str(value_column)
+            )))
+
+    if len(set(value_columns)) < len(value_columns):
+        raise ValueError(helpers.string_builder((
+            "The value columns must differ, got ",
+            ", ".join(str(value_column) for value_column in value_columns)
+        )))
+
+    # Names are given in file column order.
+    column_names = dict(zip(
+        key_columns + list(value_columns),
+        ["#Scaffold", "Position"] + list(value_names)
+    ))
+    usecols = sorted(column_names)
+    return pd.read_table(
+        bed_file_path, header = None,
+        names = [column_names[column] for column in usecols],
+        usecols = usecols, dtype = {"#Scaffold": str},
+        chunksize = chunk_size, compression = bed_compression(bed_file_path)
+    )
+
+
+def read_bed_file(
+        bed_file_path: str, value_names: List[str],
+        chunk_size: int = default_chunk_size,
+        value_columns: List[int] = (beta_value_column,)
+    ) -> pd.DataFrame:
+    """
+    Read a whole BED file chunk by chunk, parsing only the needed columns.
+    """
+    return pd.concat(
+        read_bed_chunks(bed_file_path, value_names, chunk_size, value_columns),
+        ignore_index = True
+    )
+
+
+def bed_header_lines(bed_file_path: str) -> int:
+    """
+    Number of header lines (comments, UCSC track and browser lines) at the
+    top of a BED file.
+    """
+    open_bed = gzip.open if bed_compression(bed_file_path) == "gzip" else open
+    header_lines = 0
+    with open_bed(bed_file_path, "rt") as bed_file:
+        for line in bed_file:
+            if not line.startswith(header_prefixes):
+                break
+
+            header_lines += 1
+
+    return header_lines
+
+
+def read_region_bed_file(region_bed_file_path: str) -> pd.DataFrame:
+    """
+    Read a BED file of regions (genes, promoters, DMRs, ...) as "#Scaffold",
+    "Start" and "End" columns, plus "Name" if the file has a fourth column.
+    Starts are 0-based and ends exclusive, as in BED. Comment lines and UCSC
+    track and browser lines are skipped.
+    """
+    region_df = pd.read_table(
+        region_bed_file_path, header = None,
+        skiprows = bed_header_lines(region_bed_file_path), comment = '#',
+        dtype = {0: str, 3: str},
+        compression = bed_compression(region_bed_file_path)
+    )
+    region_df = region_df.iloc[:, :len(region_columns)]
+    region_df.columns = region_columns[:region_df.shape[1]]
+    return region_df
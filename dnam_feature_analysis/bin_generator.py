@@ -7,72 +7,60 @@ Objective: generate a sorted bins file from given sorted scaffold sizes file.
 Inputs:
 - Sorted scaffold name and scaffold sizes TSV file path.
 - Output directory path.
+- Bin size (default 400bp, as shortest scaffolds are 400bp long) and
+  optionally a step between bin starts (defaults to the bin size).
 
 Outputs:
 - TSV file holding sorted bins file.
 
-Bin size 400bp as shortest scaffolds are 400bp long.
+Bins are laid out by `bin_index.VirtualBinIndex`; bin labels are the
+midpoints of the bins.
 
 """
 
-from . import List, timeit, df, math, np, pd
-from . import helpers
+from . import timeit, np
+from . import bin_index, helpers, storage
 
-file_header = ["#Scaffold", "Bin_Label"]
+file_header = bin_index.bin_key_header
 
 
 class BinGenerator:
-    def __init__(self) -> None:
+    def __init__(
+            self, bin_size: int = bin_index.default_bin_size,
+            bin_step: int = None
+        ) -> None:
+        self.bin_size = bin_size
+        self.bin_step = bin_step
         self.scaffold_df = None
         self.bin_df = None
 
 
-    def __set_dfs(
-            self, header: List[str], scaffold_sizes_file_path: str
-        ) -> None:
+    def __set_dfs(self, scaffold_sizes_file_path: str) -> None:
         """
-        Sets the input and output dataframes.
+        Sets the input dataframe.
         """
-        self.scaffold_df = pd.read_table(scaffold_sizes_file_path)
-        self.bin_df = df(data = 0, columns = header)
+        self.scaffold_df = storage.read_table(scaffold_sizes_file_path)
 
 
-    def __iter_scaffolds(self, row: pd.Series, header: List[str]) -> None:
+    def __generate_bins(self) -> None:
         """
-        Given a scaffold, create bins and append to the bin dataframe.
+        Create every bin of every scaffold in one vectorized pass.
         """
-        # Bin size 400bp
-        scaffold_name = row[0]
-        scaffold_size = int(row[1])
-        num_bins = math.ceil(scaffold_size / 400)
-
-        # Final bin
-        final_bin_label = int((scaffold_size % 400) / 2) # Initialize
-        if final_bin_label != 0: # If final bin is incomplete
-            final_bin_label += 400 * (num_bins - 1)
-
-         # If final bin is 1 (e.g. scaffold length is 401bp)
-        elif scaffold_size % 400 == 1:
-            final_bin_label == scaffold_size
-
-        # Bin labels are midpoints of the bin
-        scaffold_bins = df(
-            (np.arange(num_bins * 2).reshape(num_bins, 2) * 200).astype(float),
-            columns = header
+        virtual_bin_index = bin_index.VirtualBinIndex(
+            self.scaffold_df.iloc[:, 0].astype(str).to_numpy(),
+            self.scaffold_df.iloc[:, 1].to_numpy(np.int64),
+            self.bin_size, self.bin_step
         )
-        scaffold_bins["#Scaffold"] = scaffold_name
-        scaffold_bins[num_bins - 1, 1] = final_bin_label
-        self.bin_df.append(scaffold_bins, ignore_index = True)
-        del scaffold_bins # mem management
+        self.bin_df = virtual_bin_index.bin_keys_df()
 
 
     # Main method.
     def bin_generator(
             self, scaffold_sizes_file_path: str,
-            output_dir_path: str
+            output_dir_path: str, output_format: str = "tsv"
         ) -> None:
         """
-        Generate 400bp bins.
+        Generate bins of `bin_size` bp.
         """
         start_time = timeit.default_timer()
         scaffold_sizes_file_path, output_dir_path = \
@@ -81,13 +69,14 @@ class BinGenerator:
             ))
 
         print("\nStart.\nSetting dataframes...")
-        self.__set_dfs(file_header, scaffold_sizes_file_path)
+        self.__set_dfs(scaffold_sizes_file_path)
 
         print("\nGenerating bins...")
-        tmp = self.scaffold_df.apply(
-            self.__iter_scaffolds, args = (file_header,), axis = 1
-        )
-        del tmp
+        self.__generate_bins()
 
-        helpers.write_output(self.bin_df, "sorted_bins.tsv", output_dir_path)
+        helpers.write_output(
+            self.bin_df,
+            storage.output_file_name("sorted_bins.tsv", output_format),
+            output_dir_path
+        )
         helpers.print_program_runtime("Bin generation", start_time)
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Objective: virtual (arithmetic) bin index over a genome, and an interval
+index over arbitrary regions.
+
+Bins are never materialized: given only the scaffold sizes table, the bin
+size and the step between bin starts, every bin has a global integer ID
+(bins numbered in scaffold sizes file order, then position) and any
+(scaffold, position) maps straight to its bin ID.
+
+Bins start at position 1 and every `bin_step` bp after; the final bin of a
+scaffold ends at the scaffold end and may be shorter than `bin_size`. Bin
+labels are the midpoints of the bins.
+
+Regions (genes, promoters, DMRs, ...) from a BED file may vary in size and
+overlap. They are indexed by their packed lower and upper genomic keys, so the
+sites of every region are found with two binary searches over the key-sorted
+sites. Region labels are the BED names, or "start-end" without names.
+
+"""
+
+from . import Tuple, df, np, pd
+from . import bed_reader, genomic_keys, storage
+
+default_bin_size = 400 # Shortest scaffolds are 400bp long.
+bin_key_header = ["#Scaffold", "Bin_Label"]
+
+
+class VirtualBinIndex:
+    def __init__(
+            self, scaffold_names: np.ndarray, scaffold_sizes: np.ndarray,
+            bin_size: int = default_bin_size, bin_step: int = None
+        ) -> None:
+        if bin_step is None:
+            bin_step = bin_size
+
+        # Bin labels are midpoints, so bins need an even size and starts on
+        # a half-bin grid for their bounds to be recoverable from the label.
+        if bin_size <= 0 or bin_size % 2 != 0:
+            raise ValueError("Bin size must be a positive even number.")
+
+        if bin_step <= 0 or bin_step % (bin_size // 2) != 0:
+            raise ValueError(
+                "Bin step must be a positive multiple of half the bin size."
+            )
+
+        self.bin_size = bin_size
+        self.bin_step = bin_step
+        self.scaffold_dictionary = genomic_keys.ScaffoldDictionary(
+            list(scaffold_names)
+        )
+        self.scaffold_sizes = np.asarray(scaffold_sizes, dtype = np.int64)
+        self.num_bins = self.__bins_per_scaffold()
+        self.scaffold_offsets = np.cumsum(self.num_bins) - self.num_bins
+        self.total_bins = int(self.num_bins.sum())
+
+
+    def __bins_per_scaffold(self) -> np.ndarray:
+        """
+        Number of bins on each scaffold: bins start every `bin_step` bp until
+        one reaches the scaffold end.
+        """
+        bins_to_end = 1 + -(
+            -np.maximum(self.scaffold_sizes - self.bin_size, 0) // self.bin_step
+        )
+        bins_started = -(-self.scaffold_sizes // self.bin_step)
+        return np.minimum(bins_to_end, bins_started)
+
+
+    def bin_scaffold_codes(self, bin_ids: np.ndarray) -> np.ndarray:
+        """
+        Scaffold code of each bin.
+        """
+        return np.searchsorted(
+            self.scaffold_offsets, bin_ids, side = "right"
+        ) - 1
+
+
+    def bin_bounds(self, bin_ids: np.ndarray) -> Tuple[np.ndarray]:
+        """
+        First and last position of each bin.
+        """
+        codes = self.bin_scaffold_codes(bin_ids)
+        bin_starts = (bin_ids - self.scaffold_offsets[codes]) * \
+            self.bin_step + 1
+        bin_ends = np.minimum(
+            bin_starts + self.bin_size - 1, self.scaffold_sizes[codes]
+        )
+        return (bin_starts, bin_ends)
+
+
+    def bin_ids(self, codes: np.ndarray, positions: np.ndarray) -> np.ndarray:
+        """
+        Map scaffold codes and positions straight to bin IDs. Sites outside
+        every bin (unknown scaffolds, beyond the scaffold end, or in the gaps
+        between bins) map to -1. Needs non-overlapping bins.
+        """
+        if self.bin_step < self.bin_size:
+            raise ValueError(
+                "Mapping sites to bins needs non-overlapping bins "
+                "(bin step of at least the bin size)."
+            )
+
+        codes = np.asarray(codes, dtype = np.int64)
+        positions = np.asarray(positions, dtype = np.int64)
+        known = codes < self.num_bins.size
+        known_codes = np.where(known, codes, 0)
+        bin_idx = (positions - 1) // self.bin_step
+        in_bins = known & (positions >= 1) & \
+            (positions <= self.scaffold_sizes[known_codes]) & \
+            (bin_idx < self.num_bins[known_codes]) & \
+            ((positions - 1) - bin_idx * self.bin_step < self.bin_size)
+
+        return np.where(
+            in_bins, self.scaffold_offsets[known_codes] + bin_idx, -1
+        )
+
+
+    def bin_keys_df(self, bin_ids: np.ndarray = None) -> pd.DataFrame:
+        """
+        "#Scaffold" and "Bin_Label" columns of the given bins (all bins by
+        default). Bin labels are bin midpoints; a final 1bp bin is labelled by
+        its only position.
+        """
+        if bin_ids is None:
+            bin_ids = np.arange(self.total_bins)
+
+        bin_starts, bin_ends = self.bin_bounds(bin_ids)
+        bin_labels = bin_starts - 1 + \
+            np.maximum((bin_ends - bin_starts + 1) // 2, 1)
+        return df({
+            bin_key_header[0]: self.scaffold_dictionary.decode(
+                self.bin_scaffold_codes(bin_ids)
+            ),
+            bin_key_header[1]: bin_labels
+        })
+
+
+def read_virtual_bin_index(
+        scaffold_sizes_file_path: str, bin_size: int = default_bin_size,
+        bin_step: int = None
+    ) -> VirtualBinIndex:
+    """
+    Build a virtual bin index from a scaffold name and scaffold size table.
+    """
+    scaffold_df = storage.read_table(scaffold_sizes_file_path)
+    return VirtualBinIndex(
+        scaffold_df.iloc[:, 0].astype(str).to_numpy(),
+        scaffold_df.iloc[:, 1].to_numpy(np.int64), bin_size, bin_step
+    )
+
+
+class RegionIndex:
+    def __init__(
+            self, region_scaffolds: np.ndarray, region_starts: np.ndarray,
+            region_ends: np.ndarray, region_labels: np.ndarray = None
+        ) -> None:
+        region_starts = np.asarray(region_starts, dtype = np.int64)
+        region_ends = np.asarray(region_ends, dtype = np.int64)
+        if np.any(region_ends <= region_starts) or np.any(region_starts < 0):
+            raise ValueError("Regions must have 0 <= start < end.")
+
+        if region_labels is None:
+            region_labels = pd.Series(region_starts).astype(str) + '-' + \
+                pd.Series(region_ends).astype(str)
+
+        self.scaffold_dictionary = genomic_keys.ScaffoldDictionary()
+        self.region_codes = self.scaffold_dictionary.encode(
+            pd.Series(region_scaffolds)
+        )
+        self.region_labels = np.asarray(region_labels, dtype = object)
+
+        # BED starts are 0-based and ends exclusive: keys span positions
+        # start + 1 to end.
+        self.lower_keys = genomic_keys.pack_keys(
+            self.region_codes, region_starts + 1
+        )
+        self.upper_keys = genomic_keys.pack_keys(self.region_codes, region_ends)
+        self.total_regions = self.region_codes.size
+
+
+    def site_ranges(self, sorted_site_keys: np.ndarray) -> Tuple[np.ndarray]:
+        """
+        First and one-past-last index of the sites of each region, given
+        site keys sorted in ascending order.
+        """
+        first_sites = np.searchsorted(
+            sorted_site_keys, self.lower_keys, side = "left"
+        )
+        last_sites = np.searchsorted(
+            sorted_site_keys, self.upper_keys, side = "right"
+        )
+        return (first_sites, last_sites)
+
+
+    def region_keys_df(self) -> pd.DataFrame:
+        """
+        "#Scaffold" and "Bin_Label" columns of all regions, in BED file order.
+        """
+        return df({
+            bin_key_header[0]: self.scaffold_dictionary.decode(
+                self.region_codes
+            ),
+            bin_key_header[1]: self.region_labels
+        })
+
+
+def read_region_index(region_bed_file_path: str) -> RegionIndex:
+    """
+    Build a region index from a BED file of regions.
+    """
+    region_df = bed_reader.read_region_bed_file(region_bed_file_path)
+    return RegionIndex(
+        region_df["#Scaffold"].to_numpy(), region_df["Start"].to_numpy(),
+        region_df["End"].to_numpy(),
+        region_df["Name"].to_numpy() if "Name" in region_df else None
+    )
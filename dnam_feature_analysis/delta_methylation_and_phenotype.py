@@ -5,10 +5,15 @@
 Produce the delta methylation and delta phenotype files.
 Vegreville minus Lethbridge.
 
+Matrix store (`.f32`) methylation inputs are opened zero-copy and their delta
+is written chunk by chunk, so memory is bounded by the chunk size.
+
 """
 
 from . import timeit, df, pd
-from .helpers import remove_trailing_slash, print_program_runtime
+from . import matrix_store, storage
+from .helpers import budget_rows, default_memory_budget, open_output, \
+    remove_trailing_slash, print_program_runtime, write_output
 
 
 # lethbridge_methylation_file_path = sys.argv[1]
@@ -17,13 +22,57 @@ from .helpers import remove_trailing_slash, print_program_runtime
 # vegreville_phenotype_file_path = sys.argv[4]
 # output_dir_path = sys.argv[5]
 
+def delta_methylation_stores(
+        lethbridge_store_path: str, vegreville_store_path: str,
+        output_file_name: str, output_dir_path: str
+    ) -> None:
+    """
+    Write the Vegreville minus Lethbridge delta methylation of two matrix
+    stores, a chunk of bins at a time, reading the memory-mapped value
+    matrices directly.
+    """
+    columns = matrix_store.read_columns(lethbridge_store_path)
+    lethbridge_values = matrix_store.open_values(lethbridge_store_path)
+    vegreville_values = matrix_store.open_values(vegreville_store_path)
+    if matrix_store.read_columns(vegreville_store_path) != columns or \
+            vegreville_values.shape != lethbridge_values.shape:
+        raise ValueError(
+            "Lethbridge and Vegreville data must hold the same bins."
+        )
+
+    key_columns = len(columns) - lethbridge_values.shape[1]
+    key_df = matrix_store.read_key_columns(
+        lethbridge_store_path, columns[:key_columns]
+    )
+    output_writer = open_output(
+        output_file_name, output_dir_path, key_columns = key_columns
+    )
+    chunk_bins = budget_rows(default_memory_budget, lethbridge_values.shape[1])
+    for chunk_start in range(0, lethbridge_values.shape[0], chunk_bins):
+        chunk_stop = chunk_start + chunk_bins
+        output_writer.write(pd.concat(
+            [
+                key_df.iloc[chunk_start:chunk_stop].reset_index(drop = True),
+                df(
+                    vegreville_values[chunk_start:chunk_stop] - \
+                        lethbridge_values[chunk_start:chunk_stop],
+                    columns = columns[key_columns:]
+                )
+            ], axis = 1
+        ))
+
+    output_writer.close()
+
+
 def delta(
         lethbridge_methylation_file_path: str,
         vegreville_methylation_file_path: str,
         lethbridge_phenotype_file_path: str, vegreville_phenotype_file_path: str,
-        output_dir_path: str
+        output_dir_path: str, output_format: str = "tsv"
     ) -> None:
     """
+    Write the Vegreville minus Lethbridge delta methylation and delta
+    phenotype files in `output_format` (see `storage`).
     """
     start_time = timeit.default_timer()
     lethbridge_methylation_file_path, vegreville_methylation_file_path, \
@@ -36,29 +85,54 @@ def delta(
                 output_dir_path
             ))
 
-    print("Reading files...")
-    lethbridge_methylation = pd.read_table(lethbridge_methylation_file_path)
-    vegreville_methylation = pd.read_table(vegreville_methylation_file_path)
-    lethbridge_phenotype = pd.read_table(lethbridge_phenotype_file_path)
-    vegreville_phenotype = pd.read_table(vegreville_phenotype_file_path)
-
-    print("Concatentating...")
-    methylation_output_df = pd.concat(
-        [
-            lethbridge_methylation.iloc[:, 0:2],
-            vegreville_methylation.iloc[:, 2:] - \
-                lethbridge_methylation.iloc[:, 2:]
-        ], axis = 1
+    methylation_file_name = storage.output_file_name(
+        "delta_methylation_v_minus_l.tsv", output_format
     )
-    phenotype_output_df = vegreville_phenotype - lethbridge_phenotype
+    if storage.storage_format(lethbridge_methylation_file_path) == "f32" and \
+            storage.storage_format(vegreville_methylation_file_path) == "f32":
+        print("Writing delta methylation...")
+        delta_methylation_stores(
+            lethbridge_methylation_file_path, vegreville_methylation_file_path,
+            methylation_file_name, output_dir_path
+        )
+
+    else:
+        print("Reading files...")
+        lethbridge_methylation = storage.read_table(
+            lethbridge_methylation_file_path
+        )
+        vegreville_methylation = storage.read_table(
+            vegreville_methylation_file_path
+        )
+
+        print("Concatentating...")
+        methylation_output_df = pd.concat(
+            [
+                lethbridge_methylation.iloc[:, 0:2],
+                vegreville_methylation.iloc[:, 2:] - \
+                    lethbridge_methylation.iloc[:, 2:]
+            ], axis = 1
+        )
+
+        print("Writing...")
+        write_output(
+            methylation_output_df, methylation_file_name, output_dir_path,
+            key_columns = 2
+        )
 
-    print("Writing...")
-    methylation_output_df.to_csv(
-        "delta_methylation_v_minus_l.tsv", output_dir_path, sep = '\t',
-        index = False
+    lethbridge_phenotype = storage.read_table(
+        lethbridge_phenotype_file_path, index_col = 0
+    )
+    vegreville_phenotype = storage.read_table(
+        vegreville_phenotype_file_path, index_col = 0
+    )
+
+    phenotype_output_df = vegreville_phenotype - lethbridge_phenotype
+    write_output(
+        phenotype_output_df,
+        storage.output_file_name("delta_phenotype_v_minus_l.tsv", output_format),
+        output_dir_path, write_index = True
     )
-    phenotype_output_df.to_csv(
-        "delta_phenotype_v_minus_l.tsv", output_dir_path, sep = '\t')
 
     print("Done!")
     print_program_runtime("Delta methylation and phenotype", start_time)
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Objective: integer-encoded genomic keys shared by the pipeline stages.
+
+A genomic site is keyed by its scaffold's dictionary code and its position,
+packed into a single uint64 (code in the high 32 bits, position in the low 32
+bits). Packed keys index, sort and join as plain integers; "Scaffold_Position"
+strings are only built when an output file asks for them.
+
+Key formats (output layout of the site keys):
+- string: a single "Scaffold_Position" index column.
+- columns: separate "#Scaffold" and "Position" columns.
+
+"""
+
+from . import List, Tuple, natsorted, np, pd
+from . import helpers
+
+key_formats = ("string", "columns")
+position_bits = np.uint64(32)
+position_mask = np.uint64((1 << 32) - 1)
+
+
+class ScaffoldDictionary:
+    def __init__(self, scaffolds: List[str] = ()) -> None:
+        self.scaffolds = [] # Code to scaffold name.
+        self.codes = {} # Scaffold name to code.
+        self.add(scaffolds)
+
+
+    def add(self, scaffolds: List[str]) -> None:
+        """
+        Add scaffold names not already in the dictionary, in the given order.
+        """
+        for scaffold in scaffolds:
+            if scaffold not in self.codes:
+                self.codes[scaffold] = len(self.scaffolds)
+                self.scaffolds.append(scaffold)
+
+
+    def encode(self, scaffolds: pd.Series) -> np.ndarray:
+        """
+        Encode a column of scaffold names as dictionary codes, adding any
+        unseen scaffold names to the dictionary.
+        """
+        local_codes, uniques = pd.factorize(scaffolds)
+        self.add(uniques)
+        lookup = np.array(
+            [self.codes[scaffold] for scaffold in uniques], dtype = np.int64
+        )
+        return lookup[local_codes]
+
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        """
+        Decode dictionary codes back to scaffold names.
+        """
+        return np.asarray(self.scaffolds, dtype = object)[codes]
+
+
+    def natural_ranks(self) -> np.ndarray:
+        """
+        Rank of each code when scaffold names are in natural sort order.
+        """
+        ranks = np.empty(len(self.scaffolds), dtype = np.int64)
+        ranks[[self.codes[s] for s in natsorted(self.scaffolds)]] = \
+            np.arange(len(self.scaffolds))
+        return ranks
+
+
+def pack_keys(codes: np.ndarray, positions: np.ndarray) -> np.ndarray:
+    """
+    Pack scaffold codes and positions into uint64 genomic keys.
+    """
+    return (np.asarray(codes).astype(np.uint64) << position_bits) | \
+        np.asarray(positions).astype(np.uint64)
+
+
+def unpack_keys(keys: np.ndarray) -> Tuple[np.ndarray]:
+    """
+    Unpack uint64 genomic keys into scaffold codes and positions.
+    """
+    keys = np.asarray(keys, dtype = np.uint64)
+    return (
+        (keys >> position_bits).astype(np.int64),
+        (keys & position_mask).astype(np.int64)
+    )
+
+
+def natural_sort_order(
+        keys: np.ndarray, scaffold_dictionary: ScaffoldDictionary
+    ) -> np.ndarray:
+    """
+    Indices that sort genomic keys by natural scaffold order, then position.
+    """
+    codes, positions = unpack_keys(keys)
+    ranks = scaffold_dictionary.natural_ranks()
+    return np.argsort(pack_keys(ranks[codes], positions), kind = "stable")
+
+
+def split_string_keys(
+        string_keys: pd.Series, scaffold_dictionary: ScaffoldDictionary
+    ) -> Tuple[np.ndarray]:
+    """
+    Parse "Scaffold_Position" strings into scaffold codes and positions.
+    """
+    scaffolds_positions = string_keys.str.rsplit('_', n = 1, expand = True)
+    codes = scaffold_dictionary.encode(scaffolds_positions[0])
+    positions = pd.to_numeric(scaffolds_positions[1]).to_numpy(np.int64)
+    return (codes, positions)
+
+
+def read_site_keys(
+        methylation_df: pd.DataFrame, scaffold_dictionary: ScaffoldDictionary
+    ) -> Tuple[np.ndarray]:
+    """
+    Read the scaffold codes and positions of a site-level methylation
+    dataframe in either key format, returning them with the number of key
+    columns to skip.
+    """
+    if methylation_df.columns[:2].tolist() == ["#Scaffold", "Position"]:
+        codes = scaffold_dictionary.encode(methylation_df["#Scaffold"])
+        positions = methylation_df["Position"].to_numpy(np.int64)
+        return (codes, positions, 2)
+
+    codes, positions = split_string_keys(
+        methylation_df.iloc[:, 0].astype(str), scaffold_dictionary
+    )
+    return (codes, positions, 1)
+
+
+def key_output_df(
+        keys: np.ndarray, values_df: pd.DataFrame,
+        scaffold_dictionary: ScaffoldDictionary, key_format: str = "string"
+    ) -> pd.DataFrame:
+    """
+    Attach site keys in the requested key format to a dataframe of values.
+    String keys become the index, so write it with `write_index = True`;
+    column keys are prepended as "#Scaffold" and "Position" columns.
+    """
+    if key_format not in key_formats:
+        raise ValueError(helpers.string_builder((
+            "Unknown key format: ", key_format
+        )))
+
+    codes, positions = unpack_keys(keys)
+    scaffolds = scaffold_dictionary.decode(codes)
+    if key_format == "string":
+        return values_df.set_axis(
+            pd.Index(scaffolds + '_' + positions.astype(str), dtype = object)
+        )
+
+    key_df = pd.DataFrame({"#Scaffold": scaffolds, "Position": positions})
+    return pd.concat(
+        [key_df, values_df.reset_index(drop = True)], axis = 1
+    )
@@ -7,6 +7,9 @@ Helper functions.
 """
 
 from . import List, os, Tuple, timeit, pd
+from . import storage
+
+default_memory_budget = 256 * 2 ** 20 # Bytes of working arrays per chunk.
 
 
 def significance(model: Tuple[float]) -> bool:
@@ -21,6 +24,16 @@ def significance(model: Tuple[float]) -> bool:
     return significance
 
 
+def budget_rows(
+        memory_budget: int, row_values: int, working_arrays: int = 4
+    ) -> int:
+    """
+    Number of rows of `row_values` float64 values each that fit
+    `working_arrays` times in a memory budget (in bytes), at least one.
+    """
+    return max(1, memory_budget // (8 * max(row_values, 1) * working_arrays))
+
+
 def string_builder(str_list: Tuple[str]) -> str:
     """
     Build strings separate by whitespace.
@@ -50,15 +63,30 @@ def create_output_directory(output_dir_path: str) -> None:
 
 def write_output(
         output_df: pd.DataFrame, output_file_name: str, output_dir_path: str,
-        write_index: bool = False
+        write_index: bool = False, key_columns: int = None
     ) -> None:
     """
-    Write output file.
+    Write output file in the storage format given by its extension.
+    Methylation matrices give their number of key columns.
+    """
+    output_file = string_builder((output_dir_path, '/', output_file_name))
+    create_output_directory(output_dir_path)
+    print(string_builder(("\nWriting ", output_file, " to ", output_dir_path)))
+    storage.write_table(output_df, output_file, write_index, key_columns)
+
+
+def open_output(
+        output_file_name: str, output_dir_path: str, write_index: bool = False,
+        key_columns: int = None
+    ) -> "storage.TableWriter":
+    """
+    Open an output file for incremental (chunked) writing. Methylation
+    matrices give their number of key columns.
     """
     output_file = string_builder((output_dir_path, '/', output_file_name))
     create_output_directory(output_dir_path)
     print(string_builder(("\nWriting ", output_file, " to ", output_dir_path)))
-    output_df.to_csv(output_file, sep = '\t', index = write_index)
+    return storage.TableWriter(output_file, write_index, key_columns)
 
 
 def print_program_runtime(program_name: str, start_time: float) -> None:
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Objective: keep only the hits of per-bin results, as the statistics engines
+produce them.
+
+A hit collector is a result sink in place of a full output table: it is
+written chunks of per-bin results and keeps the bins whose p-values are at
+most a threshold, the top k bins by p-value, or the top k bins among those
+passing the threshold. Top-k bins are kept in a bounded heap, ties going to
+the earlier bin. Missing p-values and the bins a statistics engine marks as
+filtered (untested) are never hits; p-values of 0 otherwise are, being the
+strongest. Memory and output size scale with the number of hits rather than
+the number of bins.
+
+Hits are written to a `<output>_hits` table next to where the full table
+would be: bins passing a threshold in bin order, top-k bins by increasing
+p-value.
+
+"""
+
+from . import heapq, os, List, df, np, pd
+from . import helpers, storage
+
+hits_suffix = "_hits"
+
+
+class HitCollector:
+    def __init__(
+            self, file_path: str, p_threshold: float = None,
+            top_k: int = None, p_value_column: str = "P_Value",
+            columns: List[str] = None
+        ) -> None:
+        if top_k is not None and top_k < 1:
+            raise ValueError(helpers.string_builder((
+                "Top k must be at least 1: ", str(top_k)
+            )))
+
+        self.file_path = file_path
+        self.p_threshold = p_threshold
+        self.top_k = top_k
+        self.p_value_column = p_value_column
+        self.columns = columns # Else those of the first chunk written.
+        self.hit_dfs = [] # Chunks of hits, without top k.
+        self.hit_heap = [] # (-p-value, -bin number, row) of the top k hits.
+        self.total_bins = 0
+
+
+    def __push_hits(self, chunk_df: pd.DataFrame, hit_rows: np.ndarray) -> None:
+        """
+        Push candidate rows of a chunk into the bounded heap of top k hits.
+        The heap root is the worst hit kept: the largest p-value, the latest
+        bin on ties.
+        """
+        p_values = chunk_df[self.p_value_column].to_numpy(np.float64)
+        if len(self.hit_heap) == self.top_k:
+            hit_rows = hit_rows[p_values[hit_rows] < -self.hit_heap[0][0]]
+
+        # At most k rows of a chunk can be hits.
+        hit_rows = hit_rows[
+            np.argsort(p_values[hit_rows], kind = "stable")[:self.top_k]
+        ]
+        for hit_row, row in zip(
+                hit_rows, chunk_df.iloc[hit_rows].itertuples(
+                    index = False, name = None
+                )
+            ):
+            hit = (
+                -p_values[hit_row], -(self.total_bins + int(hit_row)), row
+            )
+            if len(self.hit_heap) < self.top_k:
+                heapq.heappush(self.hit_heap, hit)
+
+            elif hit[0:2] > self.hit_heap[0][0:2]:
+                heapq.heapreplace(self.hit_heap, hit)
+
+
+    def write(
+            self, chunk_df: pd.DataFrame, filtered: np.ndarray = None
+        ) -> None:
+        """
+        Collect the hits of the next chunk of per-bin results, leaving out
+        its `filtered` bins.
+        """
+        if self.columns is None:
+            self.columns = chunk_df.columns
+
+        p_values = chunk_df[self.p_value_column].to_numpy(np.float64)
+        hits = ~np.isnan(p_values)
+        if filtered is not None:
+            hits &= ~np.asarray(filtered, dtype = bool)
+
+        if self.p_threshold is not None:
+            hits &= p_values <= self.p_threshold
+
+        if self.top_k is None:
+            self.hit_dfs.append(chunk_df.iloc[np.flatnonzero(hits)].copy())
+
+        else:
+            self.__push_hits(chunk_df, np.flatnonzero(hits))
+
+        self.total_bins += chunk_df.shape[0]
+
+
+    def hits_df(self) -> pd.DataFrame:
+        """
+        Hits collected so far: in bin order, or by increasing p-value with
+        top k.
+        """
+        if self.top_k is None:
+            if not self.hit_dfs:
+                return df(columns = self.columns)
+
+            return pd.concat(self.hit_dfs, ignore_index = True)
+
+        return df(
+            [hit[2] for hit in sorted(self.hit_heap, reverse = True)],
+            columns = self.columns
+        )
+
+
+    def close(self) -> None:
+        """
+        Write the hits table, empty if no bins were written.
+        """
+        hits_df = self.hits_df()
+        print(helpers.string_builder((
+            str(hits_df.shape[0]), " hits of ", str(self.total_bins), " bins."
+        )))
+        storage.write_table(hits_df, self.file_path)
+
+
+def hits_file_name(output_file_name: str) -> str:
+    """
+    Hits table name of an output table.
+    """
+    file_stem, extension = os.path.splitext(output_file_name)
+    return helpers.string_builder((file_stem, hits_suffix, extension))
+
+
+def open_output(
+        output_file_name: str, output_dir_path: str, p_threshold: float = None,
+        top_k: int = None, columns: List[str] = None
+    ) -> "storage.TableWriter | HitCollector":
+    """
+    Open an output file for incremental (chunked) writing: the full table, or
+    only its hits given a p-value threshold or top k. Hits tables take their
+    `columns` when known, so that they keep a header without any bin.
+    """
+    if p_threshold is None and top_k is None:
+        return helpers.open_output(output_file_name, output_dir_path)
+
+    output_file = helpers.string_builder((
+        output_dir_path, '/', hits_file_name(output_file_name)
+    ))
+    helpers.create_output_directory(output_dir_path)
+    print(helpers.string_builder((
+        "\nCollecting hits in ", output_file, " to ", output_dir_path
+    )))
+    return HitCollector(
+        output_file, p_threshold, top_k, columns = columns
+    )
+
+
+def write_chunk(
+        output_writer: "storage.TableWriter | HitCollector",
+        chunk_df: pd.DataFrame, filtered: np.ndarray = None
+    ) -> None:
+    """
+    Write the next chunk of per-bin results to an output opened by
+    `open_output`. Filtered bins are written to full tables but are never
+    hits.
+    """
+    if isinstance(output_writer, HitCollector):
+        output_writer.write(chunk_df, filtered)
+
+    else:
+        output_writer.write(chunk_df)
+
+
+def write_output(
+        output_df: pd.DataFrame, output_file_name: str, output_dir_path: str,
+        p_threshold: float = None, top_k: int = None,
+        filtered: np.ndarray = None
+    ) -> None:
+    """
+    Write an output file: the full table, or only its hits given a p-value
+    threshold or top k. Filtered bins are never hits.
+    """
+    if p_threshold is None and top_k is None:
+        helpers.write_output(output_df, output_file_name, output_dir_path)
+        return
+
+    output_writer = open_output(
+        output_file_name, output_dir_path, p_threshold, top_k
+    )
+    output_writer.write(output_df, filtered)
+    output_writer.close()
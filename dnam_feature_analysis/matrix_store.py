@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Objective: on-disk, memory-mapped float32 store for cultivar matrices.
+
+A matrix store is a directory (`<name>.f32`) holding:
+- values.npy: the float32 value matrix (sites or bins by cultivars), opened
+  read-only and memory-mapped.
+- key_<i>.npy: one typed array per key column, e.g. "#Scaffold" and
+  "Bin_Label", or "Scaffold_Position".
+- columns.npy: the key column names, then the cultivar header.
+
+A store written in chunks (see `MatrixWriter`) saves every chunk of every
+array as its own shard, `<array>.<chunk>.npy`, then joins the shards into
+the store arrays when it is closed, a shard at a time, so memory stays
+bounded by the chunk size.
+
+A methylation matrix (beta values or their differences, by cultivar) is
+written with its number of leading key columns; its value columns are stored
+as one float32 matrix, since beta values in [0, 1] need no more precision.
+Any other table, such as test results, keeps every column as its own typed
+array, so p-values keep their full float64 precision. A store is opened
+zero-copy, so every process reading the same store shares one physical copy
+of the matrix through the page cache.
+
+"""
+
+from . import os, List, df, np, pd
+from . import helpers
+
+values_file_name = "values.npy"
+columns_file_name = "columns.npy"
+
+
+def store_file_path(store_path: str, file_name: str) -> str:
+    """
+    Path of a file in a matrix store.
+    """
+    return helpers.string_builder((store_path, '/', file_name))
+
+
+def key_file_name(key_idx: int) -> str:
+    """
+    File name of a key column in a matrix store.
+    """
+    return helpers.string_builder(("key_", str(key_idx), ".npy"))
+
+
+def shard_file_name(file_name: str, chunk_idx: int) -> str:
+    """
+    File name of one chunk of a matrix store array written in chunks.
+    """
+    return helpers.string_builder((
+        os.path.splitext(file_name)[0], '.', str(chunk_idx), ".npy"
+    ))
+
+
+def key_array(key_column: pd.Series) -> np.ndarray:
+    """
+    Typed NumPy array for a key column. Text keys are stored as fixed-width
+    unicode so the store never needs pickling.
+    """
+    if key_column.dtype.kind in "biufcmM":
+        return key_column.to_numpy()
+
+    return key_column.to_numpy(dtype = str)
+
+
+def write_matrix(
+        output_df: pd.DataFrame, store_path: str, key_columns: int = None
+    ) -> None:
+    """
+    Write a table as a matrix store: its `key_columns` leading key columns
+    as typed arrays and its value columns as one float32 matrix, written a
+    column at a time. Without `key_columns`, every column is a key column.
+    """
+    if key_columns is None:
+        key_columns = output_df.shape[1]
+
+    os.makedirs(store_path, exist_ok = True)
+    for key_idx in range(key_columns):
+        np.save(
+            store_file_path(store_path, key_file_name(key_idx)),
+            key_array(output_df.iloc[:, key_idx])
+        )
+
+    values = np.lib.format.open_memmap(
+        store_file_path(store_path, values_file_name), mode = "w+",
+        dtype = np.float32,
+        shape = (output_df.shape[0], output_df.shape[1] - key_columns)
+    )
+    for value_idx in range(values.shape[1]):
+        values[:, value_idx] = output_df.iloc[
+            :, key_columns + value_idx
+        ].to_numpy(np.float32)
+
+    values.flush()
+    del values
+    np.save(
+        store_file_path(store_path, columns_file_name),
+        np.array(output_df.columns, dtype = str)
+    )
+
+
+class MatrixWriter:
+    def __init__(self, store_path: str, key_columns: int = None) -> None:
+        self.store_path = store_path
+        self.key_columns = key_columns
+        self.columns = None
+        self.chunks = 0
+
+
+    def write(self, output_df: pd.DataFrame) -> None:
+        """
+        Write the next chunk of rows as one shard per store array.
+        """
+        if self.columns is None:
+            self.columns = output_df.columns.tolist()
+            if self.key_columns is None:
+                self.key_columns = output_df.shape[1]
+
+            os.makedirs(self.store_path, exist_ok = True)
+
+        for key_idx in range(self.key_columns):
+            np.save(
+                store_file_path(self.store_path, shard_file_name(
+                    key_file_name(key_idx), self.chunks
+                )), key_array(output_df.iloc[:, key_idx])
+            )
+
+        np.save(
+            store_file_path(self.store_path, shard_file_name(
+                values_file_name, self.chunks
+            )), output_df.iloc[:, self.key_columns:].to_numpy(np.float32)
+        )
+        self.chunks += 1
+
+
+    def __join_shards(self, file_name: str) -> None:
+        """
+        Join the shards of a store array into the array, a shard at a time,
+        and remove them. Text keys take the widest width of their shards.
+        """
+        shard_paths = [
+            store_file_path(
+                self.store_path, shard_file_name(file_name, chunk_idx)
+            ) for chunk_idx in range(self.chunks)
+        ]
+        shards = [
+            np.load(shard_path, mmap_mode = 'r') for shard_path in shard_paths
+        ]
+        joined_array = np.lib.format.open_memmap(
+            store_file_path(self.store_path, file_name), mode = "w+",
+            dtype = np.result_type(*shards),
+            shape = (
+                sum(shard.shape[0] for shard in shards), *shards[0].shape[1:]
+            )
+        )
+        first_row = 0
+        for shard in shards:
+            joined_array[first_row:first_row + shard.shape[0]] = shard
+            first_row += shard.shape[0]
+
+        joined_array.flush()
+        del joined_array, shards
+        for shard_path in shard_paths:
+            os.remove(shard_path)
+
+
+    def close(self) -> None:
+        """
+        Join the written chunks into the matrix store.
+        """
+        for key_idx in range(self.key_columns):
+            self.__join_shards(key_file_name(key_idx))
+
+        self.__join_shards(values_file_name)
+        np.save(
+            store_file_path(self.store_path, columns_file_name),
+            np.array(self.columns, dtype = str)
+        )
+
+
+def open_values(store_path: str) -> np.ndarray:
+    """
+    Read-only, memory-mapped float32 value matrix of a matrix store.
+    """
+    return np.load(
+        store_file_path(store_path, values_file_name), mmap_mode = 'r'
+    )
+
+
+def read_columns(store_path: str) -> List[str]:
+    """
+    Column names of a matrix store: its key columns, then its value columns.
+    """
+    return np.load(store_file_path(store_path, columns_file_name)).tolist()
+
+
+def open_keys(store_path: str, key_columns: int) -> List[np.ndarray]:
+    """
+    Read-only, memory-mapped key arrays of a matrix store.
+    """
+    return [
+        np.load(
+            store_file_path(store_path, key_file_name(key_idx)),
+            mmap_mode = 'r'
+        ) for key_idx in range(key_columns)
+    ]
+
+
+def read_key_columns(store_path: str, key_names: List[str]) -> pd.DataFrame:
+    """
+    Key columns of a matrix store.
+    """
+    return df(dict(zip(key_names, open_keys(store_path, len(key_names)))))
+
+
+def read_matrix(store_path: str, usecols: List[str] = None) -> pd.DataFrame:
+    """
+    Open the requested columns of a matrix store, in store order. The value
+    columns are views of the memory-mapped matrix, not copies.
+    """
+    columns = read_columns(store_path)
+    values = open_values(store_path)
+    key_columns = len(columns) - values.shape[1]
+    key_df = read_key_columns(store_path, columns[:key_columns])
+    matrix_df = pd.concat(
+        [
+            key_df,
+            df(values, columns = columns[key_columns:], copy = False)
+        ], axis = 1
+    )
+    if usecols is not None:
+        matrix_df = matrix_df[[
+            column for column in columns if column in usecols
+        ]]
+
+    return matrix_df
@@ -5,19 +5,53 @@
 Objective: find the bin methylation level of all given bins.
 
 Inputs:
-- Sorted bins TSV file path.
-- Methylation TSV file path.
+- Sorted bins TSV file path, or a scaffold sizes TSV file path for virtual
+  bins (see `bin_index`), which never need a materialized bins file, or a
+  BED file of regions of any size, which may overlap.
+- Methylation TSV file path of one or more locations.
 - Output directory path.
+- Optionally, the coverage TSV file path written alongside the methylation
+  file by the BED combiner; site means are then weighted by read depth.
 
 Output:
-- Bin methylation TSV file path for a single location.
+- Bin (or region) methylation TSV file path for each location.
+- Bin (or region) coverage TSV file path: the number of sites in each bin
+  ("Sites") and each cultivar's total read depth in the bin (its number of
+  sites with a value without a coverage file), so later stages can drop
+  low-information bins.
 
-Note - this needs to be run once for Lethbridge and once for Vegreville.
+Binning engines:
+- searchsorted (default): sort the bins by genomic key, assign every site to
+  its bin with one `np.searchsorted` pass and average with a grouped
+  reduction. Bins must not overlap.
+- apply: select each bin's sites one bin at a time.
+
+The streaming binner reads a methylation file sorted in scaffold sizes file
+order `chunk_size` sites at a time into virtual bins, holding only the last,
+possibly unfinished bin of each chunk between chunks, and writes finished
+bins as it goes.
+
+With more than one worker, the searchsorted and virtual binning runs are
+split into shards of whole scaffolds with balanced site counts, binned in a
+process pool and gathered back in genome order.
+
+Several locations (e.g. Lethbridge and Vegreville) are binned in one run:
+the bins are read once and each location is binned in its own process.
 
 """
 
-from . import sys, timeit, Tuple, np, df, pd, sps
-from . import helpers
+from . import multiprocessing, os, sys, timeit, List, Tuple, np, df, pd, sps
+from . import bed_reader, bin_index, genomic_keys, helpers, storage
+
+binning_engines = ("searchsorted", "apply")
+bin_modes = ("bins", "virtual", "streaming", "regions")
+bin_mode_output_file_names = { # Bin methylation and coverage file names.
+    "bins": ("methylation_bins.tsv", "methylation_bin_coverage.tsv"),
+    "virtual": ("methylation_bins.tsv", "methylation_bin_coverage.tsv"),
+    "streaming": ("methylation_bins.tsv", "methylation_bin_coverage.tsv"),
+    "regions": ("methylation_regions.tsv", "methylation_region_coverage.tsv")
+}
+shards_per_worker = 4 # Smaller shards even out uneven scaffold sizes.
 
 
 # bin_file_path = sys.argv[1]
@@ -26,57 +60,62 @@ from . import helpers
 
 
 class MethylationBinner:
-    def __init__(self):
+    def __init__(
+            self, bin_size: int = bin_index.default_bin_size,
+            bin_step: int = None, binning_engine: str = "searchsorted",
+            workers: int = 1, chunk_size: int = bed_reader.default_chunk_size
+        ):
+        if binning_engine not in binning_engines:
+            raise ValueError(helpers.string_builder((
+                "Unknown binning engine: ", binning_engine
+            )))
+
+        self.binning_engine = binning_engine
+        self.workers = workers if workers is not None else os.cpu_count()
+        self.bin_size = bin_size
+        self.bin_step = bin_step
+        self.chunk_size = chunk_size
+        self.half_bin_size = bin_size // 2
+        self.scaffold_dictionary = genomic_keys.ScaffoldDictionary()
         self.methylation_df = None
+        self.methylation_keys = None
         self.bins_output_df = None
+        self.bin_codes = None
+        self.coverage_values = None
+        self.bin_coverage_df = None
 
 
-    def __set_dfs(
-            self, bin_file_path: str, methylation_file_path: str
-        ) -> None:
+    def __set_methylation_df(self, methylation_file_path: str) -> None:
         """
-        Set input and output dataframes.
+        Set the input methylation dataframe, keyed by integer genomic keys so
+        sites are matched to bins without re-parsing "Scaffold_Position"
+        strings.
         """
-        self.methylation_df = pd.read_table(methylation_file_path)
-        self.bins_output_df = pd.read_table(bin_file_path)
-
-        # Combine Scaffold and Position columns.
-        scaffold_position = self.methylation_df.columns[0]
-        self.methylation_df[["Scaffold", "Position"]] = \
-            self.methylation_df[scaffold_position].str.split('_', expand = True)
-        self.methylation_df["Position"] = \
-            pd.to_numeric(self.methylation_df["Position"])
+        self.methylation_df = storage.read_table(methylation_file_path)
+        codes, positions, key_columns = genomic_keys.read_site_keys(
+            self.methylation_df, self.scaffold_dictionary
+        )
+        self.methylation_keys = genomic_keys.pack_keys(codes, positions)
+        self.methylation_df = self.methylation_df.iloc[:, key_columns:]
 
-        # Reordering the columns.
-        self.methylation_df = self.methylation_df.drop(
-            scaffold_position, axis = 1)
-        cols = self.methylation_df.columns.tolist()
-        cols = cols[(len(cols) - 2):] + cols[0:(len(cols) - 2)]
-        self.methylation_df = self.methylation_df[cols]
 
-        # Add cultivar columns to output dataframe.
-        cultivs = cols[2:]
-        for cultiv in cultivs:
-            self.bins_output_df[cultiv] = 0
+    def __set_bins_df(self, bin_file_path: str) -> None:
+        """
+        Set the output dataframe from the bins file.
+        """
+        self.bins_output_df = storage.read_table(bin_file_path)
+        self.bin_codes = self.scaffold_dictionary.encode(
+            self.bins_output_df.iloc[:, 0]
+        )
 
 
-    @staticmethod
-    def __variant_in_bin(
-            row: pd.Series, bin_scaffold: str, bin_lower_bound: int,
-            bin_upper_bound: int,
-        ) -> bool:
+    def __add_cultivar_columns(self) -> None:
         """
-        Determine whether or not the given variant is within the given bin.
+        Add cultivar columns to output dataframe.
         """
-        in_bin = False
-        variant_scaffold = row[0]
-        variant_position = row[1]
-        if variant_scaffold == bin_scaffold:
-            if variant_position >= bin_lower_bound \
-                    and variant_position <= bin_upper_bound:
-                in_bin = True
-
-        return in_bin
+        cultivs = self.methylation_df.columns.tolist()
+        for cultiv in cultivs:
+            self.bins_output_df[cultiv] = 0
 
 
     # def __bin_averaging(
@@ -126,21 +165,21 @@ class MethylationBinner:
         # return (bookmark, sites)
 
     @staticmethod
-    def __bin_bounds(bin_label: float) -> Tuple[int]:
+    def __bin_bounds(bin_label: np.ndarray, half_bin_size: int) -> Tuple[int]:
         """
-        Given a bin label, find the bin boundaries.
+        Given bin labels (a scalar or an array), find the bin boundaries.
         """
-        bin_lower_bound = 0
-        bin_upper_bound = 0
-        if bin_label % 200 == 0:
-            bin_lower_bound = bin_label - 200 + 1
-            bin_upper_bound = bin_label + 200
-
-        else:
-            bin_lower_bound = \
-                bin_label - bin_label % 200 + 1
-            bin_upper_bound = \
-                bin_label + bin_label % 200 + 1
+        bin_label = np.asarray(bin_label)
+        label_remainder = bin_label % half_bin_size
+        full_bin = label_remainder == 0
+        bin_lower_bound = np.where(
+            full_bin, bin_label - half_bin_size + 1,
+            bin_label - label_remainder + 1
+        )
+        bin_upper_bound = np.where(
+            full_bin, bin_label + half_bin_size,
+            bin_label + label_remainder + 1
+        )
 
         return (bin_lower_bound, bin_upper_bound)
 
@@ -149,20 +188,28 @@ class MethylationBinner:
         """
         Given a bin, find the bin methylation from variants within the bin.
         """
-        bin_scaffold = row[0]
-        bin_label = float(row[1])
-        bin_lower_bound, bin_upper_bound = self.__bin_bounds(bin_label)
+        bin_scaffold = row.iloc[0]
+        bin_label = float(row.iloc[1])
+        bin_lower_bound, bin_upper_bound = self.__bin_bounds(
+            bin_label, self.half_bin_size
+        )
         print(helpers.string_builder((
             "\nReading: ", bin_scaffold, " Bin ", str(bin_label)
         )))
 
-        # Select variants in bin.
-        bin_variants = self.methylation_df[self.methylation_df.apply(
-            self.__variant_in_bin, axis = 1,
-            args = (bin_scaffold, bin_lower_bound, bin_upper_bound)
-        )]
+        # Select variants in bin by their genomic key range.
+        bin_code = self.bin_codes[row.name]
+        lower_key, upper_key = genomic_keys.pack_keys(
+            bin_code, (int(bin_lower_bound), int(bin_upper_bound))
+        )
+        bin_variants = self.methylation_df[
+            (self.methylation_keys >= lower_key) & \
+                (self.methylation_keys <= upper_key)
+        ]
         if not bin_variants.empty:
-            row[2:] = bin_variants.iloc[:, 2:].mean()
+            row.iloc[2:] = bin_variants.mean()
+
+        return row
 
 
     # def __read_bin_df(self) -> None:
@@ -204,31 +251,926 @@ class MethylationBinner:
 
         # self.__bin_averaging(sites, current_scaffold, bin_idx)
 
+    def __coverage_values(
+            self, coverage_df: pd.DataFrame, methylation_keys: np.ndarray,
+            cultivars: List[str]
+        ) -> np.ndarray:
+        """
+        Per-site read depths of the given cultivars from (a chunk of) the
+        coverage table written next to the methylation table by the BED
+        combiner, which must hold the same sites in the same order.
+        """
+        codes, positions, key_columns = genomic_keys.read_site_keys(
+            coverage_df, self.scaffold_dictionary
+        )
+        if not np.array_equal(
+                genomic_keys.pack_keys(codes, positions), methylation_keys
+            ):
+            raise ValueError(
+                "The coverage table must hold the same sites as the "
+                "methylation table."
+            )
+
+        return coverage_df.iloc[:, key_columns:][cultivars].to_numpy(
+            np.float64
+        )
+
+
+    def __set_coverage(self, coverage_file_path: str) -> None:
+        """
+        Set the per-site read depths from the coverage table.
+        """
+        self.coverage_values = self.__coverage_values(
+            storage.read_table(coverage_file_path), self.methylation_keys,
+            self.methylation_df.columns
+        )
+
+
+    def __site_weights(self, site_rows: np.ndarray = None) -> np.ndarray:
+        """
+        Read depths of the given sites (all sites by default), or None when
+        averaging unweighted.
+        """
+        if self.coverage_values is None:
+            return None
+
+        if site_rows is None:
+            return self.coverage_values
+
+        return self.coverage_values[site_rows]
+
+
+    def __set_bin_coverage_df(
+            self, bin_keys_df: pd.DataFrame, bin_sites: np.ndarray,
+            bin_depths: np.ndarray
+        ) -> None:
+        """
+        Set the per-bin site counts and per-cultivar total depths.
+        """
+        self.bin_coverage_df = pd.concat(
+            [
+                bin_keys_df.reset_index(drop = True),
+                df({"Sites": bin_sites}),
+                df(bin_depths, columns = self.methylation_df.columns)
+            ], axis = 1
+        )
+
+
+    def __virtual_bin_methylation(
+            self, virtual_bin_index: bin_index.VirtualBinIndex
+        ) -> None:
+        """
+        Assign every site to its virtual bin arithmetically and average the
+        sites of each bin. With several workers, the bins are sharded by the
+        bin IDs of the sites, so no per-bin array is built beyond the output.
+        """
+        codes, positions = genomic_keys.unpack_keys(self.methylation_keys)
+        bin_ids = virtual_bin_index.bin_ids(codes, positions)
+        if self.workers > 1:
+            bin_means, bin_sites, bin_depths = \
+                self.__sharded_grouped_means(
+                    bin_ids, virtual_bin_index.total_bins
+                )
+
+        else:
+            in_bins = bin_ids >= 0
+            bin_means, bin_sites, bin_depths = grouped_means(
+                bin_ids[in_bins],
+                self.methylation_df.to_numpy()[in_bins],
+                virtual_bin_index.total_bins, self.__site_weights(in_bins)
+            )
+
+        bin_keys_df = virtual_bin_index.bin_keys_df()
+        self.bins_output_df = pd.concat(
+            [
+                bin_keys_df,
+                df(bin_means, columns = self.methylation_df.columns)
+            ], axis = 1
+        )
+        self.__set_bin_coverage_df(bin_keys_df, bin_sites, bin_depths)
+
+
+    def __sharded_bin_methylation(
+            self, bin_codes: np.ndarray, bin_lower_keys: np.ndarray,
+            bin_upper_keys: np.ndarray
+        ) -> Tuple[np.ndarray]:
+        """
+        Split the bins and sites into scaffold shards of balanced site counts,
+        bin each shard in a worker process and gather the bin means, site
+        counts and depths back in bin order.
+        """
+        site_codes = genomic_keys.unpack_keys(self.methylation_keys)[0]
+        methylation_values = self.methylation_df.to_numpy()
+        shards = scaffold_shards(
+            bin_codes, site_codes, self.workers * shards_per_worker
+        )
+        tasks = (
+            (
+                bin_lower_keys[bin_rows], bin_upper_keys[bin_rows],
+                self.methylation_keys[site_rows],
+                methylation_values[site_rows], self.__site_weights(site_rows)
+            ) for bin_rows, site_rows in shards
+        )
+
+        bin_means = np.zeros((len(bin_codes), methylation_values.shape[1]))
+        bin_sites = np.zeros(len(bin_codes), dtype = np.int64)
+        bin_depths = np.zeros_like(bin_means)
+        with multiprocessing.Pool(self.workers) as pool:
+            for (bin_rows, _), shard_results in zip(
+                    shards, pool.imap(bin_methylation_shard, tasks)
+                ):
+                bin_means[bin_rows], bin_sites[bin_rows], \
+                    bin_depths[bin_rows] = shard_results
+
+        return (bin_means, bin_sites, bin_depths)
+
+
+    def __sharded_grouped_means(
+            self, bin_ids: np.ndarray, total_bins: int
+        ) -> Tuple[np.ndarray]:
+        """
+        Split the bin ID range into shards of balanced site counts, average
+        the sites of each shard's bins in a worker process and gather the bin
+        means, site counts and depths back in bin order.
+        """
+        methylation_values = self.methylation_df.to_numpy()
+        shards = bin_id_shards(
+            bin_ids, total_bins, self.workers * shards_per_worker
+        )
+        tasks = (
+            (
+                bin_ids[site_rows] - first_bin, methylation_values[site_rows],
+                last_bin - first_bin, self.__site_weights(site_rows)
+            ) for first_bin, last_bin, site_rows in shards
+        )
+
+        bin_means = np.zeros((total_bins, methylation_values.shape[1]))
+        bin_sites = np.zeros(total_bins, dtype = np.int64)
+        bin_depths = np.zeros_like(bin_means)
+        with multiprocessing.Pool(self.workers) as pool:
+            for (first_bin, last_bin, _), shard_results in zip(
+                    shards, pool.imap(grouped_means_shard, tasks)
+                ):
+                bin_means[first_bin:last_bin], \
+                    bin_sites[first_bin:last_bin], \
+                    bin_depths[first_bin:last_bin] = shard_results
+
+        return (bin_means, bin_sites, bin_depths)
+
+
+    def __sorted_bin_methylation(self) -> None:
+        """
+        Assign every site to its bin in one vectorized pass by searching the
+        key-sorted bin lower bounds, then average the sites of each bin.
+        """
+        bin_lower_bounds, bin_upper_bounds = self.__bin_bounds(
+            self.bins_output_df.iloc[:, 1].to_numpy(np.float64),
+            self.half_bin_size
+        )
+        bin_lower_keys = genomic_keys.pack_keys(
+            self.bin_codes, bin_lower_bounds.astype(np.int64)
+        )
+        bin_upper_keys = genomic_keys.pack_keys(
+            self.bin_codes, bin_upper_bounds.astype(np.int64)
+        )
+        if self.workers > 1:
+            bin_means, bin_sites, bin_depths = \
+                self.__sharded_bin_methylation(
+                    self.bin_codes, bin_lower_keys, bin_upper_keys
+                )
+
+        else:
+            bin_means, bin_sites, bin_depths = sorted_bin_means(
+                bin_lower_keys, bin_upper_keys, self.methylation_keys,
+                self.methylation_df.to_numpy(),
+                self.__site_weights()
+            )
+
+        self.bins_output_df[self.methylation_df.columns] = bin_means
+        self.__set_bin_coverage_df(
+            self.bins_output_df.iloc[:, 0:2], bin_sites, bin_depths
+        )
+
+
+    def __region_methylation(
+            self, region_index: bin_index.RegionIndex
+        ) -> None:
+        """
+        Find the sites of every region with binary searches over the
+        key-sorted sites and average them; a site in overlapping regions
+        counts towards each of them.
+        """
+        site_order = np.argsort(self.methylation_keys, kind = "stable")
+        first_sites, last_sites = region_index.site_ranges(
+            self.methylation_keys[site_order]
+        )
+        bin_means, bin_sites, bin_depths = region_means(
+            first_sites, last_sites,
+            self.methylation_df.to_numpy()[site_order],
+            self.__site_weights(site_order)
+        )
+        region_keys_df = region_index.region_keys_df()
+        self.bins_output_df = pd.concat(
+            [
+                region_keys_df,
+                df(bin_means, columns = self.methylation_df.columns)
+            ], axis = 1
+        )
+        self.__set_bin_coverage_df(region_keys_df, bin_sites, bin_depths)
+
+
+    def __chunk_bin_sums(
+            self, virtual_bin_index: bin_index.VirtualBinIndex,
+            methylation_chunk: pd.DataFrame, coverage_chunk: pd.DataFrame
+        ) -> Tuple:
+        """
+        Bin IDs of the bins holding the sites of a methylation chunk, in
+        order, with their value sums, site counts and depths, and the chunk's
+        cultivars.
+        """
+        codes, positions, key_columns = genomic_keys.read_site_keys(
+            methylation_chunk, self.scaffold_dictionary
+        )
+        cultivars = methylation_chunk.columns[key_columns:]
+        site_weights = None
+        if coverage_chunk is not None:
+            site_weights = self.__coverage_values(
+                coverage_chunk, genomic_keys.pack_keys(codes, positions),
+                cultivars
+            )
+
+        bin_ids = virtual_bin_index.bin_ids(codes, positions)
+        in_bins = bin_ids >= 0
+        bin_ids = bin_ids[in_bins]
+        if np.any(bin_ids[1:] < bin_ids[:-1]):
+            raise ValueError(
+                "Streaming binning needs the methylation file sorted in "
+                "scaffold sizes file order, then position."
+            )
+
+        chunk_bins, local_bin_ids = np.unique(bin_ids, return_inverse = True)
+        return (chunk_bins,) + grouped_sums(
+            local_bin_ids,
+            methylation_chunk.iloc[:, key_columns:].to_numpy()[in_bins],
+            chunk_bins.size,
+            None if site_weights is None else site_weights[in_bins]
+        ) + (cultivars,)
+
+
+    def __write_bin_range(
+            self, output_writers: Tuple[storage.TableWriter],
+            virtual_bin_index: bin_index.VirtualBinIndex, first_bin: int,
+            last_bin: int, bin_sums: Tuple, cultivars: List[str]
+        ) -> None:
+        """
+        Write bins `first_bin` to `last_bin` - 1 in blocks of at most
+        `chunk_size` bins. `bin_sums` holds the bin IDs, value sums, site
+        counts and depths of the bins with sites; the other bins are empty.
+        """
+        bin_ids, value_sums, bin_sites, bin_depths = bin_sums
+        for block_start in range(first_bin, last_bin, self.chunk_size):
+            block_stop = min(block_start + self.chunk_size, last_bin)
+            block_sums = np.zeros((block_stop - block_start, len(cultivars)))
+            block_sites = np.zeros(block_stop - block_start, dtype = np.int64)
+            block_depths = np.zeros_like(block_sums)
+            lower_idx, upper_idx = np.searchsorted(
+                bin_ids, (block_start, block_stop)
+            )
+            block_rows = bin_ids[lower_idx:upper_idx] - block_start
+            block_sums[block_rows] = value_sums[lower_idx:upper_idx]
+            block_sites[block_rows] = bin_sites[lower_idx:upper_idx]
+            block_depths[block_rows] = bin_depths[lower_idx:upper_idx]
+
+            bin_keys_df = virtual_bin_index.bin_keys_df(
+                np.arange(block_start, block_stop)
+            )
+            output_writers[0].write(pd.concat(
+                [
+                    bin_keys_df, df(
+                        sums_to_means(block_sums, block_sites, block_depths),
+                        columns = cultivars
+                    )
+                ], axis = 1
+            ))
+            output_writers[1].write(pd.concat(
+                [
+                    bin_keys_df, df({"Sites": block_sites}),
+                    df(block_depths, columns = cultivars)
+                ], axis = 1
+            ))
+
+
+    def __stream_bin_methylation(
+            self, virtual_bin_index: bin_index.VirtualBinIndex,
+            methylation_file_path: str, coverage_file_path: str,
+            output_writers: Tuple[storage.TableWriter]
+        ) -> None:
+        """
+        Bin the sorted methylation file in one pass, `chunk_size` sites at a
+        time. Bins before the last bin of a chunk are complete and written
+        straight away; only the last bin's sums are carried into the next
+        chunk.
+        """
+        methylation_chunks = storage.read_table_chunks(
+            methylation_file_path, self.chunk_size
+        )
+        coverage_chunks = None
+        if coverage_file_path is not None:
+            coverage_chunks = storage.read_table_chunks(
+                coverage_file_path, self.chunk_size
+            )
+
+        open_bin = 0 # First bin not yet written.
+        open_sums = None # Sums of the open bin carried over from a chunk.
+        cultivars = None
+        for methylation_chunk in methylation_chunks:
+            coverage_chunk = None
+            if coverage_chunks is not None:
+                coverage_chunk = next(coverage_chunks, None)
+                if coverage_chunk is None:
+                    raise coverage_mismatch_error(
+                        methylation_file_path, coverage_file_path
+                    )
+
+            *chunk_sums, cultivars = self.__chunk_bin_sums(
+                virtual_bin_index, methylation_chunk, coverage_chunk
+            )
+            if chunk_sums[0].size == 0:
+                continue
+
+            if chunk_sums[0][0] < open_bin:
+                raise ValueError(
+                    "Streaming binning needs the methylation file sorted in "
+                    "scaffold sizes file order, then position."
+                )
+
+            if open_sums is not None:
+                if chunk_sums[0][0] == open_bin:
+                    for sums, open_bin_sums in zip(
+                            chunk_sums[1:], open_sums[1:]
+                        ):
+                        sums[0] += open_bin_sums[0]
+
+                else:
+                    chunk_sums = [
+                        np.concatenate((open_bin_sums, sums))
+                        for open_bin_sums, sums in zip(open_sums, chunk_sums)
+                    ]
+
+            last_bin = chunk_sums[0][-1]
+            self.__write_bin_range(
+                output_writers, virtual_bin_index, open_bin, last_bin,
+                chunk_sums, cultivars
+            )
+            open_bin = last_bin
+            open_sums = [sums[-1:] for sums in chunk_sums]
+
+        if coverage_chunks is not None and \
+                next(coverage_chunks, None) is not None:
+            raise coverage_mismatch_error(
+                methylation_file_path, coverage_file_path
+            )
+
+        if cultivars is None:
+            raise ValueError("The methylation file is empty.")
+
+        if open_sums is None:
+            open_sums = (
+                np.zeros(0, dtype = np.int64),
+                np.zeros((0, len(cultivars))), np.zeros(0, dtype = np.int64),
+                np.zeros((0, len(cultivars)))
+            )
+
+        self.__write_bin_range(
+            output_writers, virtual_bin_index, open_bin,
+            virtual_bin_index.total_bins, open_sums, cultivars
+        )
+
+
+    def __write_output_dfs(
+            self, output_file_name: str, coverage_file_name: str,
+            output_dir_path: str, output_format: str
+        ) -> None:
+        """
+        Write the bin methylation and, when the binning engine counts them,
+        the per-bin site counts and depths.
+        """
+        helpers.write_output(
+            self.bins_output_df,
+            storage.output_file_name(output_file_name, output_format),
+            output_dir_path, key_columns = len(bin_index.bin_key_header)
+        )
+        if self.bin_coverage_df is not None:
+            helpers.write_output(
+                self.bin_coverage_df,
+                storage.output_file_name(coverage_file_name, output_format),
+                output_dir_path
+            )
+
+
+    def __load_bin_index(
+            self, bin_mode: str, index_file_path: str
+        ) -> object:
+        """
+        Build or load the bins shared by all locations: the bins file, a
+        virtual bin index or a region index, depending on `bin_mode`.
+        """
+        if bin_mode == "bins":
+            self.__set_bins_df(index_file_path)
+            return None
+
+        if bin_mode == "regions":
+            shared_index = bin_index.read_region_index(index_file_path)
+
+        else:
+            shared_index = bin_index.read_virtual_bin_index(
+                index_file_path, self.bin_size, self.bin_step
+            )
+
+        self.scaffold_dictionary = shared_index.scaffold_dictionary
+        return shared_index
+
+
+    def __bin_location(
+            self, bin_mode: str, shared_index: object,
+            methylation_file_path: str, coverage_file_path: str,
+            output_dir_path: str, output_prefix: str, output_format: str,
+            workers: int
+        ) -> None:
+        """
+        Bin the methylation of one location into the shared bins with
+        `workers` worker processes and write its outputs, with file names
+        prefixed by `output_prefix`.
+        """
+        self.workers = workers
+        output_file_names = [
+            helpers.string_builder((output_prefix, output_file_name))
+            for output_file_name in bin_mode_output_file_names[bin_mode]
+        ]
+        if bin_mode == "streaming":
+            print("\nStreaming average methylation...")
+            output_writers = (
+                helpers.open_output(
+                    storage.output_file_name(
+                        output_file_names[0], output_format
+                    ), output_dir_path,
+                    key_columns = len(bin_index.bin_key_header)
+                ),
+                helpers.open_output(
+                    storage.output_file_name(
+                        output_file_names[1], output_format
+                    ), output_dir_path
+                )
+            )
+            self.__stream_bin_methylation(
+                shared_index, methylation_file_path, coverage_file_path,
+                output_writers
+            )
+            for output_writer in output_writers:
+                output_writer.close()
+
+            return
+
+        print("\nSetting input dataframe...")
+        self.__set_methylation_df(methylation_file_path)
+        if coverage_file_path is not None:
+            self.__set_coverage(coverage_file_path)
+
+        print("\nCalculating average methylation...")
+        if bin_mode == "regions":
+            self.__region_methylation(shared_index)
+
+        elif bin_mode == "virtual":
+            self.__virtual_bin_methylation(shared_index)
+
+        elif self.binning_engine == "searchsorted":
+            self.__add_cultivar_columns()
+            self.__sorted_bin_methylation()
+
+        else:
+            self.__add_cultivar_columns()
+            self.bins_output_df = self.bins_output_df.apply(
+                self.__process_bin_methylation, axis = 1
+            )
+
+        self.__write_output_dfs(
+            *output_file_names, output_dir_path, output_format
+        )
+
+
+    # Main method.
+    def calculate_batch_methylation(
+            self, index_file_path: str, methylation_file_paths: List[str],
+            output_dir_path: str, output_format: str = "tsv",
+            coverage_file_paths: List[str] = None, bin_mode: str = "bins"
+        ) -> None:
+        """
+        Calculates bin methylation at one or more locations. The bins (a bins
+        file, or a scaffold sizes file or regions BED file, depending on
+        `bin_mode`) are read once, then every location is binned in its own
+        process, the workers split between the locations. With several
+        locations, output file names are prefixed with each location's label
+        (see `location_labels`).
+        """
+        start_time = timeit.default_timer()
+        if bin_mode not in bin_modes:
+            raise ValueError(helpers.string_builder((
+                "Unknown bin mode: ", bin_mode
+            )))
+
+        if coverage_file_paths is None:
+            coverage_file_paths = [None] * len(methylation_file_paths)
+
+        if len(coverage_file_paths) != len(methylation_file_paths):
+            raise ValueError(
+                "Give one coverage file per methylation file."
+            )
+
+        if coverage_file_paths[0] is not None and bin_mode == "bins" and \
+                self.binning_engine == "apply":
+            raise ValueError(
+                "Coverage weighting needs the searchsorted binning engine."
+            )
+
+        output_prefixes = [""]
+        if len(methylation_file_paths) > 1:
+            output_prefixes = [
+                helpers.string_builder((location_label, '_'))
+                for location_label in location_labels(methylation_file_paths)
+            ]
+
+        print("\nStart.\nReading bins...")
+        shared_index = self.__load_bin_index(bin_mode, index_file_path)
+
+        # Every location gets an equal share of the workers, at least one.
+        location_workers = max(self.workers // len(methylation_file_paths), 1)
+        location_tasks = [
+            (
+                bin_mode, shared_index, methylation_file_path,
+                coverage_file_path, output_dir_path, output_prefix,
+                output_format, location_workers
+            ) for methylation_file_path, coverage_file_path, output_prefix
+            in zip(
+                methylation_file_paths, coverage_file_paths, output_prefixes
+            )
+        ]
+        if len(location_tasks) == 1:
+            self.__bin_location(*location_tasks[0])
+
+        else:
+            # Locations write to the same output directory concurrently.
+            helpers.create_output_directory(output_dir_path)
+
+            # Initialize a process for each location.
+            location_processes = [
+                multiprocessing.Process(
+                    target = self.__bin_location, args = location_task
+                ) for location_task in location_tasks
+            ]
+            for location_process in location_processes:
+                location_process.start()
+
+            for location_process in location_processes:
+                location_process.join()
+
+            failed_files = [
+                methylation_file_path for methylation_file_path, process in
+                zip(methylation_file_paths, location_processes)
+                if process.exitcode != 0
+            ]
+            if failed_files:
+                raise RuntimeError(helpers.string_builder((
+                    "Binning failed for: ", ", ".join(failed_files)
+                )))
+
+        helpers.print_program_runtime(
+            "Region methylation" if bin_mode == "regions" \
+                else "Methylation binning", start_time
+        )
+
+
+    # Main method.
+    def calculate_region_methylation(
+            self, region_bed_file_path: str, methylation_file_path: str,
+            output_dir_path: str, output_format: str = "tsv",
+            coverage_file_path: str = None
+        ) -> None:
+        """
+        Calculates methylation for all regions of a BED file, e.g. genes,
+        promoters or DMRs.
+        """
+        self.calculate_batch_methylation(
+            region_bed_file_path, [methylation_file_path], output_dir_path,
+            output_format, [coverage_file_path], "regions"
+        )
+
+
+    # Main method.
+    def calculate_streaming_bin_methylation(
+            self, scaffold_sizes_file_path: str, methylation_file_path: str,
+            output_dir_path: str, output_format: str = "tsv",
+            coverage_file_path: str = None
+        ) -> None:
+        """
+        Calculates bin methylation for all virtual bins in a single streaming
+        pass over the methylation file, which must be sorted in scaffold
+        sizes file order, then position. Peak memory depends on the chunk
+        size, not the genome size.
+        """
+        self.calculate_batch_methylation(
+            scaffold_sizes_file_path, [methylation_file_path],
+            output_dir_path, output_format, [coverage_file_path], "streaming"
+        )
+
+
+    # Main method.
+    def calculate_virtual_bin_methylation(
+            self, scaffold_sizes_file_path: str, methylation_file_path: str,
+            output_dir_path: str, output_format: str = "tsv",
+            coverage_file_path: str = None
+        ) -> None:
+        """
+        Calculates bin methylation for all bins of a virtual bin index built
+        from the scaffold sizes file, without a materialized bins file.
+        """
+        self.calculate_batch_methylation(
+            scaffold_sizes_file_path, [methylation_file_path],
+            output_dir_path, output_format, [coverage_file_path], "virtual"
+        )
+
+
     # Main method.
     def calculate_all_bin_methylation(
             self, bin_file_path: str, methylation_file_path: str,
-            output_dir_path: str
+            output_dir_path: str, output_format: str = "tsv",
+            coverage_file_path: str = None
         ) -> None:
         """
-        Calculates bin methylation for all bins.
+        Calculates bin methylation for all bins. With a coverage table, site
+        means are weighted by read depth.
         """
-        start_time = timeit.default_timer()
-        bin_file_path, methylation_file_path, output_dir_path = \
-            helpers.remove_trailing_slash((
-                bin_file_path, methylation_file_path, output_dir_path
-            ))
+        self.calculate_batch_methylation(
+            bin_file_path, [methylation_file_path], output_dir_path,
+            output_format, [coverage_file_path], "bins"
+        )
 
-        print("\nStart.\nSetting input dataframes...")
-        self.__set_dfs(bin_file_path, methylation_file_path)
 
-        print("\nCalculating average methylation...")
-        self.bins_output_df.apply(self.__process_bin_methylation, axis = 1)
+def location_labels(methylation_file_paths: List[str]) -> List[str]:
+    """
+    Label of each location: the name of the directory holding its
+    methylation file (the BED combiner writes each location's table to its
+    BED directory), or else the methylation file name, whichever tells the
+    locations apart.
+    """
+    for labels in (
+            [
+                os.path.basename(os.path.dirname(os.path.abspath(file_path)))
+                for file_path in methylation_file_paths
+            ],
+            [
+                os.path.splitext(os.path.basename(file_path))[0]
+                for file_path in methylation_file_paths
+            ]
+        ):
+        if len(set(labels)) == len(labels):
+            return labels
 
-        helpers.write_output(
-            self.bins_output_df, "methylation_bins.tsv", output_dir_path
+    raise ValueError(
+        "Methylation files need distinct directory or file names."
+    )
+
+
+def grouped_sums(
+        bin_ids: np.ndarray, methylation_values: np.ndarray, total_bins: int,
+        site_weights: np.ndarray = None
+    ) -> Tuple[np.ndarray]:
+    """
+    Per-bin, per-cultivar weighted sum of the site values in each bin,
+    skipping missing values and weighting each site by `site_weights` (e.g.
+    read depth), if given. Returns the value sums, the number of sites in each
+    bin and the total weight of each cultivar's sites in each bin (the number
+    of sites with a value when unweighted).
+    """
+    value_sums = np.zeros((total_bins, methylation_values.shape[1]))
+    bin_depths = np.zeros_like(value_sums)
+    bin_sites = np.bincount(bin_ids, minlength = total_bins)
+    for cultivar_idx in range(methylation_values.shape[1]):
+        cultivar_values = methylation_values[:, cultivar_idx]
+        present = ~np.isnan(cultivar_values)
+        cultivar_weights = present.astype(np.float64)
+        if site_weights is not None:
+            cultivar_weights *= np.nan_to_num(site_weights[:, cultivar_idx])
+
+        value_sums[:, cultivar_idx] = np.bincount(
+            bin_ids,
+            weights = np.where(present, cultivar_values, 0) * cultivar_weights,
+            minlength = total_bins
         )
+        bin_depths[:, cultivar_idx] = np.bincount(
+            bin_ids, weights = cultivar_weights, minlength = total_bins
+        )
+
+    return (value_sums, bin_sites, bin_depths)
+
+
+def sums_to_means(
+        value_sums: np.ndarray, bin_sites: np.ndarray, bin_depths: np.ndarray
+    ) -> np.ndarray:
+    """
+    Bin means from `grouped_sums`. Bins without sites are 0; bins whose sites
+    are all missing (or weightless) for a cultivar are NaN.
+    """
+    with np.errstate(invalid = "ignore", divide = "ignore"):
+        return np.where(
+            bin_sites[:, np.newaxis] > 0, value_sums / bin_depths, 0
+        )
+
+
+def grouped_means(
+        bin_ids: np.ndarray, methylation_values: np.ndarray, total_bins: int,
+        site_weights: np.ndarray = None
+    ) -> Tuple[np.ndarray]:
+    """
+    Per-bin, per-cultivar mean of the sites in each bin (see `grouped_sums`).
+    Returns the bin means, site counts and depths.
+    """
+    value_sums, bin_sites, bin_depths = grouped_sums(
+        bin_ids, methylation_values, total_bins, site_weights
+    )
+    return (
+        sums_to_means(value_sums, bin_sites, bin_depths), bin_sites,
+        bin_depths
+    )
+
+
+def sorted_bin_means(
+        bin_lower_keys: np.ndarray, bin_upper_keys: np.ndarray,
+        site_keys: np.ndarray, methylation_values: np.ndarray,
+        site_weights: np.ndarray = None
+    ) -> Tuple[np.ndarray]:
+    """
+    Assign every site to its bin in one vectorized pass by searching the
+    key-sorted bin lower bounds, then average the sites of each bin (see
+    `grouped_means`).
+    """
+    bin_order = np.argsort(bin_lower_keys, kind = "stable")
+    if np.any(bin_lower_keys[bin_order][1:] <= bin_upper_keys[bin_order][:-1]):
+        raise ValueError(
+            "The searchsorted binning engine needs non-overlapping bins."
+        )
+
+    # Last bin starting at or before each site, if the site is within it.
+    candidate_idx = np.searchsorted(
+        bin_lower_keys[bin_order], site_keys, side = "right"
+    ) - 1
+    bin_ids = bin_order[np.maximum(candidate_idx, 0)]
+    in_bins = (candidate_idx >= 0) & (site_keys <= bin_upper_keys[bin_ids])
+
+    return grouped_means(
+        bin_ids[in_bins], methylation_values[in_bins], len(bin_lower_keys),
+        None if site_weights is None else site_weights[in_bins]
+    )
+
+
+def region_means(
+        first_sites: np.ndarray, last_sites: np.ndarray,
+        methylation_values: np.ndarray, site_weights: np.ndarray = None
+    ) -> Tuple[np.ndarray]:
+    """
+    Per-region, per-cultivar mean of the sites in each region, given the
+    half-open range of rows of every region in the key-sorted methylation
+    values (and site weights, if any). Prefix sums make each region O(1),
+    however much regions overlap. Returns the same means, site counts and
+    depths as `grouped_means`.
+    """
+    present = ~np.isnan(methylation_values)
+    weights = present.astype(np.float64)
+    if site_weights is not None:
+        weights *= np.nan_to_num(site_weights)
+
+    value_sums = np.cumsum(
+        np.where(present, methylation_values, 0) * weights, axis = 0
+    )
+    weight_sums = np.cumsum(weights, axis = 0)
+    value_sums = np.vstack((np.zeros((1, value_sums.shape[1])), value_sums))
+    weight_sums = np.vstack((np.zeros((1, weight_sums.shape[1])), weight_sums))
+
+    region_sites = last_sites - first_sites
+    region_depths = weight_sums[last_sites] - weight_sums[first_sites]
+    means = sums_to_means(
+        value_sums[last_sites] - value_sums[first_sites], region_sites,
+        region_depths
+    )
+    return (means, region_sites, region_depths)
+
+
+def bin_methylation_shard(shard: Tuple[np.ndarray]) -> Tuple[np.ndarray]:
+    """
+    Process pool worker: bin means, site counts and depths of one scaffold
+    shard, given its bin lower and upper keys, site keys, methylation values
+    and site weights.
+    """
+    return sorted_bin_means(*shard)
+
+
+def coverage_mismatch_error(
+        methylation_file_path: str, coverage_file_path: str
+    ) -> ValueError:
+    """
+    Error for a coverage file whose sites do not line up with its
+    methylation file's.
+    """
+    return ValueError(helpers.string_builder((
+        "The coverage file ", coverage_file_path,
+        " must hold the same sites as the methylation file ",
+        methylation_file_path, '.'
+    )))
+
+
+def grouped_means_shard(shard: Tuple[np.ndarray]) -> Tuple[np.ndarray]:
+    """
+    Process pool worker: bin means, site counts and depths of one bin ID
+    shard, given its sites' bin IDs (from the shard's first bin), methylation
+    values, number of bins and site weights.
+    """
+    return grouped_means(*shard)
+
+
+def bin_id_shards(
+        bin_ids: np.ndarray, total_bins: int, num_shards: int
+    ) -> List[Tuple]:
+    """
+    Partition the bin ID range into at most `num_shards` shards of
+    consecutive bins holding similar numbers of sites. Returns the first and
+    last (exclusive) bin and the site rows of each shard, in bin order. Sites
+    outside every bin (bin ID -1) are left out.
+    """
+    site_rows = np.flatnonzero(bin_ids >= 0)
+    site_rows = site_rows[np.argsort(bin_ids[site_rows], kind = "stable")]
+    sorted_ids = bin_ids[site_rows]
+
+    # Cut at the bin of each multiple of an even site share.
+    site_shares = (
+        sorted_ids.size * np.arange(1, num_shards) // num_shards
+    ).astype(np.int64)
+    shard_cuts = np.unique(np.concatenate((
+        [0], sorted_ids[site_shares[site_shares < sorted_ids.size]],
+        [total_bins]
+    )))
+    site_starts = np.searchsorted(sorted_ids, shard_cuts)
+    return [
+        (
+            first_bin, last_bin,
+            site_rows[site_starts[cut_idx]:site_starts[cut_idx + 1]]
+        ) for cut_idx, (first_bin, last_bin) in enumerate(
+            zip(shard_cuts[:-1], shard_cuts[1:])
+        )
+    ]
+
+
+def scaffold_shards(
+        bin_codes: np.ndarray, site_codes: np.ndarray, num_shards: int
+    ) -> List[Tuple[np.ndarray]]:
+    """
+    Partition the bins and sites into at most `num_shards` shards of whole,
+    consecutive scaffolds (in bin order) holding similar numbers of sites.
+    Returns the bin rows and site rows of each shard, in genome order. Sites
+    on scaffolds without bins are left out.
+    """
+    bin_codes = np.asarray(bin_codes, dtype = np.int64)
+    site_codes = np.asarray(site_codes, dtype = np.int64)
+    scaffold_codes, first_bin_rows = np.unique(bin_codes, return_index = True)
+    genome_order = scaffold_codes[np.argsort(first_bin_rows)]
+    num_scaffolds = genome_order.size
+
+    # Scaffolds without bins rank last.
+    scaffold_ranks = np.full(
+        max(bin_codes.max(initial = -1), site_codes.max(initial = -1)) + 1,
+        num_scaffolds
+    )
+    scaffold_ranks[genome_order] = np.arange(num_scaffolds)
+    bin_ranks = scaffold_ranks[bin_codes]
+    site_ranks = scaffold_ranks[site_codes]
+    bin_rows = np.argsort(bin_ranks, kind = "stable")
+    site_rows = np.argsort(site_ranks, kind = "stable")
+    bin_starts = np.searchsorted(
+        bin_ranks[bin_rows], np.arange(num_scaffolds + 1)
+    )
+    site_starts = np.searchsorted(
+        site_ranks[site_rows], np.arange(num_scaffolds + 1)
+    )
 
-        helpers.print_program_runtime("Methylation binning", start_time)
+    # Cut at the first scaffold reaching each multiple of an even site share.
+    site_shares = site_starts[-1] * np.arange(1, num_shards) / num_shards
+    shard_cuts = np.unique(np.concatenate((
+        [0], np.searchsorted(site_starts, site_shares), [num_scaffolds]
+    )))
+    return [
+        (
+            bin_rows[bin_starts[first]:bin_starts[last]],
+            site_rows[site_starts[first]:site_starts[last]]
+        ) for first, last in zip(shard_cuts[:-1], shard_cuts[1:])
+    ]
 
 
 # mb = MethylationBinner()
@@ -15,14 +15,32 @@ Inputs:
 - Output directory path.
 
 Outputs:
-- Log TXT stdout files.
+- Log TXT files, at a chosen log level (see `result_logger`).
 - TSV file holding paired T-test results (t-value, p-value, methylation ratio,
   nominal significance) for each set of paired T-tests.
 
+Cross-cultivar T-test engines:
+- vectorized (default): test all bins at once as (bins x cultivars) matrices
+  of paired differences, in chunks of bins sized to a memory budget.
+- apply: test one bin at a time with `sps.ttest_rel`.
+
+Cross-cultivar T-tests optionally write a per-bin JSON lines record file next
+to their results table.
+
+Streaming T-tests read the Lethbridge and Vegreville files in aligned chunks
+of bins, in one pass: cross-cultivar T-tests are written chunk by chunk, while
+the within-cultivar and global T-tests are built from running, per-cultivar
+moments of the paired differences and location values, merged chunk by chunk
+(Chan et al.'s pairwise update). Memory is bounded by the chunk size.
+
 """
 
-from . import List, multiprocessing, sys, timeit, math, df, pd, sps
-from . import helpers
+from . import Callable, Iterator, List, multiprocessing, timeit, math, \
+    Tuple, df, np, pd, sps
+from . import bed_reader, helpers, hit_collector, result_logger, \
+    shared_arrays, storage
+
+t_test_engines = ("vectorized", "apply")
 
 
 class PairedTTesterInput:
@@ -37,13 +55,33 @@ class PairedTTesterInput:
         """
         Set input dataframes from given Lethbridge and Vegreville file paths.
         """
-        self.lethbridge_df = pd.read_table(lethbridge_file_path)
-        self.vegreville_df = pd.read_table(vegreville_file_path)
+        self.lethbridge_df = storage.read_table(lethbridge_file_path)
+        self.vegreville_df = storage.read_table(vegreville_file_path)
 
 
 class LocalPairedTTestOutput:
-    def __init__(self) -> None:
+    def __init__(
+            self, t_test_engine: str = "vectorized",
+            memory_budget: int = helpers.default_memory_budget,
+            log_level: str = result_logger.default_log_level,
+            bin_records: bool = False, p_threshold: float = None,
+            top_k: int = None
+        ) -> None:
+        if t_test_engine not in t_test_engines:
+            raise ValueError(helpers.string_builder((
+                "Unknown T-test engine: ", t_test_engine
+            )))
+
         self.bins_output_df = None
+        self.key_df = None # Scaffold and position of every bin tested.
+        self.t_test_engine = t_test_engine
+        self.memory_budget = memory_budget
+        self.log_level = log_level
+        self.bin_records = bin_records
+        self.p_threshold = p_threshold
+        self.top_k = top_k
+        self.logger = None
+        self.first_bin = 0 # Number of the first bin, when streaming chunks.
 
 
     def __set_output_df(self, methylation_input_df: pd.DataFrame) -> None:
@@ -51,18 +89,53 @@ class LocalPairedTTestOutput:
         Set output dataframes given an input dataframe's Scaffold and Position
         column data.
         """
-        self.bins_output_df = methylation_input_df.iloc[:, 0:2]
+        self.bins_output_df = methylation_input_df.iloc[:, 0:2].copy()
+        self.key_df = self.bins_output_df
 
         # Default values.
-        self.bins_output_df["T_Statistic"] = 0
-        self.bins_output_df["P_Value"] = 1
-        self.bins_output_df["Methylation_Ratio"] = 1
+        self.bins_output_df["T_Statistic"] = 0.0
+        self.bins_output_df["P_Value"] = 1.0
+        self.bins_output_df["Methylation_Ratio"] = 1.0
         self.bins_output_df["Significant?"] = False
 
 
+    def __log_bin(
+            self, bin_idx: int, t_stat: float, p_value: float,
+            methylation_ratio: float, significant: bool, filtered: bool
+        ) -> None:
+        """
+        Log the T-test result of one bin: a text block at the "bins" log
+        level, and its per-bin record.
+        """
+        scaffold = str(self.key_df.iloc[bin_idx, 0])
+        bin_label = self.key_df.iloc[bin_idx, 1]
+        if self.logger.logs("bins"):
+            if filtered:
+                self.logger.log(helpers.string_builder((
+                    '\n', scaffold, '-', str(bin_label),
+                    " has been filtered...\n"
+                )), "bins")
+
+            else:
+                # Quick search string in the log file.
+                wrapping_flair = helpers.string_builder(('\n', '+' * 10, '\n'))
+                self.logger.log(helpers.string_builder((
+                    wrapping_flair, "T-Test: ", scaffold, '-', str(bin_label),
+                    "\nT_Statistic: ", str(t_stat), "\nP_Value: ",
+                    str(p_value), "\nMethylation_Ratio: ",
+                    str(methylation_ratio), wrapping_flair
+                )), "bins")
+
+        self.logger.record({
+            "#Scaffold": scaffold, "Bin_Label": bin_label,
+            "T_Statistic": t_stat, "P_Value": p_value,
+            "Methylation_Ratio": methylation_ratio, "Significant?": significant,
+            "Filtered": filtered
+        })
+
+
     def __filter_and_test(
-            self, lethbridge_data: str, vegreville_data: str, bin_idx: int,
-            scaffold: str, bin_label: str, quick_search: str
+            self, lethbridge_data: str, vegreville_data: str, bin_idx: int
         ) -> None:
         """
         Filter out bins where Lethbridge and Vegreville data is identical
@@ -79,22 +152,13 @@ class LocalPairedTTestOutput:
             self.bins_output_df.iloc[bin_idx, 2:4] = model[:]
             self.bins_output_df.iloc[bin_idx, 4] = methylation_ratio
             self.bins_output_df.iloc[bin_idx, 5] = significant
-
-            # Printing to stdout to log findings.
-            wrapping_flair = helpers.string_builder(('\n', '+' * 10, '\n'))
-            print(helpers.string_builder((
-                wrapping_flair, quick_search, "\nT_Statistic: ",
-                str(model[0]), "\nP_Value: ", str(model[1]),
-                "\nMethylation_Ratio: ", methylation_ratio,
-                wrapping_flair
-            )))
+            self.__log_bin(
+                bin_idx, model[0], model[1], methylation_ratio, significant,
+                False
+            )
 
         else:
-            # Printing to stdout to log findings.
-            print(helpers.string_builder((
-                    '\n', scaffold, '-', str(bin_label),
-                    " has been filtered...\n"
-            )))
+            self.__log_bin(bin_idx, 0.0, 1.0, 1.0, False, True)
 
 
     def __iter_bins(
@@ -106,24 +170,109 @@ class LocalPairedTTestOutput:
         Lethbridge bin data if the bin has not been filtered.
         """
         bin_idx = bin_row.name
-        scaffold = bin_row[0]
-        bin_label = str(bin_row[1])
-
-        # Quick search string in stdout log file.
-        quick_search = helpers.string_builder((
-            "T-Test: ", scaffold, '-', str(bin_label)
-        ))
-
         lethbridge_data = pd.to_numeric(
-            lethbridge_input_df.loc[bin_idx][2:]
+            lethbridge_input_df.loc[bin_idx].iloc[2:]
         )
         vegreville_data = pd.to_numeric(
-            vegreville_input_df.loc[bin_idx][2:]
+            vegreville_input_df.loc[bin_idx].iloc[2:]
         )
 
-        self.__filter_and_test(
-            lethbridge_data, vegreville_data, bin_idx, scaffold, bin_label,
-            quick_search
+        self.__filter_and_test(lethbridge_data, vegreville_data, bin_idx)
+
+
+    def __log_chunk(
+            self, chunk_start: int, chunk_stop: int,
+            chunk_results: Tuple[np.ndarray]
+        ) -> None:
+        """
+        Log a summary of a chunk of bins tested by the vectorized engine, and
+        the results of each of its bins at the "bins" log level or as per-bin
+        records.
+        """
+        self.logger.log(helpers.string_builder((
+            "Bins ", str(self.first_bin + chunk_start), '-',
+            str(self.first_bin + chunk_stop - 1), ": ",
+            str(int(np.sum(~chunk_results[4]))), " tested, ",
+            str(int(np.sum(chunk_results[4]))), " filtered, ",
+            str(int(np.sum(chunk_results[3]))), " significant."
+        )))
+        if self.logger.logs("bins"):
+            for chunk_idx, bin_results in enumerate(zip(*chunk_results)):
+                self.__log_bin(chunk_start + chunk_idx, *bin_results)
+
+        elif self.logger.records():
+            records_df = self.__chunk_output_df(
+                chunk_start, chunk_stop, chunk_results
+            )
+            records_df["Filtered"] = chunk_results[4]
+            self.logger.record_df(records_df)
+
+
+    def __chunk_output_df(
+            self, chunk_start: int, chunk_stop: int,
+            chunk_results: Tuple[np.ndarray]
+        ) -> pd.DataFrame:
+        """
+        Output rows of a chunk of bins tested by the vectorized engine.
+        """
+        chunk_output_df = self.key_df.iloc[chunk_start:chunk_stop].copy()
+        chunk_output_df["T_Statistic"] = chunk_results[0]
+        chunk_output_df["P_Value"] = chunk_results[1]
+        chunk_output_df["Methylation_Ratio"] = chunk_results[2]
+        chunk_output_df["Significant?"] = chunk_results[3]
+        return chunk_output_df
+
+
+    def __vectorized_local_t_test(
+            self, lethbridge_input_df: pd.DataFrame,
+            vegreville_input_df: pd.DataFrame,
+            output_writer: "storage.TableWriter | hit_collector.HitCollector"
+        ) -> None:
+        """
+        Perform cross-cultivar paired T-tests on all bins at once, in chunks of
+        bins sized to the memory budget. Each chunk of results is written to
+        `output_writer` as it is tested, so no full output table is built.
+        """
+        check_paired_bins(lethbridge_input_df, vegreville_input_df)
+        self.key_df = lethbridge_input_df.iloc[:, 0:2]
+        total_bins = self.key_df.shape[0]
+        chunk_bins = helpers.budget_rows(
+            self.memory_budget, lethbridge_input_df.shape[1] - 2
+        )
+        for chunk_start in range(0, total_bins, chunk_bins):
+            chunk_stop = min(chunk_start + chunk_bins, total_bins)
+            # Row-major chunks: row sums do not depend on the input layout.
+            chunk_results = paired_t_test_matrix(
+                np.ascontiguousarray(vegreville_input_df.iloc[
+                    chunk_start:chunk_stop, 2:
+                ].to_numpy(np.float64)),
+                np.ascontiguousarray(lethbridge_input_df.iloc[
+                    chunk_start:chunk_stop, 2:
+                ].to_numpy(np.float64))
+            )
+            self.__log_chunk(chunk_start, chunk_stop, chunk_results)
+            hit_collector.write_chunk(
+                output_writer, self.__chunk_output_df(
+                    chunk_start, chunk_stop, chunk_results
+                ), chunk_results[4]
+            )
+
+
+    def chunk_t_test(
+            self, lethbridge_chunk_df: pd.DataFrame,
+            vegreville_chunk_df: pd.DataFrame, first_bin: int,
+            logger: result_logger.ResultLogger,
+            output_writer: "storage.TableWriter | hit_collector.HitCollector"
+        ) -> None:
+        """
+        Perform cross-cultivar paired T-tests on one chunk of bins, starting
+        at bin `first_bin`, with the vectorized engine, logging to `logger`
+        and writing the output rows of the chunk to `output_writer`.
+        """
+        self.logger = logger
+        self.first_bin = first_bin
+        self.__vectorized_local_t_test(
+            lethbridge_chunk_df, vegreville_chunk_df, output_writer
         )
 
 
@@ -181,41 +330,70 @@ class LocalPairedTTestOutput:
 
     def local_t_test_and_write(
             self, lethbridge_input_df: pd.DataFrame,
-            vegreville_input_df: pd.DataFrame, output_dir_path: str
+            vegreville_input_df: pd.DataFrame, output_dir_path: str,
+            output_format: str = "tsv"
         ) -> None:
         """
         Perform cross-cultivar paired T-tests and save the output dataframe to
         a file.
         """
         print("Local t-test start.")
+        output_file_name = storage.output_file_name(
+            "cross_variety_methylation_ttest.tsv", output_format
+        )
 
-        # Prints stdout to separate file.
-        sys.stdout = open("local_t_test_stdout.txt", 'w')
+        # Logs to a separate file.
+        self.logger = result_logger.open_logger(
+            "local_t_test_stdout.txt", self.log_level, output_dir_path,
+            output_file_name if self.bin_records else None
+        )
         wrapping_flair = helpers.string_builder((
             '\n', '-' * 5, '*' * 10, '-' * 5, '\n'
         ))
-        print(helpers.string_builder((
+        self.logger.log(helpers.string_builder((
             wrapping_flair, "Cross Variety T-Tests", wrapping_flair
         )))
 
-        # Cross-cultivar paired T-tests.
-        self.__set_output_df(lethbridge_input_df)
-        tmp = self.bins_output_df.apply(
-            self.__iter_bins, axis = 1,
-            args = (lethbridge_input_df, vegreville_input_df)
-        )
-        del tmp
-        helpers.write_output(
-            output_df = self.bins_output_df,
-            output_file_name = "cross_variety_methylation_ttest.tsv",
-            output_dir_path = output_dir_path
-        )
-        sys.stdout.close()
+        # Cross-cultivar paired T-tests: the vectorized engine writes its
+        # results chunk by chunk.
+        if self.t_test_engine == "vectorized":
+            output_writer = hit_collector.open_output(
+                output_file_name, output_dir_path, self.p_threshold,
+                self.top_k, lethbridge_input_df.columns[0:2].tolist() + [
+                    "T_Statistic", "P_Value", "Methylation_Ratio",
+                    "Significant?"
+                ]
+            )
+            self.__vectorized_local_t_test(
+                lethbridge_input_df, vegreville_input_df, output_writer
+            )
+            output_writer.close()
+
+        else:
+            self.__set_output_df(lethbridge_input_df)
+            tmp = self.bins_output_df.apply(
+                self.__iter_bins, axis = 1,
+                args = (lethbridge_input_df, vegreville_input_df)
+            )
+            del tmp
+
+            hit_collector.write_output(
+                output_df = self.bins_output_df,
+                output_file_name = output_file_name,
+                output_dir_path = output_dir_path,
+                p_threshold = self.p_threshold, top_k = self.top_k
+            )
+
+        self.logger.close()
 
 
 class CultivarPairedTTestOutput:
-    def __init__(self) -> None:
+    def __init__(
+            self, log_level: str = result_logger.default_log_level
+        ) -> None:
         self.cultivars_output_df = None
+        self.log_level = log_level
+        self.logger = None
 
 
     def __set_output_df(self, methylation_input_df: pd.DataFrame) -> None:
@@ -223,7 +401,7 @@ class CultivarPairedTTestOutput:
         Set output dataframes given an input dataframe's cultivars.
         """
         self.cultivars_output_df = df(
-            data = 0,
+            data = 0.0, index = range(methylation_input_df.shape[1] - 2),
             columns = [
                 "Cultivar", "T_Statistic", "P_Value", "Methylation_Ratio",
                 "Significant?"
@@ -231,9 +409,9 @@ class CultivarPairedTTestOutput:
         )
 
         # Default values.
-        self.cultivars_output_df["Cultivar"] = methylation_input_df.columns[2:],
-        self.cultivars_output_df["P_Value"] = 1
-        self.cultivars_output_df["Methylation_Ratio"] = 1
+        self.cultivars_output_df["Cultivar"] = methylation_input_df.columns[2:]
+        self.cultivars_output_df["P_Value"] = 1.0
+        self.cultivars_output_df["Methylation_Ratio"] = 1.0
         self.cultivars_output_df["Significant?"] = False
 
 
@@ -254,9 +432,9 @@ class CultivarPairedTTestOutput:
         self.cultivars_output_df.iloc[cultivar_idx, 4] = significant
 
         wrapping_flair = helpers.string_builder(('\n', '+' * 10, '\n'))
-        print(helpers.string_builder((
+        self.logger.log(helpers.string_builder((
             "T_Statistic: ", str(model[0]), "\nP_Value: ", str(model[1]),
-            "\nMethylation_Ratio: ", methylation_ratio, wrapping_flair
+            "\nMethylation_Ratio: ", str(methylation_ratio), wrapping_flair
         )))
 
 
@@ -269,8 +447,8 @@ class CultivarPairedTTestOutput:
         and Lethbridge cultivar data.
         """
         cultivar_idx = cultivar_row.name
-        cultivar = cultivar_row[0]
-        print(helpers.string_builder((
+        cultivar = cultivar_row.iloc[0]
+        self.logger.log(helpers.string_builder((
             "\n++++++++++\n", "T-Test: ", cultivar, '\n'
         )))
 
@@ -320,19 +498,22 @@ class CultivarPairedTTestOutput:
 
     def cultivar_t_test_and_write(
             self, lethbridge_input_df: pd.DataFrame,
-            vegreville_input_df: pd.DataFrame, output_dir_path: str
+            vegreville_input_df: pd.DataFrame, output_dir_path: str,
+            output_format: str = "tsv"
         ) -> None:
         """
         Perform cross-cultivar paired T-tests and save output to a file.
         """
         print("Cultivar t-test start.")
 
-        # Prints stdout to separate file.
-        sys.stdout = open("cultivar_t_test_stdout.txt", 'w')
+        # Logs to a separate file.
+        self.logger = result_logger.open_logger(
+            "cultivar_t_test_stdout.txt", self.log_level
+        )
         wrapping_flair = helpers.string_builder((
             '\n', '-' * 5, '*' * 10, '-' * 5, '\n'
         ))
-        print(helpers.string_builder((
+        self.logger.log(helpers.string_builder((
             wrapping_flair, "Within Variety T-Tests", wrapping_flair
         )))
 
@@ -344,16 +525,22 @@ class CultivarPairedTTestOutput:
         del tmp
         helpers.write_output(
             output_df = self.cultivars_output_df,
-            output_file_name = "within_variety_methylation_ttest.tsv",
+            output_file_name = storage.output_file_name(
+                "within_variety_methylation_ttest.tsv", output_format
+            ),
             output_dir_path = output_dir_path
         )
-        sys.stdout.close()
+        self.logger.close()
 
 
 class GlobalPairedTTestOutput:
-    def __init__(self) -> None:
+    def __init__(
+            self, log_level: str = result_logger.default_log_level
+        ) -> None:
         self.global_means_df = None
         self.global_output_df = None
+        self.log_level = log_level
+        self.logger = None
 
 
     def __set_output_dfs(self, cultivars: pd.Index) -> None:
@@ -361,11 +548,13 @@ class GlobalPairedTTestOutput:
         Set global output dataframes..
         """
         self.global_means_df = df(
-            index = cultivars, columns = ["Lethbridge", "Vegreville"], data = 0
+            index = cultivars, columns = ["Lethbridge", "Vegreville"],
+            data = 0.0
         )
         self.global_output_df = df(
             index = ["Global_T_Test"],
-            columns = ["T_Statistic", "P_Value", "Methylation_Ratio"], data = 0
+            columns = ["T_Statistic", "P_Value", "Methylation_Ratio"],
+            data = 0.0
         )
 
 
@@ -376,13 +565,10 @@ class GlobalPairedTTestOutput:
         """
         Perform global paired T-test.
         """
-        # Dropping non-data columns
-        vegreville_input_df.drop(
-            ["#Scaffold", "Bin_Label"], axis = 1, inplace = True
-        )
-        lethbridge_input_df.drop(
-            ["#Scaffold", "Bin_Label"], axis = 1, inplace = True
-        )
+        # Non-data columns are left out rather than dropped: the input data
+        # is shared, read-only, with the other T-test workers.
+        vegreville_input_df = vegreville_input_df.iloc[:, 2:]
+        lethbridge_input_df = lethbridge_input_df.iloc[:, 2:]
 
         # Setting paired T-test results.
         self.global_means_df["Vegreville"] = \
@@ -394,50 +580,288 @@ class GlobalPairedTTestOutput:
             self.global_means_df["Lethbridge"]
         )
         self.global_output_df.iloc[0, 0:2] = model[:]
+        self.logger.log(helpers.string_builder((
+            "T_Statistic: ", str(model[0]), "\nP_Value: ", str(model[1])
+        )))
 
         # Setting methylation ratio.
         self.global_output_df.iloc[0, 2] = vegreville_input_df.sum().sum() / \
-            vegreville_input_df.sum().sum()
+            lethbridge_input_df.sum().sum()
         self.global_output_df.index = ["global"]
 
 
     def global_t_test_and_write(
             self, lethbridge_input_df: pd.DataFrame,
-            vegreville_input_df: pd.DataFrame, output_dir_path: str
+            vegreville_input_df: pd.DataFrame, output_dir_path: str,
+            output_format: str = "tsv"
         ) -> None:
         """
         Perform global paired T-test and save output to a file.
         """
         print("Global t-test start.")
 
-        # Prints stdout to separate file.
-        sys.stdout = open("global_t_test_stdout.txt", 'w')
+        # Logs to a separate file.
+        self.logger = result_logger.open_logger(
+            "global_t_test_stdout.txt", self.log_level
+        )
         wrapping_flair = helpers.string_builder((
             '\n', '-' * 5, '*' * 10, '-' * 5, '\n'
         ))
-        print(helpers.string_builder((
+        self.logger.log(helpers.string_builder((
             wrapping_flair, "Global T-Tests", wrapping_flair
         )))
 
-        self.__set_output_dfs(lethbridge_input_df.columns)
+        self.__set_output_dfs(lethbridge_input_df.columns[2:])
         self.__global_t_test(lethbridge_input_df, vegreville_input_df)
         helpers.write_output(
             output_df = self.global_output_df,
-            output_file_name = "global_methylation_ttest.tsv",
+            output_file_name = storage.output_file_name(
+                "global_methylation_ttest.tsv", output_format
+            ),
             output_dir_path = output_dir_path
         )
-        sys.stdout.close()
+        self.logger.close()
+
+
+class RunningMoments:
+    def __init__(self, num_columns: int) -> None:
+        self.counts = np.zeros(num_columns) # Values, missing values excluded.
+        self.sums = np.zeros(num_columns)
+        self.means = np.zeros(num_columns)
+        self.squared_deviations = np.zeros(num_columns)
+        self.missing = np.zeros(num_columns, dtype = bool)
+
+
+    def update(self, values: np.ndarray) -> None:
+        """
+        Merge the moments of a chunk of rows into the running moments of each
+        column (Chan et al.'s pairwise update), skipping missing values.
+        """
+        present = ~np.isnan(values)
+        chunk_counts = present.sum(axis = 0)
+        chunk_sums = np.where(present, values, 0).sum(axis = 0)
+        with np.errstate(invalid = "ignore", divide = "ignore"):
+            chunk_means = np.where(
+                chunk_counts > 0, chunk_sums / chunk_counts, 0
+            )
+            total_counts = self.counts + chunk_counts
+            chunk_weights = np.where(
+                total_counts > 0, chunk_counts / total_counts, 0
+            )
+
+        chunk_squared_deviations = np.sum(
+            np.where(present, values - chunk_means, 0) ** 2, axis = 0
+        )
+        mean_deltas = chunk_means - self.means
+        self.means += mean_deltas * chunk_weights
+        self.squared_deviations += chunk_squared_deviations + \
+            mean_deltas ** 2 * self.counts * chunk_weights
+        self.counts = total_counts
+        self.sums += chunk_sums
+        self.missing |= ~present.all(axis = 0)
+
+
+    def column_means(self) -> np.ndarray:
+        """
+        Mean of each column, skipping missing values (NaN without values).
+        """
+        return np.where(self.counts > 0, self.means, np.nan)
+
+
+    def t_test(self) -> Tuple[np.ndarray]:
+        """
+        One-sample T-test of a zero mean for each column, as `sps.ttest_rel`
+        on paired differences: T-statistics and p-values, NaN for columns with
+        missing values.
+        """
+        with np.errstate(invalid = "ignore", divide = "ignore"):
+            t_stats = self.means / np.sqrt(
+                self.squared_deviations / (self.counts - 1) / self.counts
+            )
+            p_values = 2 * sps.t.sf(np.abs(t_stats), self.counts - 1)
+
+        t_stats[self.missing] = np.nan
+        p_values[self.missing] = np.nan
+        return (t_stats, p_values)
+
+
+class StreamingPairedTTestOutput:
+    def __init__(
+            self, chunk_size: int = bed_reader.default_chunk_size,
+            memory_budget: int = helpers.default_memory_budget,
+            log_level: str = result_logger.default_log_level,
+            bin_records: bool = False, p_threshold: float = None,
+            top_k: int = None
+        ) -> None:
+        self.chunk_size = chunk_size
+        self.log_level = log_level
+        self.bin_records = bin_records
+        self.p_threshold = p_threshold
+        self.top_k = top_k
+        self.local_output = LocalPairedTTestOutput(
+            "vectorized", memory_budget, log_level, bin_records
+        )
+        self.cultivars = None
+        self.difference_moments = None # Vegreville minus Lethbridge.
+        self.lethbridge_moments = None
+        self.vegreville_moments = None
+        self.cultivars_output_df = None
+        self.global_output_df = None
+        self.logger = None
+
+
+    def __update_moments(
+            self, lethbridge_chunk_df: pd.DataFrame,
+            vegreville_chunk_df: pd.DataFrame
+        ) -> None:
+        """
+        Merge a chunk of bins into the running per-cultivar moments.
+        """
+        if self.cultivars is None:
+            self.cultivars = lethbridge_chunk_df.columns[2:]
+            self.difference_moments = RunningMoments(self.cultivars.size)
+            self.lethbridge_moments = RunningMoments(self.cultivars.size)
+            self.vegreville_moments = RunningMoments(self.cultivars.size)
+
+        lethbridge_values = lethbridge_chunk_df.iloc[:, 2:].to_numpy(np.float64)
+        vegreville_values = vegreville_chunk_df.iloc[:, 2:].to_numpy(np.float64)
+        self.difference_moments.update(vegreville_values - lethbridge_values)
+        self.lethbridge_moments.update(lethbridge_values)
+        self.vegreville_moments.update(vegreville_values)
+
+
+    def __set_cultivars_output_df(self) -> None:
+        """
+        Within-cultivar paired T-tests from the running moments, as
+        `CultivarPairedTTestOutput`.
+        """
+        t_stats, p_values = self.difference_moments.t_test()
+        with np.errstate(invalid = "ignore", divide = "ignore"):
+            methylation_ratios = self.vegreville_moments.sums / \
+                self.lethbridge_moments.sums
+
+        self.cultivars_output_df = df({
+            "Cultivar": self.cultivars, "T_Statistic": t_stats,
+            "P_Value": p_values, "Methylation_Ratio": methylation_ratios,
+            "Significant?": (t_stats != 0) & (p_values != 0) & \
+                (p_values <= 0.05)
+        })
+        wrapping_flair = helpers.string_builder(('\n', '+' * 10, '\n'))
+        for cultivar_row in self.cultivars_output_df.itertuples(index = False):
+            self.logger.log(helpers.string_builder((
+                wrapping_flair, "T-Test: ", str(cultivar_row[0]),
+                "\nT_Statistic: ", str(cultivar_row[1]), "\nP_Value: ",
+                str(cultivar_row[2]), "\nMethylation_Ratio: ",
+                str(cultivar_row[3]), wrapping_flair
+            )))
+
+
+    def __set_global_output_df(self) -> None:
+        """
+        Global paired T-test of the cultivar means of both locations, as
+        `GlobalPairedTTestOutput`.
+        """
+        model = sps.ttest_rel(
+            self.vegreville_moments.column_means(),
+            self.lethbridge_moments.column_means()
+        )
+        self.global_output_df = df(
+            index = ["global"],
+            data = {
+                "T_Statistic": [model[0]], "P_Value": [model[1]],
+                "Methylation_Ratio": [
+                    self.vegreville_moments.sums.sum() / \
+                        self.lethbridge_moments.sums.sum()
+                ]
+            }
+        )
+        self.logger.log(helpers.string_builder((
+            "\nGlobal T-Test\nT_Statistic: ", str(model[0]), "\nP_Value: ",
+            str(model[1])
+        )))
+
+
+    def stream_t_tests_and_write(
+            self, lethbridge_file_path: str, vegreville_file_path: str,
+            output_dir_path: str, output_format: str = "tsv"
+        ) -> None:
+        """
+        Perform cross-cultivar, within-cultivar and global paired T-tests in
+        one pass over aligned chunks of the Lethbridge and Vegreville files,
+        and save the outputs to files.
+        """
+        cross_variety_file_name = storage.output_file_name(
+            "cross_variety_methylation_ttest.tsv", output_format
+        )
+
+        # Logs to a separate file.
+        self.logger = result_logger.open_logger(
+            "streaming_t_test_stdout.txt", self.log_level, output_dir_path,
+            cross_variety_file_name if self.bin_records else None
+        )
+        wrapping_flair = helpers.string_builder((
+            '\n', '-' * 5, '*' * 10, '-' * 5, '\n'
+        ))
+        self.logger.log(helpers.string_builder((
+            wrapping_flair, "Streaming Cross Variety T-Tests", wrapping_flair
+        )))
+
+        output_writer = hit_collector.open_output(
+            cross_variety_file_name, output_dir_path, self.p_threshold,
+            self.top_k
+        )
+        first_bin = 0
+        for lethbridge_chunk_df, vegreville_chunk_df in aligned_chunks(
+                lethbridge_file_path, vegreville_file_path, self.chunk_size
+            ):
+            self.local_output.chunk_t_test(
+                lethbridge_chunk_df, vegreville_chunk_df, first_bin,
+                self.logger, output_writer
+            )
+            self.__update_moments(lethbridge_chunk_df, vegreville_chunk_df)
+            first_bin += lethbridge_chunk_df.shape[0]
+
+        output_writer.close()
+        if self.cultivars is None:
+            raise ValueError("Lethbridge and Vegreville data hold no bins.")
+
+        self.logger.log(helpers.string_builder((
+            wrapping_flair, "Within Variety T-Tests", wrapping_flair
+        )))
+        self.__set_cultivars_output_df()
+        self.__set_global_output_df()
+        helpers.write_output(
+            self.cultivars_output_df, storage.output_file_name(
+                "within_variety_methylation_ttest.tsv", output_format
+            ), output_dir_path
+        )
+        helpers.write_output(
+            self.global_output_df, storage.output_file_name(
+                "global_methylation_ttest.tsv", output_format
+            ), output_dir_path
+        )
+        self.logger.close()
 
 
 # Main method.
 def paired_t_tests(
         lethbridge_file_path: str, vegreville_file_path: str,
-        output_dir_path: str
+        output_dir_path: str, output_format: str = "tsv",
+        t_test_engine: str = "vectorized",
+        memory_budget: int = helpers.default_memory_budget,
+        log_level: str = result_logger.default_log_level,
+        bin_records: bool = False, p_threshold: float = None,
+        top_k: int = None
     ) -> None:
     """
     Performs cross-cultivar, within-cultivar, and global paired T-tests for
     Lethbridge and Vegreville data in parallel using the `multiprocessing`
-    module.
+    module. Outputs are written in `output_format` (see `storage`).
+    Cross-cultivar T-tests use `t_test_engine`, in chunks of at most
+    `memory_budget` bytes. Logs are written at `log_level`, with per-bin
+    cross-cultivar records if `bin_records` is set (see `result_logger`).
+    Given `p_threshold` or `top_k`, only the cross-cultivar hits are written
+    (see `hit_collector`).
     """
     start_time = timeit.default_timer() # Initialize starting time.
     lethbridge_file_path, vegreville_file_path, output_dir_path = \
@@ -450,30 +874,183 @@ def paired_t_tests(
     inputs.set_input_dfs(lethbridge_file_path, vegreville_file_path)
 
     print("\nPerforming paired t-tests regression...") # Initiate output objects.
-    local_output = LocalPairedTTestOutput()
-    cultivar_output = CultivarPairedTTestOutput()
-    global_output = GlobalPairedTTestOutput()
-
-    # Initialize processes for local and cultivar paired t-test objects.
-    func_args = (inputs.lethbridge_df, inputs.vegreville_df, output_dir_path)
-    local_process = multiprocessing.Process(
-        target = local_output.local_t_test_and_write, args = func_args
+    local_output = LocalPairedTTestOutput(
+        t_test_engine, memory_budget, log_level, bin_records, p_threshold,
+        top_k
     )
-    cultivar_process = multiprocessing.Process(
-        target = cultivar_output.cultivar_t_test_and_write, args = func_args
-    )
-    global_process = multiprocessing.Process(
-        target = global_output.global_t_test_and_write, args = func_args
+    cultivar_output = CultivarPairedTTestOutput(log_level)
+    global_output = GlobalPairedTTestOutput(log_level)
+    helpers.create_output_directory(output_dir_path)
+
+    # Share the input data once; each process attaches read-only views of it
+    # instead of receiving its own copy. Matrix stores are shared as is.
+    shared_inputs = (
+        shared_arrays.share_table(
+            inputs.lethbridge_df, 2, lethbridge_file_path
+        ),
+        shared_arrays.share_table(
+            inputs.vegreville_df, 2, vegreville_file_path
+        )
     )
+    inputs.lethbridge_df = None
+    inputs.vegreville_df = None
+
+    # Initialize processes for local, cultivar and global paired t-tests.
+    t_test_processes = [
+        multiprocessing.Process(
+            target = shared_t_test_and_write, args = (
+                t_test_and_write, shared_inputs, output_dir_path,
+                output_format
+            )
+        ) for t_test_and_write in (
+            local_output.local_t_test_and_write,
+            cultivar_output.cultivar_t_test_and_write,
+            global_output.global_t_test_and_write
+        )
+    ]
+    try:
+        for t_test_process in t_test_processes:
+            t_test_process.start()
+
+        for t_test_process in t_test_processes:
+            t_test_process.join()
+
+    finally:
+        for shared_input in shared_inputs:
+            shared_input.unlink()
 
-    local_process.start()
-    cultivar_process.start()
-    global_process.start()
-    local_process.join()
-    cultivar_process.join()
-    global_process.join()
+    if any(t_test_process.exitcode != 0 for t_test_process in t_test_processes):
+        raise RuntimeError("Paired t-tests failed.")
 
     helpers.print_program_runtime("Paired t-test calculations", start_time)
 
 
+# Main method.
+def streaming_paired_t_tests(
+        lethbridge_file_path: str, vegreville_file_path: str,
+        output_dir_path: str, output_format: str = "tsv",
+        chunk_size: int = bed_reader.default_chunk_size,
+        memory_budget: int = helpers.default_memory_budget,
+        log_level: str = result_logger.default_log_level,
+        bin_records: bool = False, p_threshold: float = None,
+        top_k: int = None
+    ) -> None:
+    """
+    Performs cross-cultivar, within-cultivar and global paired T-tests for
+    Lethbridge and Vegreville data in one streaming pass, `chunk_size` bins
+    at a time. Outputs and logs are as `paired_t_tests`.
+    """
+    start_time = timeit.default_timer() # Initialize starting time.
+    lethbridge_file_path, vegreville_file_path, output_dir_path = \
+        helpers.remove_trailing_slash((
+            lethbridge_file_path, vegreville_file_path, output_dir_path
+        ))
+
+    print("\nStart\nStreaming paired t-tests...")
+    streaming_output = StreamingPairedTTestOutput(
+        chunk_size, memory_budget, log_level, bin_records, p_threshold,
+        top_k
+    )
+    streaming_output.stream_t_tests_and_write(
+        lethbridge_file_path, vegreville_file_path, output_dir_path,
+        output_format
+    )
+
+    helpers.print_program_runtime("Streaming paired t-tests", start_time)
+
+
+def aligned_chunks(
+        lethbridge_file_path: str, vegreville_file_path: str, chunk_size: int
+    ) -> Iterator[Tuple[pd.DataFrame]]:
+    """
+    Read the Lethbridge and Vegreville files `chunk_size` bins at a time, in
+    step, checking that every pair of chunks holds the same bins.
+    """
+    lethbridge_chunks = storage.read_table_chunks(
+        lethbridge_file_path, chunk_size
+    )
+    vegreville_chunks = storage.read_table_chunks(
+        vegreville_file_path, chunk_size
+    )
+    for lethbridge_chunk_df in lethbridge_chunks:
+        vegreville_chunk_df = next(vegreville_chunks, None)
+        if vegreville_chunk_df is None:
+            break
+
+        check_paired_bins(lethbridge_chunk_df, vegreville_chunk_df)
+        yield (lethbridge_chunk_df, vegreville_chunk_df)
+
+    else:
+        if next(vegreville_chunks, None) is None:
+            return
+
+    raise ValueError("Lethbridge and Vegreville data must hold the same bins.")
+
+
+def shared_t_test_and_write(
+        t_test_and_write: Callable, shared_inputs: Tuple,
+        output_dir_path: str, output_format: str
+    ) -> None:
+    """
+    T-test process target: attach the shared Lethbridge and Vegreville data,
+    then perform a set of paired T-tests on it and write the output.
+    """
+    lethbridge_input_df, vegreville_input_df = [
+        shared_input.attach() for shared_input in shared_inputs
+    ]
+    t_test_and_write(
+        lethbridge_input_df, vegreville_input_df, output_dir_path,
+        output_format
+    )
+
+
+def check_paired_bins(
+        lethbridge_input_df: pd.DataFrame, vegreville_input_df: pd.DataFrame
+    ) -> None:
+    """
+    Check that Lethbridge and Vegreville data hold the same bins, in the same
+    order, and the same cultivars.
+    """
+    if lethbridge_input_df.shape != vegreville_input_df.shape or \
+            not lethbridge_input_df.iloc[:, 0:2].equals(
+                vegreville_input_df.iloc[:, 0:2]
+            ):
+        raise ValueError(
+            "Lethbridge and Vegreville data must hold the same bins."
+        )
+
+
+def paired_t_test_matrix(
+        vegreville_values: np.ndarray, lethbridge_values: np.ndarray
+    ) -> Tuple[np.ndarray]:
+    """
+    Paired T-tests of Vegreville against Lethbridge values for every row of
+    two (bins x cultivars) matrices at once, as `sps.ttest_rel` row by row.
+    Rows identical at both locations (missing values included) are filtered
+    and keep T 0, p 1 and methylation ratio 1. Returns the T-statistics,
+    p-values, methylation ratios, nominal significance and filtered rows.
+    """
+    filtered = np.all(
+        (vegreville_values == lethbridge_values) |
+        (np.isnan(vegreville_values) & np.isnan(lethbridge_values)), axis = 1
+    )
+    differences = vegreville_values - lethbridge_values
+    num_cultivars = differences.shape[1]
+    with np.errstate(invalid = "ignore", divide = "ignore"):
+        t_stats = differences.mean(axis = 1) / np.sqrt(
+            differences.var(axis = 1, ddof = 1) / num_cultivars
+        )
+        p_values = 2 * sps.t.sf(np.abs(t_stats), num_cultivars - 1)
+        methylation_ratios = np.nansum(vegreville_values, axis = 1) / \
+            (np.nansum(lethbridge_values, axis = 1) + 0.01) # Avoid zero.
+
+    t_stats[filtered] = 0
+    p_values[filtered] = 1
+    methylation_ratios[filtered] = 1
+
+    # Nominal significance, as `helpers.significance`.
+    significant = (t_stats != 0) & (p_values != 0) & (p_values <= 0.05)
+    return (t_stats, p_values, methylation_ratios, significant, filtered)
+
+
 # paired_t_tests(lethbridge_file_path, vegreville_file_path, output_dir_path)
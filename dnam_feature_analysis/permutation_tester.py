@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Objective: perform cross-cultivar, within-cultivar, and global paired
+sign-flip permutation tests between Vegreville and Lethbridge data, as
+distribution-free alternatives to the paired T-tests of `paired_t_tester`.
+
+Under the null hypothesis of no location effect, the sign of each paired
+difference (Vegreville minus Lethbridge) is exchangeable. The test statistic
+is the absolute sum of the paired differences; for a fixed set of differences
+it ranks sign flips exactly as the paired T-statistic does. Missing
+differences are left out (they contribute nothing under any sign).
+
+Cross-cultivar: all bins are tested at once against the same sign flips, as
+a (bins x cultivars) by (cultivars x permutations) matrix product, in batches
+of permutations and chunks of bins sized to a memory budget. With no more
+than `permutations` possible sign flips (2^12 for 12 cultivars), every sign
+flip is enumerated and p-values are exact. With early stopping, a bin stops
+as soon as enough sign flips reach its statistic that it can no longer be
+nominally significant, so clearly non-significant bins cost little while
+significance calls stay those of the full test; the p-values of stopped bins
+are estimated from the sign flips tested (Besag and Clifford).
+Within-cultivar: sign flips of every bin's differences, streamed over chunks
+of bins.
+Global: sign flips of the cultivar mean differences.
+
+Sign flips are drawn from a seedable random number generator.
+
+Inputs:
+- Lethbridge binned methylation TSV file path.
+- Vegreville binned methylation TSV file path.
+- Output directory path.
+
+Outputs:
+- Log TXT file, at a chosen log level (see `result_logger`).
+- TSV file holding permutation test results (parametric t-value,
+  permutation p-value, methylation ratio, nominal significance, number of
+  permutations) for each set of tests.
+
+"""
+
+from . import timeit, Tuple, df, np, pd, sps
+from . import helpers, paired_t_tester, result_logger, storage
+
+default_permutations = 10000
+permutation_batch = 512 # Sign flips tested at a time.
+significance_level = 0.05
+
+
+class PermutationTestOutput:
+    def __init__(
+            self, permutations: int = default_permutations, seed: int = None,
+            early_stop: bool = False,
+            memory_budget: int = helpers.default_memory_budget,
+            log_level: str = result_logger.default_log_level
+        ) -> None:
+        if permutations <= 0:
+            raise ValueError("The number of permutations must be positive.")
+
+        self.permutations = permutations
+        self.early_stop = early_stop
+        self.memory_budget = memory_budget
+        self.log_level = log_level
+
+        # Independent random streams for the three sets of tests.
+        self.bins_rng, self.cultivars_rng, self.global_rng = [
+            np.random.default_rng(seed_sequence)
+            for seed_sequence in np.random.SeedSequence(seed).spawn(3)
+        ]
+        self.bins_output_df = None
+        self.cultivars_output_df = None
+        self.global_output_df = None
+        self.logger = None
+
+
+    def __bin_permutation_tests(
+            self, lethbridge_input_df: pd.DataFrame,
+            vegreville_input_df: pd.DataFrame
+        ) -> None:
+        """
+        Cross-cultivar sign-flip tests of all bins, in chunks of bins sized to
+        the memory budget. Filtered bins (identical at both locations) keep
+        T 0, p 1 and methylation ratio 1, as in the paired T-tests.
+        """
+        paired_t_tester.check_paired_bins(
+            lethbridge_input_df, vegreville_input_df
+        )
+        num_cultivars = lethbridge_input_df.shape[1] - 2
+        signs, exact = sign_flips(
+            num_cultivars, self.permutations, self.bins_rng
+        )
+        total_bins = lethbridge_input_df.shape[0]
+        t_stats = np.zeros(total_bins)
+        p_values = np.ones(total_bins)
+        methylation_ratios = np.ones(total_bins)
+        tested_permutations = np.zeros(total_bins, dtype = np.int64)
+
+        chunk_bins = helpers.budget_rows(
+            self.memory_budget, num_cultivars + permutation_batch
+        )
+        for chunk_start in range(0, total_bins, chunk_bins):
+            chunk_stop = min(chunk_start + chunk_bins, total_bins)
+            vegreville_values = np.ascontiguousarray(vegreville_input_df.iloc[
+                chunk_start:chunk_stop, 2:
+            ].to_numpy(np.float64))
+            lethbridge_values = np.ascontiguousarray(lethbridge_input_df.iloc[
+                chunk_start:chunk_stop, 2:
+            ].to_numpy(np.float64))
+            chunk_t_stats, _, chunk_ratios, _, filtered = \
+                paired_t_tester.paired_t_test_matrix(
+                    vegreville_values, lethbridge_values
+                )
+            chunk_p_values, chunk_permutations = sign_flip_p_values(
+                np.nan_to_num(vegreville_values - lethbridge_values), signs,
+                exact, significance_level if self.early_stop else None
+            )
+            chunk_p_values[filtered] = 1
+            chunk_permutations[filtered] = 0
+
+            t_stats[chunk_start:chunk_stop] = chunk_t_stats
+            p_values[chunk_start:chunk_stop] = chunk_p_values
+            methylation_ratios[chunk_start:chunk_stop] = chunk_ratios
+            tested_permutations[chunk_start:chunk_stop] = chunk_permutations
+            self.logger.log(helpers.string_builder((
+                "Bins ", str(chunk_start), '-', str(chunk_stop - 1), ": ",
+                str(int(np.sum(~filtered))), " tested, ",
+                str(int(np.sum(filtered))), " filtered, ",
+                str(int(np.sum(chunk_p_values <= significance_level))),
+                " significant, ", str(int(chunk_permutations.sum())),
+                " sign flips."
+            )))
+
+        self.bins_output_df = lethbridge_input_df.iloc[:, 0:2].copy()
+        self.bins_output_df["T_Statistic"] = t_stats
+        self.bins_output_df["P_Value"] = p_values
+        self.bins_output_df["Methylation_Ratio"] = methylation_ratios
+        self.bins_output_df["Significant?"] = \
+            (tested_permutations > 0) & (p_values <= significance_level)
+        self.bins_output_df["Permutations"] = tested_permutations
+
+
+    def __cultivar_permutation_tests(
+            self, lethbridge_input_df: pd.DataFrame,
+            vegreville_input_df: pd.DataFrame
+        ) -> None:
+        """
+        Within-cultivar sign-flip tests: each bin's difference is flipped
+        independently, and every cultivar is tested against the same sign
+        flips. Bins are streamed in chunks sized to the memory budget.
+        """
+        total_bins = lethbridge_input_df.shape[0]
+        num_cultivars = lethbridge_input_df.shape[1] - 2
+        difference_moments = paired_t_tester.RunningMoments(num_cultivars)
+        lethbridge_sums = np.zeros(num_cultivars)
+        vegreville_sums = np.zeros(num_cultivars)
+        observed = np.zeros(num_cultivars)
+        permuted = np.zeros((self.permutations, num_cultivars))
+
+        chunk_bins = helpers.budget_rows(
+            self.memory_budget, num_cultivars + self.permutations
+        )
+        for chunk_start in range(0, total_bins, chunk_bins):
+            chunk_stop = min(chunk_start + chunk_bins, total_bins)
+            vegreville_values = vegreville_input_df.iloc[
+                chunk_start:chunk_stop, 2:
+            ].to_numpy(np.float64)
+            lethbridge_values = lethbridge_input_df.iloc[
+                chunk_start:chunk_stop, 2:
+            ].to_numpy(np.float64)
+            differences = vegreville_values - lethbridge_values
+            difference_moments.update(differences)
+            lethbridge_sums += np.nansum(lethbridge_values, axis = 0)
+            vegreville_sums += np.nansum(vegreville_values, axis = 0)
+
+            # Signs drawn bin by bin: the same seed gives the same sign flips
+            # whatever the chunk size.
+            differences = np.nan_to_num(differences)
+            observed += differences.sum(axis = 0)
+            bin_signs = np.where(
+                self.cultivars_rng.random(
+                    (chunk_stop - chunk_start, self.permutations)
+                ) < 0.5, -1.0, 1.0
+            )
+            permuted += bin_signs.T @ differences
+
+        exceedances = np.sum(
+            np.abs(permuted) >= tie_threshold(np.abs(observed)), axis = 0
+        )
+        p_values = (exceedances + 1) / (self.permutations + 1)
+        t_stats = difference_moments.t_test()[0]
+        with np.errstate(invalid = "ignore", divide = "ignore"):
+            methylation_ratios = vegreville_sums / lethbridge_sums
+
+        self.cultivars_output_df = df({
+            "Cultivar": lethbridge_input_df.columns[2:],
+            "T_Statistic": t_stats, "P_Value": p_values,
+            "Methylation_Ratio": methylation_ratios,
+            "Significant?": p_values <= significance_level,
+            "Permutations": self.permutations
+        })
+        wrapping_flair = helpers.string_builder(('\n', '+' * 10, '\n'))
+        for cultivar_row in self.cultivars_output_df.itertuples(index = False):
+            self.logger.log(helpers.string_builder((
+                wrapping_flair, "Permutation Test: ", str(cultivar_row[0]),
+                "\nT_Statistic: ", str(cultivar_row[1]), "\nP_Value: ",
+                str(cultivar_row[2]), "\nMethylation_Ratio: ",
+                str(cultivar_row[3]), wrapping_flair
+            )))
+
+
+    def __global_permutation_test(
+            self, lethbridge_input_df: pd.DataFrame,
+            vegreville_input_df: pd.DataFrame
+        ) -> None:
+        """
+        Global sign-flip test of the cultivar mean differences.
+        """
+        lethbridge_means = lethbridge_input_df.iloc[:, 2:].mean(axis = 0)
+        vegreville_means = vegreville_input_df.iloc[:, 2:].mean(axis = 0)
+        model = sps.ttest_rel(vegreville_means, lethbridge_means)
+        signs, exact = sign_flips(
+            lethbridge_means.size, self.permutations, self.global_rng
+        )
+        p_values, tested_permutations = sign_flip_p_values(
+            np.nan_to_num(
+                (vegreville_means - lethbridge_means).to_numpy(np.float64)
+            )[np.newaxis, :], signs, exact
+        )
+        self.global_output_df = df(
+            index = ["global"],
+            data = {
+                "T_Statistic": [model[0]], "P_Value": p_values,
+                "Methylation_Ratio": [
+                    vegreville_input_df.iloc[:, 2:].sum().sum() / \
+                        lethbridge_input_df.iloc[:, 2:].sum().sum()
+                ],
+                "Permutations": tested_permutations
+            }
+        )
+        self.logger.log(helpers.string_builder((
+            "\nGlobal Permutation Test\nT_Statistic: ", str(model[0]),
+            "\nP_Value: ", str(p_values[0])
+        )))
+
+
+    def permutation_tests_and_write(
+            self, lethbridge_input_df: pd.DataFrame,
+            vegreville_input_df: pd.DataFrame, output_dir_path: str,
+            output_format: str = "tsv"
+        ) -> None:
+        """
+        Perform cross-cultivar, within-cultivar and global sign-flip
+        permutation tests and save the outputs to files.
+        """
+        # Logs to a separate file.
+        self.logger = result_logger.open_logger(
+            "permutation_test_stdout.txt", self.log_level
+        )
+        wrapping_flair = helpers.string_builder((
+            '\n', '-' * 5, '*' * 10, '-' * 5, '\n'
+        ))
+        self.logger.log(helpers.string_builder((
+            wrapping_flair, "Cross Variety Permutation Tests", wrapping_flair
+        )))
+        self.__bin_permutation_tests(lethbridge_input_df, vegreville_input_df)
+        helpers.write_output(
+            self.bins_output_df, storage.output_file_name(
+                "cross_variety_methylation_permutation.tsv", output_format
+            ), output_dir_path
+        )
+
+        self.logger.log(helpers.string_builder((
+            wrapping_flair, "Within Variety Permutation Tests", wrapping_flair
+        )))
+        self.__cultivar_permutation_tests(
+            lethbridge_input_df, vegreville_input_df
+        )
+        self.__global_permutation_test(lethbridge_input_df, vegreville_input_df)
+        helpers.write_output(
+            self.cultivars_output_df, storage.output_file_name(
+                "within_variety_methylation_permutation.tsv", output_format
+            ), output_dir_path
+        )
+        helpers.write_output(
+            self.global_output_df, storage.output_file_name(
+                "global_methylation_permutation.tsv", output_format
+            ), output_dir_path
+        )
+        self.logger.close()
+
+
+# Main method.
+def permutation_tests(
+        lethbridge_file_path: str, vegreville_file_path: str,
+        output_dir_path: str, output_format: str = "tsv",
+        permutations: int = default_permutations, seed: int = None,
+        early_stop: bool = False,
+        memory_budget: int = helpers.default_memory_budget,
+        log_level: str = result_logger.default_log_level
+    ) -> None:
+    """
+    Performs cross-cultivar, within-cultivar and global paired sign-flip
+    permutation tests for Lethbridge and Vegreville data with `permutations`
+    sign flips drawn from `seed`. With `early_stop`, cross-cultivar tests
+    stop early for clearly non-significant bins. Outputs are written in
+    `output_format` (see `storage`).
+    """
+    start_time = timeit.default_timer() # Initialize starting time.
+    lethbridge_file_path, vegreville_file_path, output_dir_path = \
+        helpers.remove_trailing_slash((
+            lethbridge_file_path, vegreville_file_path, output_dir_path
+        ))
+
+    print("\nStart\nSetting dataframes...")  # Initialize input object.
+    inputs = paired_t_tester.PairedTTesterInput()
+    inputs.set_input_dfs(lethbridge_file_path, vegreville_file_path)
+
+    print("\nPerforming permutation tests...")
+    permutation_output = PermutationTestOutput(
+        permutations, seed, early_stop, memory_budget, log_level
+    )
+    permutation_output.permutation_tests_and_write(
+        inputs.lethbridge_df, inputs.vegreville_df, output_dir_path,
+        output_format
+    )
+
+    helpers.print_program_runtime("Permutation tests", start_time)
+
+
+def sign_flips(
+        num_values: int, permutations: int, rng: np.random.Generator
+    ) -> Tuple[np.ndarray, bool]:
+    """
+    Sign flip matrix (sign flips x values) of +1 and -1. If there are no
+    more than `permutations` possible sign flips, all of them are enumerated
+    (identity first) and the flips are exact; otherwise `permutations` sign
+    flips are drawn from `rng`.
+    """
+    if num_values < 63 and 2 ** num_values <= permutations:
+        flip_bits = (
+            np.arange(2 ** num_values)[:, np.newaxis] >> np.arange(num_values)
+        ) & 1
+        return (1.0 - 2.0 * flip_bits, True)
+
+    return (
+        np.where(rng.random((permutations, num_values)) < 0.5, -1.0, 1.0),
+        False
+    )
+
+
+def tie_threshold(observed: np.ndarray) -> np.ndarray:
+    """
+    Smallest permuted statistic counted as reaching each observed statistic,
+    allowing for rounding error in the sums.
+    """
+    return observed * (1 - 1e-12)
+
+
+def sign_flip_p_values(
+        differences: np.ndarray, signs: np.ndarray, exact: bool,
+        stop_level: float = None
+    ) -> Tuple[np.ndarray]:
+    """
+    Sign-flip p-values of every row of a (rows x values) matrix of paired
+    differences (missing differences as 0), testing all rows at once against
+    `signs` in batches of `permutation_batch` sign flips. Exact sign flips
+    give the fraction of flips reaching the observed statistic; drawn flips
+    count the observed statistic as one more flip. With `stop_level`, rows
+    whose p-value over all sign flips can no longer be `stop_level` or less
+    stop early, with p-values estimated from the flips tested. Returns the
+    p-values and the number of sign flips tested per row.
+    """
+    # Flips reaching the observed statistic beyond which a row stops.
+    extra_flip = 0 if exact else 1
+    stop_exceedances = np.inf if stop_level is None else \
+        stop_level * (signs.shape[0] + extra_flip) - extra_flip
+    observed = tie_threshold(np.abs(differences.sum(axis = 1)))
+    exceedances = np.zeros(differences.shape[0], dtype = np.int64)
+    tested = np.zeros(differences.shape[0], dtype = np.int64)
+    active = np.arange(differences.shape[0])
+    for batch_start in range(0, signs.shape[0], permutation_batch):
+        if active.size == 0:
+            break
+
+        batch_signs = signs[batch_start:batch_start + permutation_batch]
+        permuted = np.abs(differences[active] @ batch_signs.T)
+        exceedances[active] += np.sum(
+            permuted >= observed[active, np.newaxis], axis = 1
+        )
+        tested[active] += batch_signs.shape[0]
+        active = active[exceedances[active] <= stop_exceedances]
+
+    return ((exceedances + extra_flip) / (tested + extra_flip), tested)
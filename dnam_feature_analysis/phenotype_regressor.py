@@ -9,16 +9,58 @@ Inputs:
 - Delta phenotype TSV file path.
 - Delta methylation TSV file path.
 - Output directory path.
+- Optional covariate TSV file path, indexed by cultivar.
 
 Outputs:
-- Log TXT stdout files.
+- Log TXT files, at a chosen log level (see `result_logger`).
 - TSV file holding regression results (R Squared value, p-value, nominal
-  significance) for each phenotype.
+  significance) for each phenotype, optionally with a per-bin JSON lines
+  record file. Covariate-adjusted results also hold the methylation
+  coefficient and its standard error.
+
+Regression engines:
+- closed_form (default): regress all bins at once from centered
+  cross-products over the (bins x cultivars) matrix of delta methylation, in
+  chunks of bins sized to a memory budget.
+- matrix: regress all phenotypes at once, in one pass over the delta
+  methylation: the cross-products of all bins and phenotypes are one
+  (bins x cultivars) by (cultivars x phenotypes) product of centered
+  matrices, so methylation is read and centered once, however many
+  phenotypes there are.
+- formula: fit one `smf.ols` formula model per bin, logging model summaries
+  at the "bins" log level.
+
+Covariate-adjusted regression fits delta phenotype ~ delta methylation +
+covariates (e.g. cultivar groups or other phenotypes) at each bin, testing
+the methylation term. The covariate design is shared by all bins: it is
+factored once (pivoted QR), the phenotype and every bin are projected off its
+column space, and the methylation terms of all bins are the simple
+regressions of the projected values (Frisch-Waugh-Lovell).
+
+Regressions run on a bounded pool of worker processes, which read the delta
+methylation from shared memory (see `shared_arrays`) instead of each holding
+a copy. Batched engines split the work into (bin chunk, phenotypes) tasks
+whose results are streamed back in order and written chunk by chunk; the
+formula engine runs one phenotype per task.
 
 """
 
-from . import multiprocessing, sys, timeit, warnings, df, pd, smf, sps
-from . import helpers
+from . import multiprocessing, os, timeit, List, Tuple, warnings, df, np, \
+    pd, smf, spl, sps
+from . import helpers, hit_collector, result_logger, shared_arrays, storage
+
+regression_engines = ("closed_form", "matrix", "formula")
+batched_engines = ("closed_form", "matrix")
+regression_worker_inputs = {} # Inputs attached by each regression worker.
+simple_result_names = (
+    "Slope", "Intercept", "R_Squared", "T_Statistic", "P_Value",
+    "Significant?", "Filtered"
+)
+adjusted_result_names = (
+    "Coefficient", "Standard_Error", "R_Squared", "T_Statistic", "P_Value",
+    "Significant?", "Filtered"
+)
+collinearity_tolerance = 1e-10 # Relative norm of methylation left unexplained.
 
 
 # delta_phenotype_file_path = sys.argv[1]
@@ -30,6 +72,7 @@ class PhenotypeRegressionInput:
     def __init__(self) -> None:
         self.phenotype_df = None
         self.methylation_df = None
+        self.covariate_df = None
 
 
     def set_input_dfs(
@@ -39,19 +82,45 @@ class PhenotypeRegressionInput:
         """
         Set input dataframes.
         """
-        self.phenotype_df = pd.read_table(
+        self.phenotype_df = storage.read_table(
             delta_phenotype_file_path, index_col = 0
         )
 
         cols = ["#Scaffold", "Bin_Label"] + self.phenotype_df.index.tolist()
-        self.methylation_df = pd.read_table(
+        self.methylation_df = storage.read_table(
             delta_methylation_file_path, usecols = cols
         )
 
 
+    def set_covariate_df(
+            self, covariate_file_path: str, covariate_columns: List[str] = None
+        ) -> None:
+        """
+        Set the covariate dataframe, indexed by cultivar: the given columns
+        (defaults to all), text columns dummy-coded against their first
+        level.
+        """
+        covariate_df = storage.read_table(covariate_file_path, index_col = 0)
+        if covariate_columns:
+            covariate_df = covariate_df[covariate_columns]
+
+        self.covariate_df = pd.get_dummies(
+            covariate_df, drop_first = True, dtype = np.float64
+        ).astype(np.float64)
+
+
 class PhenotypeRegressionOutput:
-    def __init__(self) -> None:
+    def __init__(
+            self, log_level: str = result_logger.default_log_level,
+            bin_records: bool = False, p_threshold: float = None,
+            top_k: int = None
+        ) -> None:
         self.phenotype_output_df = None
+        self.log_level = log_level
+        self.bin_records = bin_records
+        self.p_threshold = p_threshold
+        self.top_k = top_k
+        self.logger = None
 
 
     def __set_output_df(self, methylation_input_df: pd.DataFrame) -> None:
@@ -59,9 +128,9 @@ class PhenotypeRegressionOutput:
         Set output dataframe.
         """
         # Default values.
-        self.phenotype_output_df = methylation_input_df.iloc[:, 0:2]
-        self.phenotype_output_df["R_Squared"] = 0
-        self.phenotype_output_df["P_Value"] = 0
+        self.phenotype_output_df = methylation_input_df.iloc[:, 0:2].copy()
+        self.phenotype_output_df["R_Squared"] = 0.0
+        self.phenotype_output_df["P_Value"] = 0.0
         self.phenotype_output_df["Significant?"] = False
 
 
@@ -74,12 +143,11 @@ class PhenotypeRegressionOutput:
         phenotype.
         """
         bin_idx = bin_row.name
-        quick_search = helpers.string_builder((
-            phenotype_label, '-', bin_row[0], '-', str(bin_row[1])
-        ))
-        methylation_data = pd.to_numeric(bin_row[2:])
+        scaffold = str(bin_row.iloc[0])
+        bin_label = bin_row.iloc[1]
+        methylation_data = pd.to_numeric(bin_row.iloc[2:])
 
-        if methylation_data.nonzero()[0].size != 0:
+        if np.flatnonzero(methylation_data.to_numpy()).size != 0:
             # Initialize bin dataframe.
             current_bin_df = df(
                 data = 0, index = bin_df_index,
@@ -100,7 +168,8 @@ class PhenotypeRegressionOutput:
             self.phenotype_output_df.iloc[bin_idx, 3] = 0
             self.phenotype_output_df.iloc[bin_idx, 4] = False
             try:
-                self.phenotype_output_df.iloc[bin_idx, 3] = model.pvalues[1]
+                self.phenotype_output_df.iloc[bin_idx, 3] = \
+                    model.pvalues.iloc[1]
             except:
                 pass
 
@@ -110,18 +179,36 @@ class PhenotypeRegressionOutput:
             except:
                 pass
 
-            wrapping_flair = helpers.string_builder(('\n', '+' * 10, '\n'))
-            print(helpers.string_builder((
-                wrapping_flair, quick_search, '\n'
-            )))
-            print(model.summary())
-            print(wrapping_flair)
+            # Model summaries are only built when logged.
+            if self.logger.logs("bins"):
+                wrapping_flair = helpers.string_builder((
+                    '\n', '+' * 10, '\n'
+                ))
+                self.logger.log(helpers.string_builder((
+                    wrapping_flair, phenotype_label, '-', scaffold, '-',
+                    str(bin_label), '\n\n', str(model.summary()),
+                    wrapping_flair
+                )), "bins")
+
+            self.logger.record({
+                "Phenotype": phenotype_label, "#Scaffold": scaffold,
+                "Bin_Label": bin_label,
+                "R_Squared": self.phenotype_output_df.iloc[bin_idx, 2],
+                "P_Value": self.phenotype_output_df.iloc[bin_idx, 3],
+                "Significant?": self.phenotype_output_df.iloc[bin_idx, 4],
+                "Filtered": False
+            })
 
         else:
-            print(helpers.string_builder((
-                '\n', bin_row[0], '-', str(bin_row[1]),
+            self.logger.log(helpers.string_builder((
+                '\n', scaffold, '-', str(bin_label),
                 " has been filtered for ", phenotype_label, "...", '\n'
-            )))
+            )), "bins")
+            self.logger.record({
+                "Phenotype": phenotype_label, "#Scaffold": scaffold,
+                "Bin_Label": bin_label, "R_Squared": 0.0, "P_Value": 0.0,
+                "Significant?": False, "Filtered": True
+            })
 
 
     def __bin_regression(
@@ -142,46 +229,284 @@ class PhenotypeRegressionOutput:
 
     def phenotype_regression(
             self, phenotype_data: pd.Series, methylation_input_df: pd.DataFrame,
-            output_dir_path: str
+            output_dir_path: str, output_format: str = "tsv"
         ) -> None:
         """
         Perform simple linear regression on delta methylation and delta
-        phenotype for the current phenotype.
+        phenotype for the current phenotype, fitting one formula model per
+        bin.
         """
         phenotype = phenotype_data.name
         print(helpers.string_builder((phenotype, "start.")))
+        output_file_name = storage.output_file_name(
+            helpers.string_builder((
+                phenotype, '_', "phenotype_regression.tsv"
+            )), output_format
+        )
 
-        # Prints stdout to separate file.
-        sys.stdout = open(
-            helpers.string_builder((phenotype, "_stdout.txt")), 'w'
+        # Logs to a separate file.
+        self.logger = result_logger.open_logger(
+            helpers.string_builder((phenotype, "_stdout.txt")),
+            self.log_level, output_dir_path,
+            output_file_name if self.bin_records else None
         )
         wrapping_flair = helpers.string_builder((
             '\n', '-' * 5, '*' * 10, '-' * 5, '\n'
         ))
-        print(helpers.string_builder((
+        self.logger.log(helpers.string_builder((
             wrapping_flair, "Phenotype: ", phenotype, wrapping_flair
         )))
 
         self.__set_output_df(methylation_input_df)
         self.__bin_regression(phenotype_data, methylation_input_df)
-        helpers.write_output(
-            self.phenotype_output_df,
-            helpers.string_builder((
-                phenotype, '_', "phenotype_regression.tsv"
-            )), output_dir_path
+
+        # Bins without any nonzero methylation are filtered, not regressed.
+        regressed = (methylation_input_df.iloc[:, 2:] != 0).any(
+            axis = 1
+        ).to_numpy()
+        self.logger.log(helpers.string_builder((
+            str(int(regressed.sum())), " of ",
+            str(self.phenotype_output_df.shape[0]),
+            " bins regressed, ",
+            str(int(self.phenotype_output_df["Significant?"].sum())),
+            " significant."
+        )))
+        hit_collector.write_output(
+            self.phenotype_output_df, output_file_name, output_dir_path,
+            self.p_threshold, self.top_k, ~regressed
+        )
+        self.logger.close()
+
+
+class PhenotypesRegressionOutput:
+    def __init__(
+            self, regression_engine: str = "closed_form", workers: int = None,
+            memory_budget: int = helpers.default_memory_budget,
+            log_level: str = result_logger.default_log_level,
+            bin_records: bool = False, covariate_df: pd.DataFrame = None,
+            p_threshold: float = None, top_k: int = None
+        ) -> None:
+        if regression_engine not in batched_engines:
+            raise ValueError(helpers.string_builder((
+                "Unknown batched regression engine: ", regression_engine
+            )))
+
+        self.regression_engine = regression_engine
+        self.workers = workers if workers is not None else os.cpu_count()
+        self.memory_budget = memory_budget
+        self.log_level = log_level
+        self.bin_records = bin_records
+        self.covariate_df = covariate_df
+        self.p_threshold = p_threshold
+        self.top_k = top_k
+        self.result_names = simple_result_names
+        self.output_results = (2, 4, 5) # R squared, p-value, significance.
+        self.output_file_suffix = "phenotype_regression.tsv"
+        if covariate_df is not None:
+            self.result_names = adjusted_result_names
+            self.output_results = (0, 1, 2, 4, 5) # Coefficient and SE too.
+            self.output_file_suffix = "adjusted_phenotype_regression.tsv"
+
+        self.phenotypes = []
+        self.loggers = []
+        self.output_writers = []
+        self.regressed_bins = None
+        self.significant_bins = None
+
+
+    def __open_outputs(
+            self, key_columns: List[str], output_dir_path: str,
+            output_format: str = "tsv"
+        ) -> None:
+        """
+        Open the output file, log and per-bin records of every phenotype.
+        """
+        output_columns = key_columns + [
+            self.result_names[result_idx] for result_idx in self.output_results
+        ]
+        wrapping_flair = helpers.string_builder((
+            '\n', '-' * 5, '*' * 10, '-' * 5, '\n'
+        ))
+        for phenotype in self.phenotypes:
+            output_file_name = storage.output_file_name(
+                helpers.string_builder((
+                    phenotype, '_', self.output_file_suffix
+                )), output_format
+            )
+
+            # Logs to a separate file per phenotype.
+            logger = result_logger.open_logger(
+                helpers.string_builder((phenotype, "_stdout.txt")),
+                self.log_level, output_dir_path,
+                output_file_name if self.bin_records else None
+            )
+            logger.log(helpers.string_builder((
+                wrapping_flair, "Phenotype: ", phenotype, wrapping_flair
+            )))
+            self.loggers.append(logger)
+            self.output_writers.append(
+                hit_collector.open_output(
+                    output_file_name, output_dir_path, self.p_threshold,
+                    self.top_k, output_columns
+                )
+            )
+
+        self.regressed_bins = np.zeros(len(self.phenotypes), dtype = int)
+        self.significant_bins = np.zeros(len(self.phenotypes), dtype = int)
+
+
+    def __regression_tasks(
+            self, total_bins: int, num_cultivars: int
+        ) -> List[Tuple]:
+        """
+        Split the regressions into (bin chunk, phenotypes) tasks, in output
+        order: one phenotype per task, or all phenotypes per task with the
+        matrix engine (without covariates). Chunks are sized to the memory
+        budget of a task, and small enough to give every worker a chunk.
+        """
+        phenotype_groups = [
+            [phenotype_idx] for phenotype_idx in range(len(self.phenotypes))
+        ]
+        if self.regression_engine == "matrix" and self.covariate_df is None:
+            phenotype_groups = [list(range(len(self.phenotypes)))]
+
+        chunk_bins = max(1, min(
+            helpers.budget_rows(
+                self.memory_budget, num_cultivars + len(phenotype_groups[0]),
+                working_arrays = 8
+            ), -(-total_bins // self.workers)
+        ))
+        return [
+            (
+                chunk_start, min(chunk_start + chunk_bins, total_bins),
+                phenotype_group
+            ) for chunk_start in range(0, total_bins, chunk_bins)
+            for phenotype_group in phenotype_groups
+        ]
+
+
+    def __write_task_results(
+            self, methylation_keys_df: pd.DataFrame, task: Tuple,
+            task_results: Tuple[np.ndarray]
+        ) -> None:
+        """
+        Write and log the results of a task, a chunk of bins for each of its
+        phenotypes.
+        """
+        chunk_start, chunk_stop, phenotype_group = task
+        key_df = methylation_keys_df.iloc[chunk_start:chunk_stop]
+        for group_idx, phenotype_idx in enumerate(phenotype_group):
+            phenotype_results = tuple(
+                task_result[:, group_idx] for task_result in task_results
+            )
+            output_df = key_df.copy()
+            for result_idx in self.output_results:
+                output_df[self.result_names[result_idx]] = \
+                    phenotype_results[result_idx]
+
+            hit_collector.write_chunk(
+                self.output_writers[phenotype_idx], output_df,
+                phenotype_results[6]
+            )
+            log_regression_chunk(
+                self.loggers[phenotype_idx], self.phenotypes[phenotype_idx],
+                key_df, phenotype_results, self.result_names
+            )
+            self.regressed_bins[phenotype_idx] += np.sum(~phenotype_results[6])
+            self.significant_bins[phenotype_idx] += \
+                np.sum(phenotype_results[5])
+
+
+    def phenotypes_regression_and_write(
+            self, phenotype_df: pd.DataFrame,
+            methylation_keys_df: pd.DataFrame,
+            shared_methylation:
+                "shared_arrays.SharedTable | shared_arrays.SharedStore",
+            output_dir_path: str, output_format: str = "tsv"
+        ) -> None:
+        """
+        Perform simple linear regression on delta methylation and delta
+        phenotype for all phenotypes, as tasks over chunks of bins run by a
+        pool of workers reading the shared delta methylation. Results are
+        streamed back in order and written to one output file per phenotype.
+        Given covariates, each phenotype is adjusted for all covariates but
+        itself.
+        """
+        print("Phenotype regression start.")
+        self.phenotypes = phenotype_df.columns.tolist()
+        # Phenotype values in methylation column (cultivar) order.
+        phenotype_values = phenotype_df.reindex(
+            shared_methylation.value_names
+        ).to_numpy(np.float64)
+        phenotype_designs = None
+        if self.covariate_df is not None:
+            phenotype_designs = [
+                covariate_design(
+                    self.covariate_df, phenotype, shared_methylation.value_names
+                ) for phenotype in self.phenotypes
+            ]
+
+        self.__open_outputs(
+            methylation_keys_df.columns.tolist(), output_dir_path,
+            output_format
+        )
+
+        tasks = self.__regression_tasks(
+            methylation_keys_df.shape[0], phenotype_values.shape[0]
         )
-        sys.stdout.close()
+        with multiprocessing.Pool(
+                self.workers, initializer = attach_regression_inputs,
+                initargs = (
+                    shared_methylation, phenotype_values,
+                    self.regression_engine, phenotype_designs
+                )
+            ) as pool:
+            for task, task_results in zip(
+                    tasks, pool.imap(regression_task, tasks)
+                ):
+                self.__write_task_results(
+                    methylation_keys_df, task, task_results
+                )
+
+        for phenotype_idx, logger in enumerate(self.loggers):
+            self.output_writers[phenotype_idx].close()
+            logger.log(helpers.string_builder((
+                str(self.regressed_bins[phenotype_idx]), " of ",
+                str(methylation_keys_df.shape[0]), " bins regressed, ",
+                str(self.significant_bins[phenotype_idx]), " significant."
+            )))
+            logger.close()
 
 
 # Main method.
 def phenotype_methylation_regression(
         delta_phenotype_file_path: str, delta_methylation_file_path: str,
-        output_dir_path: str
+        output_dir_path: str, output_format: str = "tsv",
+        regression_engine: str = "closed_form", workers: int = None,
+        memory_budget: int = helpers.default_memory_budget,
+        log_level: str = result_logger.default_log_level,
+        bin_records: bool = False, covariate_file_path: str = None,
+        covariate_columns: List[str] = None, p_threshold: float = None,
+        top_k: int = None
     ) -> None:
     """
     Perform simple linear regression on delta methylation and delta
-    phenotype for all phenotypes within the delta phenotype file.
+    phenotype for all phenotypes within the delta phenotype file, with
+    `regression_engine`, on a pool of `workers` processes (defaults to the CPU
+    count) sharing the delta methylation: as tasks over chunks of bins of at
+    most `memory_budget` bytes of working arrays, or one phenotype per task
+    with the formula engine. Outputs are written in `output_format` (see
+    `storage`), logs at `log_level`, with per-bin records if `bin_records` is
+    set (see `result_logger`). Given a covariate file, regressions are
+    adjusted for its `covariate_columns` (defaults to all), with a batched
+    engine. Given `p_threshold` or `top_k`, only hits are written (see
+    `hit_collector`).
     """
+    if covariate_file_path is not None and regression_engine == "formula":
+        raise ValueError(
+            "Covariate-adjusted regression requires a batched engine."
+        )
+
     start_time = timeit.default_timer()
     delta_phenotype_file_path, delta_methylation_file_path, output_dir_path = \
         helpers.remove_trailing_slash((
@@ -192,30 +517,448 @@ def phenotype_methylation_regression(
     print("\nStart.\nSetting dataframes...") # Initialize input object.
     inputs = PhenotypeRegressionInput()
     inputs.set_input_dfs(delta_phenotype_file_path, delta_methylation_file_path)
+    if covariate_file_path is not None:
+        inputs.set_covariate_df(covariate_file_path, covariate_columns)
+
+    # Workers read the delta methylation from shared memory, or its matrix
+    # store; only the bin keys stay in this process.
+    shared_methylation = shared_arrays.share_table(
+        inputs.methylation_df, 2, delta_methylation_file_path
+    )
+    methylation_keys_df = inputs.methylation_df.iloc[:, 0:2].copy()
+    inputs.methylation_df = None
 
     print("\nPerforming phenotype regression...") # Initialize output objects.
-    output_obs = {}
-    output_processes = {} # Initialize output processes.
-    for phenotype in inputs.phenotype_df.columns.tolist():
-        output_obs[phenotype] = PhenotypeRegressionOutput()
-        process = multiprocessing.Process(
-            target = output_obs[phenotype].phenotype_regression,
-            args = (
-                inputs.phenotype_df[phenotype], inputs.methylation_df,
-                output_dir_path
+    helpers.create_output_directory(output_dir_path)
+    try:
+        if regression_engine == "formula":
+            tasks = [
+                (
+                    PhenotypeRegressionOutput(
+                        log_level, bin_records, p_threshold, top_k
+                    ), inputs.phenotype_df[phenotype], output_dir_path,
+                    output_format
+                ) for phenotype in inputs.phenotype_df.columns.tolist()
+            ]
+            with multiprocessing.Pool(
+                    workers, initializer = attach_regression_inputs,
+                    initargs = (shared_methylation, None, regression_engine)
+                ) as pool:
+                pool.map(formula_regression_task, tasks, chunksize = 1)
+
+        else:
+            PhenotypesRegressionOutput(
+                regression_engine, workers, memory_budget, log_level,
+                bin_records, inputs.covariate_df, p_threshold, top_k
+            ).phenotypes_regression_and_write(
+                inputs.phenotype_df, methylation_keys_df, shared_methylation,
+                output_dir_path, output_format
+            )
+
+    finally:
+        shared_methylation.unlink()
+
+    helpers.print_program_runtime("Phenotype regression analyses", start_time)
+
+
+def attach_regression_inputs(
+        shared_methylation:
+            "shared_arrays.SharedTable | shared_arrays.SharedStore",
+        phenotype_values: np.ndarray, regression_engine: str,
+        phenotype_designs: List[np.ndarray] = None
+    ) -> None:
+    """
+    Regression worker initializer: attach the shared delta methylation once
+    per worker.
+    """
+    regression_worker_inputs["methylation_df"] = shared_methylation.attach()
+    regression_worker_inputs["phenotype_values"] = phenotype_values
+    regression_worker_inputs["regression_engine"] = regression_engine
+    regression_worker_inputs["phenotype_designs"] = phenotype_designs
+    # Attached segments stay open as long as the shared table.
+    regression_worker_inputs["shared_methylation"] = shared_methylation
+
+
+def regression_task(task: Tuple) -> Tuple[np.ndarray]:
+    """
+    Regression worker task: regress a chunk of bins of the shared delta
+    methylation against a group of phenotypes, adjusted for covariates if
+    given. Returns the results of
+    `regression_statistics` as (bins x phenotypes) matrices.
+    """
+    chunk_start, chunk_stop, phenotype_group = task
+    methylation_values = regression_worker_inputs["methylation_df"].iloc[
+        chunk_start:chunk_stop, 2:
+    ].to_numpy(np.float64)
+    phenotype_values = regression_worker_inputs["phenotype_values"]
+    phenotype_designs = regression_worker_inputs["phenotype_designs"]
+    if phenotype_designs is not None:
+        return tuple(
+            phenotype_result[:, None]
+            for phenotype_result in adjusted_regression_matrix(
+                methylation_values, phenotype_values[:, phenotype_group[0]],
+                phenotype_designs[phenotype_group[0]]
             )
         )
-        output_processes[phenotype] = process
 
-    for phenotype in output_processes:
-        output_processes[phenotype].start()
+    if regression_worker_inputs["regression_engine"] == "matrix":
+        return phenotypes_regression_matrix(
+            methylation_values, phenotype_values[:, phenotype_group]
+        )
+
+    return tuple(
+        phenotype_result[:, None] for phenotype_result in regression_matrix(
+            methylation_values, phenotype_values[:, phenotype_group[0]]
+        )
+    )
 
-    for phenotype in output_processes:
-        output_processes[phenotype].join()
 
-    helpers.print_program_runtime("Phenotype regression analyses", start_time)
+def formula_regression_task(task: Tuple) -> None:
+    """
+    Regression worker task: regress every bin of the shared delta methylation
+    against one phenotype with the formula engine, and write the output.
+    """
+    phenotype_output, phenotype_data, output_dir_path, output_format = task
+    phenotype_output.phenotype_regression(
+        phenotype_data, regression_worker_inputs["methylation_df"],
+        output_dir_path, output_format
+    )
+
+
+def log_regression_chunk(
+        logger: result_logger.ResultLogger, phenotype_label: str,
+        key_df: pd.DataFrame, chunk_results: Tuple[np.ndarray],
+        result_names: Tuple[str] = simple_result_names
+    ) -> None:
+    """
+    Log the results of each bin of a chunk regressed at once at the "bins"
+    log level, or as per-bin records.
+    """
+    if not logger.logs("bins") and not logger.records():
+        return
+
+    records_df = key_df.copy()
+    records_df.insert(0, "Phenotype", phenotype_label)
+    for result_name, chunk_result in zip(result_names, chunk_results):
+        records_df[result_name] = chunk_result
+
+    logger.record_df(records_df)
+
+    if logger.logs("bins"):
+        wrapping_flair = helpers.string_builder(('\n', '+' * 10, '\n'))
+        for bin_record in records_df.itertuples(index = False):
+            if bin_record[-1]:
+                logger.log(helpers.string_builder((
+                    '\n', str(bin_record[1]), '-', str(bin_record[2]),
+                    " has been filtered for ", phenotype_label, "...", '\n'
+                )), "bins")
+                continue
+
+            logger.log(helpers.string_builder((
+                wrapping_flair, phenotype_label, '-', str(bin_record[1]), '-',
+                str(bin_record[2]), '\n\n', '\n'.join(
+                    helpers.string_builder((
+                        result_name.replace('_', ' '), ": ", str(result_value)
+                    )) for result_name, result_value in zip(
+                        result_names[0:5], bin_record[3:8]
+                    )
+                ), wrapping_flair
+            )), "bins")
+
+
+def regression_statistics(
+        valid_counts: np.ndarray, methylation_means: np.ndarray,
+        phenotype_means: np.ndarray, methylation_squares: np.ndarray,
+        phenotype_squares: np.ndarray, cross_products: np.ndarray,
+        constant: np.ndarray, filtered: np.ndarray
+    ) -> Tuple[np.ndarray]:
+    """
+    Simple linear regression results from the numbers of cultivars, means,
+    centered sums of squares and centered cross-products of methylation and
+    phenotype values. Arguments broadcast against the cross-products, one per
+    regression. Bins whose methylation is constant have no slope and
+    R squared 0; filtered bins keep R squared 0, p 0 and no significance.
+    Returns the slopes, intercepts, R squared values, T-statistics and
+    p-values of the slopes, nominal significance and filtered bins.
+    """
+    with np.errstate(invalid = "ignore", divide = "ignore"):
+        slopes = cross_products / methylation_squares
+        intercepts = phenotype_means - slopes * methylation_means
+        residual_squares = np.maximum(
+            phenotype_squares - slopes * cross_products, 0
+        )
+        r_squared = 1 - residual_squares / phenotype_squares
+        degrees_of_freedom = valid_counts - 2
+        residual_variances = np.where(
+            degrees_of_freedom > 0, residual_squares / degrees_of_freedom,
+            np.nan
+        )
+        t_stats = slopes / np.sqrt(residual_variances / methylation_squares)
+        intercept_t_stats = intercepts / np.sqrt(
+            residual_variances * (
+                1 / valid_counts + methylation_means ** 2 / methylation_squares
+            )
+        )
+        p_values = 2 * sps.t.sf(np.abs(t_stats), degrees_of_freedom)
+        intercept_p_values = 2 * sps.t.sf(
+            np.abs(intercept_t_stats), degrees_of_freedom
+        )
+
+    # Constant methylation has no slope, rounding aside.
+    slopes = np.where(constant, np.nan, slopes)
+    intercepts = np.where(constant, phenotype_means, intercepts)
+    r_squared = np.where(constant, 0.0, r_squared)
+    t_stats = np.where(constant, np.nan, t_stats)
+    p_values = np.where(constant, np.nan, p_values)
+    intercept_p_values = np.where(constant, np.nan, intercept_p_values)
+    filtered = np.broadcast_to(filtered, slopes.shape)
+    slopes[filtered] = 0
+    intercepts[filtered] = 0
+    r_squared[filtered] = 0
+    t_stats[filtered] = 0
+    p_values[filtered] = 0
+
+    # Nominal significance, as `helpers.significance` on the p-values of the
+    # intercept and slope.
+    significant = (intercept_p_values != 0) & (p_values != 0) & \
+        (p_values <= 0.05) & ~filtered
+    return (
+        slopes, intercepts, r_squared, t_stats, p_values, significant,
+        filtered.copy()
+    )
+
+
+def regression_matrix(
+        methylation_values: np.ndarray, phenotype_values: np.ndarray
+    ) -> Tuple[np.ndarray]:
+    """
+    Simple linear regression of phenotype values against every row of a
+    (bins x cultivars) matrix of methylation values at once, as `smf.ols` bin
+    by bin: cultivars missing either value are dropped per bin. Bins without
+    any nonzero methylation are filtered. Returns the results of
+    `regression_statistics`, one per bin.
+    """
+    filtered = np.all(methylation_values == 0, axis = 1)
+    valid = ~np.isnan(methylation_values) & ~np.isnan(phenotype_values)
+    valid_counts = valid.sum(axis = 1)
+    constant = np.where(valid, methylation_values, np.inf).min(axis = 1) == \
+        np.where(valid, methylation_values, -np.inf).max(axis = 1)
+    with np.errstate(invalid = "ignore", divide = "ignore"):
+        # Per-bin means and centered cross-products over valid cultivars.
+        methylation_means = np.where(valid, methylation_values, 0).sum(
+            axis = 1
+        ) / valid_counts
+        phenotype_means = np.where(valid, phenotype_values, 0).sum(
+            axis = 1
+        ) / valid_counts
+        methylation_deviations = np.where(
+            valid, methylation_values - methylation_means[:, None], 0
+        )
+        phenotype_deviations = np.where(
+            valid, phenotype_values - phenotype_means[:, None], 0
+        )
+
+    return regression_statistics(
+        valid_counts, methylation_means, phenotype_means,
+        np.einsum("ij,ij->i", methylation_deviations, methylation_deviations),
+        np.einsum("ij,ij->i", phenotype_deviations, phenotype_deviations),
+        np.einsum("ij,ij->i", methylation_deviations, phenotype_deviations),
+        constant, filtered
+    )
+
+
+def phenotypes_regression_matrix(
+        methylation_values: np.ndarray, phenotype_values: np.ndarray
+    ) -> Tuple[np.ndarray]:
+    """
+    Simple linear regression of every column of a (cultivars x phenotypes)
+    matrix of phenotype values against every row of a (bins x cultivars)
+    matrix of methylation values at once. Methylation is centered once per
+    bin and phenotypes once each; the cross-products of all bins and
+    phenotypes are one matrix product of the centered matrices. Bins or
+    phenotypes missing values fall back to `regression_matrix`, phenotype by
+    phenotype. Returns the results of `regression_statistics` as
+    (bins x phenotypes) matrices.
+    """
+    complete_bins = ~np.isnan(methylation_values).any(axis = 1)
+    complete_phenotypes = ~np.isnan(phenotype_values).any(axis = 0)
+    complete_values = methylation_values[complete_bins]
+    methylation_means = complete_values.mean(axis = 1)
+    methylation_deviations = complete_values - methylation_means[:, None]
+    phenotype_means = phenotype_values.mean(axis = 0)
+    phenotype_deviations = phenotype_values - phenotype_means
+    complete_results = regression_statistics(
+        methylation_values.shape[1], methylation_means[:, None],
+        phenotype_means,
+        np.einsum(
+            "ij,ij->i", methylation_deviations, methylation_deviations
+        )[:, None],
+        np.einsum("ij,ij->j", phenotype_deviations, phenotype_deviations),
+        methylation_deviations @ phenotype_deviations,
+        (complete_values.min(axis = 1) == complete_values.max(axis = 1))[
+            :, None
+        ], np.all(complete_values == 0, axis = 1)[:, None]
+    )
+
+    chunk_results = tuple(
+        np.empty(
+            (methylation_values.shape[0], phenotype_values.shape[1]),
+            dtype = complete_result.dtype
+        ) for complete_result in complete_results
+    )
+    for chunk_result, complete_result in zip(chunk_results, complete_results):
+        chunk_result[complete_bins] = complete_result
+
+    for phenotype_idx in range(phenotype_values.shape[1]):
+        fallback_bins = ~complete_bins
+        if not complete_phenotypes[phenotype_idx]:
+            fallback_bins = np.ones_like(complete_bins)
+
+        if not fallback_bins.any():
+            continue
+
+        fallback_results = regression_matrix(
+            methylation_values[fallback_bins],
+            phenotype_values[:, phenotype_idx]
+        )
+        for chunk_result, fallback_result in zip(
+                chunk_results, fallback_results
+            ):
+            chunk_result[fallback_bins, phenotype_idx] = fallback_result
+
+    return chunk_results
 
 
-# phenotype_methylation_regression(
-#     delta_phenotype_file_path, delta_methylation_file_path, output_dir_path
-# )
+def covariate_design(
+        covariate_df: pd.DataFrame, phenotype: str, cultivars: List[str]
+    ) -> np.ndarray:
+    """
+    (cultivars x covariates) design matrix of a phenotype: an intercept and
+    every covariate but the phenotype itself, in cultivar order. Every
+    cultivar needs a row in the covariate dataframe.
+    """
+    missing_cultivars = [
+        cultivar for cultivar in cultivars
+        if cultivar not in covariate_df.index
+    ]
+    if missing_cultivars:
+        raise ValueError(helpers.string_builder((
+            "Cultivars missing from the covariate file: ",
+            ", ".join(str(cultivar) for cultivar in missing_cultivars)
+        )))
+
+    covariate_values = covariate_df.drop(
+        columns = [phenotype], errors = "ignore"
+    ).reindex(cultivars).to_numpy(np.float64)
+    return np.column_stack((np.ones(len(cultivars)), covariate_values))
+
+
+def column_basis(design: np.ndarray) -> np.ndarray:
+    """
+    Orthonormal basis of the column space of a design matrix, from its
+    pivoted QR factorization: covariates that others explain add no columns.
+    """
+    design_q, design_r, _ = spl.qr(design, mode = "economic", pivoting = True)
+    diagonal = np.abs(np.diag(design_r))
+    rank = int(np.sum(
+        diagonal > max(design.shape) * np.finfo(np.float64).eps * diagonal[0]
+    )) if diagonal.size else 0
+    return design_q[:, :rank]
+
+
+def adjusted_regression_matrix(
+        methylation_values: np.ndarray, phenotype_values: np.ndarray,
+        design: np.ndarray
+    ) -> Tuple[np.ndarray]:
+    """
+    Multiple linear regression of phenotype values against every row of a
+    (bins x cultivars) matrix of methylation values and a shared
+    (cultivars x covariates) design matrix at once, testing the methylation
+    term: cultivars missing any value are dropped per bin. The design is
+    factored once per pattern of missing values; the phenotype and
+    methylation are projected off its column space, and the methylation
+    coefficients are the simple regressions of the projected values. Bins
+    without any nonzero methylation are filtered and keep R squared 0, p 0 and
+    no significance; bins whose methylation the covariates explain have no
+    coefficient. Returns the coefficients, their standard errors, R squared
+    values of the full models, T-statistics and p-values of the
+    coefficients, nominal significance and filtered bins.
+    """
+    total_bins = methylation_values.shape[0]
+    filtered = np.all(methylation_values == 0, axis = 1)
+    complete_cultivars = ~np.isnan(phenotype_values) & \
+        ~np.isnan(design).any(axis = 1)
+    valid = ~np.isnan(methylation_values) & complete_cultivars
+    coefficients = np.full(total_bins, np.nan)
+    standard_errors = np.full(total_bins, np.nan)
+    r_squared = np.full(total_bins, np.nan)
+    t_stats = np.full(total_bins, np.nan)
+    p_values = np.full(total_bins, np.nan)
+
+    patterns, pattern_bins = np.unique(valid, axis = 0, return_inverse = True)
+    pattern_bins = pattern_bins.reshape(-1)
+    for pattern_idx, pattern in enumerate(patterns):
+        if not pattern.any():
+            continue
+
+        bins = np.flatnonzero(pattern_bins == pattern_idx)
+        pattern_values = methylation_values[np.ix_(bins, pattern)]
+        pattern_phenotype = phenotype_values[pattern]
+        design_basis = column_basis(design[pattern])
+        degrees_of_freedom = pattern_phenotype.size - \
+            design_basis.shape[1] - 1
+
+        # Project the phenotype and methylation off the covariates.
+        phenotype_residuals = pattern_phenotype - \
+            design_basis @ (design_basis.T @ pattern_phenotype)
+        methylation_residuals = pattern_values - \
+            (pattern_values @ design_basis) @ design_basis.T
+        methylation_squares = np.einsum(
+            "ij,ij->i", methylation_residuals, methylation_residuals
+        )
+        cross_products = methylation_residuals @ phenotype_residuals
+        phenotype_squares = phenotype_residuals @ phenotype_residuals
+        total_squares = np.sum(
+            (pattern_phenotype - pattern_phenotype.mean()) ** 2
+        )
+        with np.errstate(invalid = "ignore", divide = "ignore"):
+            pattern_coefficients = cross_products / methylation_squares
+            residual_squares = np.maximum(
+                phenotype_squares - pattern_coefficients * cross_products, 0
+            )
+            pattern_errors = np.sqrt(
+                residual_squares / degrees_of_freedom / methylation_squares
+            ) if degrees_of_freedom > 0 else np.full(bins.size, np.nan)
+            pattern_t_stats = pattern_coefficients / pattern_errors
+            pattern_r_squared = 1 - residual_squares / total_squares
+            covariate_r_squared = 1 - phenotype_squares / total_squares
+
+        # Methylation the covariates explain, rounding aside.
+        collinear = methylation_squares <= collinearity_tolerance ** 2 * \
+            np.einsum("ij,ij->i", pattern_values, pattern_values)
+        pattern_coefficients[collinear] = np.nan
+        pattern_errors[collinear] = np.nan
+        pattern_t_stats[collinear] = np.nan
+        pattern_r_squared[collinear] = covariate_r_squared
+
+        coefficients[bins] = pattern_coefficients
+        standard_errors[bins] = pattern_errors
+        r_squared[bins] = pattern_r_squared
+        t_stats[bins] = pattern_t_stats
+        if degrees_of_freedom > 0:
+            p_values[bins] = 2 * sps.t.sf(
+                np.abs(pattern_t_stats), degrees_of_freedom
+            )
+
+    coefficients[filtered] = 0
+    standard_errors[filtered] = 0
+    r_squared[filtered] = 0
+    t_stats[filtered] = 0
+    p_values[filtered] = 0
+
+    # Nominal significance of the methylation term.
+    significant = (p_values != 0) & (p_values <= 0.05) & ~filtered
+    return (
+        coefficients, standard_errors, r_squared, t_stats, p_values,
+        significant, filtered
+    )
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Objective: level-controlled logging of per-bin statistics results.
+
+Log levels (each includes the ones before it):
+- quiet: no log file.
+- summary (default): section headers and per-chunk, per-cultivar or
+  per-phenotype summaries.
+- bins: a text block for every bin tested or filtered, as the per-bin
+  engines used to print.
+
+Per-bin records are an optional, compact machine-readable alternative to
+per-bin text: one JSON object per bin and line (`.jsonl`), written next to
+the results table.
+
+Text and records are buffered and handed in batches to a background writer
+thread, so formatting and file writes overlap the statistics instead of
+blocking them.
+
+"""
+
+from . import json, math, os, queue, threading, Dict, np, pd
+from . import helpers
+
+log_levels = ("quiet", "summary", "bins")
+default_log_level = "summary"
+record_file_extension = ".jsonl"
+buffered_lines = 4096 # Lines handed to the writer thread at a time.
+queued_batches = 16 # Batches waiting for the writer thread before blocking.
+write_buffer_size = 2 ** 20
+
+
+class BackgroundWriter:
+    def __init__(self, file_path: str) -> None:
+        self.output_file = open(file_path, 'w', buffering = write_buffer_size)
+        self.pending_batches = queue.Queue(maxsize = queued_batches)
+        self.writer_thread = threading.Thread(
+            target = self.__write_batches, daemon = True
+        )
+        self.writer_thread.start()
+
+
+    def __write_batches(self) -> None:
+        """
+        Writer thread: write queued batches until the closing `None`.
+        """
+        while True:
+            batch = self.pending_batches.get()
+            if batch is None:
+                break
+
+            self.output_file.write(batch)
+
+        self.output_file.close()
+
+
+    def write(self, batch: str) -> None:
+        """
+        Queue text for writing, blocking while the writer thread is behind.
+        """
+        self.pending_batches.put(batch)
+
+
+    def close(self) -> None:
+        """
+        Write everything queued and close the file.
+        """
+        self.pending_batches.put(None)
+        self.writer_thread.join()
+
+
+class ResultLogger:
+    def __init__(
+            self, log_file_path: str, log_level: str = default_log_level,
+            record_file_path: str = None
+        ) -> None:
+        if log_level not in log_levels:
+            raise ValueError(helpers.string_builder((
+                "Unknown log level: ", log_level
+            )))
+
+        self.log_level = log_levels.index(log_level)
+        self.log_writer = None
+        self.record_writer = None
+        self.log_lines = []
+        self.record_lines = []
+        if self.log_level > 0:
+            self.log_writer = BackgroundWriter(log_file_path)
+
+        if record_file_path is not None:
+            self.record_writer = BackgroundWriter(record_file_path)
+
+
+    def logs(self, log_level: str) -> bool:
+        """
+        Whether messages at `log_level` are written, so callers skip building
+        messages nobody reads.
+        """
+        return 0 < log_levels.index(log_level) <= self.log_level
+
+
+    def records(self) -> bool:
+        """
+        Whether per-bin records are written.
+        """
+        return self.record_writer is not None
+
+
+    def log(self, message: str, log_level: str = "summary") -> None:
+        """
+        Log a text message at `log_level`.
+        """
+        if not self.logs(log_level):
+            return
+
+        self.log_lines.append(helpers.string_builder((message, '\n')))
+        if len(self.log_lines) >= buffered_lines:
+            self.log_writer.write("".join(self.log_lines))
+            self.log_lines = []
+
+
+    def record(self, bin_record: Dict) -> None:
+        """
+        Write the per-bin record of one bin. Missing and infinite values are
+        written as null, as in `record_df`, so every line is strict JSON.
+        """
+        if self.record_writer is None:
+            return
+
+        self.record_lines.append(helpers.string_builder((
+            json.dumps(
+                {
+                    field: json_value(value)
+                    for field, value in bin_record.items()
+                }, allow_nan = False
+            ), '\n'
+        )))
+        if len(self.record_lines) >= buffered_lines:
+            self.record_writer.write("".join(self.record_lines))
+            self.record_lines = []
+
+
+    def record_df(self, records_df: pd.DataFrame) -> None:
+        """
+        Write the per-bin records of a chunk of bins, one row each, at full
+        float precision as in `record`.
+        """
+        if self.record_writer is None:
+            return
+
+        record_fields = records_df.columns.tolist()
+        for record_values in records_df.itertuples(index = False, name = None):
+            self.record(dict(zip(record_fields, record_values)))
+
+
+    def close(self) -> None:
+        """
+        Write any buffered text and records, then close the files.
+        """
+        if self.log_writer is not None:
+            self.log_writer.write("".join(self.log_lines))
+            self.log_writer.close()
+            self.log_lines = []
+
+        if self.record_writer is not None:
+            self.record_writer.write("".join(self.record_lines))
+            self.record_writer.close()
+            self.record_lines = []
+
+
+def open_logger(
+        log_file_path: str, log_level: str = default_log_level,
+        output_dir_path: str = None, output_file_name: str = None
+    ) -> ResultLogger:
+    """
+    Open a result logger. Given the file name of a results table, per-bin
+    records are written next to it in the output directory.
+    """
+    record_file_path = None
+    if output_file_name is not None:
+        helpers.create_output_directory(output_dir_path)
+        record_file_path = helpers.string_builder((
+            output_dir_path, '/', record_file_name(output_file_name)
+        ))
+
+    return ResultLogger(log_file_path, log_level, record_file_path)
+
+
+def json_value(value: object) -> object:
+    """
+    JSON-serializable form of a record value: NumPy scalars as Python
+    scalars and non-finite floats (NaN, or the infinite T statistic of
+    constant differences) as None, since JSON has no NaN or Infinity.
+    """
+    if isinstance(value, np.generic):
+        value = value.item()
+
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+
+    return value
+
+
+def record_file_name(output_file_name: str) -> str:
+    """
+    Per-bin record file name of a results table.
+    """
+    return helpers.string_builder((
+        os.path.splitext(output_file_name)[0], "_records",
+        record_file_extension
+    ))
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Objective: hand tables to worker processes through shared memory.
+
+A shared table copies a dataframe once into `multiprocessing.shared_memory`
+segments: each of its leading key columns (e.g. "#Scaffold" and "Bin_Label")
+as its own array, text key columns as integer codes into their distinct
+values, and its value columns (e.g. cultivars) as one matrix.
+
+The shared table handle only names its segments, so it pickles cheaply under
+any start method; each worker attaches read-only views of the same physical
+memory instead of receiving its own copy of the data. Peak memory stays close
+to one copy of the table, whatever the number of workers.
+
+The process that shares a table unlinks it once its workers are done, and
+only that process tracks its segments: a worker attaching a segment never
+leaves it registered with a resource tracker of its own, which would unlink
+the segment, and warn of a leak, as soon as the worker exits.
+
+A table read whole from a matrix store (see `matrix_store`) is already a
+read-only, memory-mapped view of its store: it is shared as a store handle
+instead, each worker opening the store itself, so every process reads the
+one copy of the matrix in the page cache and nothing is copied.
+
+"""
+
+from . import resource_tracker, shared_memory, sys, List, Tuple, df, np, pd
+from . import matrix_store, storage
+
+
+def attach_segment(
+        segment_name: str, tracker_pid: int
+    ) -> shared_memory.SharedMemory:
+    """
+    Attach an existing shared memory segment without tracking it. Before
+    Python 3.13, attaching always registers the segment: workers started by
+    `multiprocessing` share the resource tracker of the process that shared
+    the segment, where it is already registered, so the segment is only
+    unregistered from a tracker of the worker's own.
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name = segment_name, track = False)
+
+    segment = shared_memory.SharedMemory(name = segment_name)
+    worker_tracker_pid = resource_tracker._resource_tracker._pid
+    if worker_tracker_pid is not None and worker_tracker_pid != tracker_pid:
+        resource_tracker.unregister(segment._name, "shared_memory")
+
+    return segment
+
+
+class SharedTable:
+    def __init__(self, input_df: pd.DataFrame, key_columns: int) -> None:
+        self.key_names = list(input_df.columns[:key_columns])
+        self.value_names = list(input_df.columns[key_columns:])
+        self.key_uniques = [] # Distinct values of text key columns, or None.
+        self.blocks = [] # Segment name, dtype and shape of every array.
+        self.segments = [] # Attached segments, never pickled.
+
+        for key_idx in range(key_columns):
+            key_column = input_df.iloc[:, key_idx]
+            if key_column.dtype.kind in "biufcmM":
+                self.key_uniques.append(None)
+                self.__share_columns(key_column.to_frame(), key_column.shape)
+                continue
+
+            key_codes, key_uniques = pd.factorize(
+                key_column, use_na_sentinel = False
+            )
+            self.key_uniques.append(np.asarray(key_uniques, dtype = object))
+            self.__share_columns(
+                pd.Series(key_codes).to_frame(), key_codes.shape
+            )
+
+        self.__share_columns(
+            input_df.iloc[:, key_columns:],
+            (input_df.shape[0], len(self.value_names))
+        )
+        # Resource tracker the segments are registered with (None when shared
+        # with a parent process).
+        self.tracker_pid = resource_tracker._resource_tracker._pid
+
+
+    def __share_columns(
+            self, columns_df: pd.DataFrame, shape: Tuple[int]
+        ) -> None:
+        """
+        Copy columns into a new shared memory segment, a column at a time.
+        Value columns share a common dtype (float64 without any).
+        """
+        dtype = np.result_type(*columns_df.dtypes) if columns_df.shape[1] \
+            else np.dtype(np.float64)
+        segment = shared_memory.SharedMemory(
+            create = True,
+            size = max(int(np.prod(shape)) * dtype.itemsize, 1)
+        )
+        shared_array = np.ndarray(shape, dtype = dtype, buffer = segment.buf)
+        if len(shape) == 1:
+            shared_array[:] = columns_df.iloc[:, 0].to_numpy(dtype)
+
+        else:
+            for column_idx in range(shape[1]):
+                shared_array[:, column_idx] = \
+                    columns_df.iloc[:, column_idx].to_numpy(dtype)
+
+        del shared_array
+        self.segments.append(segment)
+        self.blocks.append((segment.name, dtype.str, shape))
+
+
+    def __getstate__(self) -> dict:
+        """
+        Pickle the segment names only, not the attached segments.
+        """
+        state = self.__dict__.copy()
+        state["segments"] = []
+        return state
+
+
+    def __attach_arrays(self) -> List[np.ndarray]:
+        """
+        Read-only views of every shared array.
+        """
+        shared_views = []
+        for segment_name, dtype, shape in self.blocks:
+            segment = attach_segment(segment_name, self.tracker_pid)
+            self.segments.append(segment) # Views need the segment open.
+            shared_view = np.ndarray(
+                shape, dtype = dtype, buffer = segment.buf
+            )
+            shared_view.flags.writeable = False
+            shared_views.append(shared_view)
+
+        return shared_views
+
+
+    def attach(self) -> pd.DataFrame:
+        """
+        Read-only dataframe of the shared table. Value columns are views of
+        the shared matrix, not copies; text key columns are decoded.
+        """
+        shared_views = self.__attach_arrays()
+        key_df = df(
+            {
+                key_name: key_array if key_uniques is None \
+                    else key_uniques[key_array]
+                for key_name, key_array, key_uniques in zip(
+                    self.key_names, shared_views[:-1], self.key_uniques
+                )
+            }, copy = False
+        )
+        return pd.concat(
+            [
+                key_df,
+                df(shared_views[-1], columns = self.value_names, copy = False)
+            ], axis = 1
+        )
+
+
+    def unlink(self) -> None:
+        """
+        Release the shared memory of the table. Called once, by the process
+        that shared it, after its workers are done.
+        """
+        for segment in self.segments:
+            segment.close()
+            segment.unlink()
+
+        self.segments = []
+
+
+class SharedStore:
+    def __init__(
+            self, store_path: str, input_df: pd.DataFrame, key_columns: int
+        ) -> None:
+        self.store_path = store_path
+        self.key_names = list(input_df.columns[:key_columns])
+        self.value_names = list(input_df.columns[key_columns:])
+
+
+    def attach(self) -> pd.DataFrame:
+        """
+        Read-only dataframe of the matrix store. Value columns are views of
+        the memory-mapped matrix, not copies.
+        """
+        return matrix_store.read_matrix(self.store_path)
+
+
+    def unlink(self) -> None:
+        """
+        Nothing to release: the store stays on disk.
+        """
+
+
+def share_table(
+        input_df: pd.DataFrame, key_columns: int, file_path: str
+    ) -> "SharedTable | SharedStore":
+    """
+    Share a table read from `file_path` with worker processes: as its matrix
+    store if it holds the whole store, else as a shared memory copy.
+    """
+    if storage.storage_format(file_path) == "f32" and \
+            input_df.columns.tolist() == matrix_store.read_columns(file_path):
+        return SharedStore(file_path, input_df, key_columns)
+
+    return SharedTable(input_df, key_columns)
@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Objective: pluggable storage for the tables passed between pipeline stages.
+
+The storage format of a table is chosen by its file extension:
+- tsv: tab-separated text (default, `.tsv`).
+- npz: NumPy archive holding one typed array per column and chunk (`.npz`).
+- feather: Arrow IPC file (`.feather`, requires `pyarrow`).
+- parquet: Parquet file (`.parquet`, requires `pyarrow`).
+- f32: memory-mapped matrix store (`.f32` directory, see `matrix_store`),
+  opened zero-copy. Methylation matrices are written with their number of
+  key columns, so their values are stored as float32.
+
+The binary formats preserve column dtypes and can be read back column
+selectively, so stages skip text parsing and formatting entirely. Tables
+written in chunks (see `TableWriter`) are written incrementally in every
+format, so memory stays bounded by the chunk size. Tables read in chunks (see
+`read_table_chunks`) are read incrementally as text, archive chunks or
+memory-mapped slices; Arrow and Parquet tables are read whole.
+
+"""
+
+from . import os, warnings, zipfile, Iterator, List, df, np, pd
+from . import helpers, matrix_store
+
+storage_formats = ("tsv", "npz", "feather", "parquet", "f32")
+format_extensions = {
+    "tsv": ".tsv", "npz": ".npz", "feather": ".feather", "parquet": ".parquet",
+    "f32": ".f32"
+}
+npz_columns_key = "__columns__"
+npz_chunks_key = "__chunks__"
+
+
+def storage_format(file_path: str) -> str:
+    """
+    Storage format of a file from its extension. Unknown extensions are
+    treated as tab-separated text.
+    """
+    extension = os.path.splitext(file_path)[1]
+    for output_format, format_extension in format_extensions.items():
+        if extension == format_extension:
+            return output_format
+
+    return "tsv"
+
+
+def output_file_name(file_name: str, output_format: str = "tsv") -> str:
+    """
+    Swap the extension of an output file name for the given storage format.
+    """
+    if output_format not in storage_formats:
+        raise ValueError(helpers.string_builder((
+            "Unknown storage format: ", output_format
+        )))
+
+    return helpers.string_builder((
+        os.path.splitext(file_name)[0], format_extensions[output_format]
+    ))
+
+
+def npz_column(column: pd.Series) -> np.ndarray:
+    """
+    Typed NumPy array for a dataframe column. Text columns are stored as
+    fixed-width unicode so the archive never needs pickling.
+    """
+    if column.dtype.kind in "biufcmM":
+        return column.to_numpy()
+
+    return column.to_numpy(dtype = str)
+
+
+def npz_column_key(column_idx: int, chunk_idx: int) -> str:
+    """
+    Archive key of one chunk of a column of an `.npz` table.
+    """
+    return helpers.string_builder((
+        "column_", str(column_idx), '_', str(chunk_idx)
+    ))
+
+
+def write_npz_array(
+        npz_file: zipfile.ZipFile, array_key: str, array: np.ndarray
+    ) -> None:
+    """
+    Add one array to an open `.npz` archive, as `np.savez` does.
+    """
+    with npz_file.open(
+            helpers.string_builder((array_key, ".npy")), 'w',
+            force_zip64 = True
+        ) as array_file:
+        np.lib.format.write_array(array_file, array, allow_pickle = False)
+
+
+def write_npz_chunk(
+        npz_file: zipfile.ZipFile, output_df: pd.DataFrame, chunk_idx: int
+    ) -> None:
+    """
+    Add the next chunk of rows of a table to an open `.npz` archive.
+    """
+    for column_idx in range(output_df.shape[1]):
+        write_npz_array(
+            npz_file, npz_column_key(column_idx, chunk_idx),
+            npz_column(output_df.iloc[:, column_idx])
+        )
+
+
+def write_npz_header(
+        npz_file: zipfile.ZipFile, columns: List[str], chunks: int
+    ) -> None:
+    """
+    Add the column names and number of chunks of a table to an open `.npz`
+    archive.
+    """
+    write_npz_array(npz_file, npz_columns_key, np.array(columns, dtype = str))
+    write_npz_array(npz_file, npz_chunks_key, np.array(chunks))
+
+
+def binary_table_df(
+        output_df: pd.DataFrame, write_index: bool = False
+    ) -> pd.DataFrame:
+    """
+    A dataframe as the binary formats store it: the index as a leading
+    column when written and text column names.
+    """
+    output_df = output_df.reset_index(drop = not write_index)
+    output_df.columns = [str(column) for column in output_df.columns]
+    return output_df
+
+
+def write_table(
+        output_df: pd.DataFrame, file_path: str, write_index: bool = False,
+        key_columns: int = None
+    ) -> None:
+    """
+    Write a dataframe in the storage format given by the file extension.
+    Methylation matrices give their number of `key_columns`, counting a
+    written index, for the float32 values of matrix stores.
+    """
+    output_format = storage_format(file_path)
+    if output_format == "tsv":
+        output_df.to_csv(file_path, sep = '\t', index = write_index)
+        return
+
+    output_df = binary_table_df(output_df, write_index)
+    if output_format == "npz":
+        with zipfile.ZipFile(file_path, 'w') as npz_file:
+            write_npz_chunk(npz_file, output_df, 0)
+            write_npz_header(npz_file, output_df.columns, 1)
+
+    elif output_format == "feather":
+        output_df.to_feather(file_path)
+
+    elif output_format == "f32":
+        matrix_store.write_matrix(output_df, file_path, key_columns)
+
+    else:
+        output_df.to_parquet(file_path, index = False)
+
+
+def read_npz(file_path: str, usecols: List[str] = None) -> pd.DataFrame:
+    """
+    Read the requested columns of an `.npz` table, in file order, joining
+    the chunks of every column.
+    """
+    with np.load(file_path) as npz_file:
+        columns = npz_file[npz_columns_key].tolist()
+        chunks = int(npz_file[npz_chunks_key])
+        return pd.DataFrame({
+            column: np.concatenate([
+                npz_file[npz_column_key(column_idx, chunk_idx)]
+                for chunk_idx in range(chunks)
+            ]) for column_idx, column in enumerate(columns)
+            if usecols is None or column in usecols
+        })
+
+
+def read_table(
+        file_path: str, usecols: List[str] = None, index_col: int = None
+    ) -> pd.DataFrame:
+    """
+    Read a table in the storage format given by the file extension. Only the
+    `usecols` columns are read and column `index_col` becomes the index.
+    """
+    output_format = storage_format(file_path)
+    if output_format == "tsv":
+        return pd.read_table(file_path, usecols = usecols, index_col = index_col)
+
+    if output_format == "npz":
+        input_df = read_npz(file_path, usecols)
+
+    elif output_format == "feather":
+        input_df = pd.read_feather(file_path, columns = usecols)
+
+    elif output_format == "f32":
+        input_df = matrix_store.read_matrix(file_path, usecols)
+
+    else:
+        input_df = pd.read_parquet(file_path, columns = usecols)
+
+    if index_col is not None:
+        input_df = input_df.set_index(input_df.columns[index_col])
+
+    return input_df
+
+
+def read_npz_chunks(
+        file_path: str, chunk_size: int
+    ) -> Iterator[pd.DataFrame]:
+    """
+    Read an `.npz` table `chunk_size` rows at a time, loading one archive
+    chunk of its columns at a time.
+    """
+    with np.load(file_path) as npz_file:
+        columns = npz_file[npz_columns_key].tolist()
+        first_row = 0
+        buffer_df = None # Rows read but not yet yielded.
+        for chunk_idx in range(int(npz_file[npz_chunks_key])):
+            archive_df = pd.DataFrame({
+                column: npz_file[npz_column_key(column_idx, chunk_idx)]
+                for column_idx, column in enumerate(columns)
+            })
+            archive_df.index += first_row
+            first_row += archive_df.shape[0]
+            buffer_df = archive_df if buffer_df is None else \
+                pd.concat([buffer_df, archive_df])
+            while buffer_df.shape[0] >= chunk_size:
+                yield buffer_df.iloc[:chunk_size]
+                buffer_df = buffer_df.iloc[chunk_size:]
+
+        if buffer_df is not None and buffer_df.shape[0] > 0:
+            yield buffer_df
+
+
+def read_matrix_chunks(
+        store_path: str, chunk_size: int
+    ) -> Iterator[pd.DataFrame]:
+    """
+    Read a matrix store `chunk_size` rows at a time, as slices of its
+    memory-mapped arrays.
+    """
+    columns = matrix_store.read_columns(store_path)
+    values = matrix_store.open_values(store_path)
+    key_columns = len(columns) - values.shape[1]
+    keys = matrix_store.open_keys(store_path, key_columns)
+    for chunk_start in range(0, values.shape[0], chunk_size):
+        chunk_stop = min(chunk_start + chunk_size, values.shape[0])
+        chunk_index = pd.RangeIndex(chunk_start, chunk_stop)
+        yield pd.concat(
+            [
+                df(
+                    {
+                        key_name: key_array[chunk_start:chunk_stop]
+                        for key_name, key_array in zip(
+                            columns[:key_columns], keys
+                        )
+                    }, index = chunk_index
+                ),
+                df(
+                    values[chunk_start:chunk_stop], index = chunk_index,
+                    columns = columns[key_columns:]
+                )
+            ], axis = 1
+        )
+
+
+def read_table_chunks(
+        file_path: str, chunk_size: int
+    ) -> Iterator[pd.DataFrame]:
+    """
+    Read a table `chunk_size` rows at a time. Text tables, archives and
+    matrix stores are read incrementally; Arrow and Parquet tables can only
+    be read whole, then sliced, with a warning.
+    """
+    input_format = storage_format(file_path)
+    if input_format == "tsv":
+        yield from pd.read_table(file_path, chunksize = chunk_size)
+        return
+
+    if input_format == "npz":
+        yield from read_npz_chunks(file_path, chunk_size)
+        return
+
+    if input_format == "f32":
+        yield from read_matrix_chunks(file_path, chunk_size)
+        return
+
+    warnings.warn(helpers.string_builder((
+        "Reading ", file_path, " whole: ", input_format,
+        " tables are not read in chunks. Use tsv, npz or f32 input to bound "
+        "memory by the chunk size."
+    )))
+    input_df = read_table(file_path)
+    for chunk_start in range(0, input_df.shape[0], chunk_size):
+        yield input_df.iloc[chunk_start:chunk_start + chunk_size]
+
+
+class TableWriter:
+    def __init__(
+            self, file_path: str, write_index: bool = False,
+            key_columns: int = None
+        ) -> None:
+        self.file_path = file_path
+        self.write_index = write_index
+        self.key_columns = key_columns
+        self.output_format = storage_format(file_path)
+        self.header_written = False
+        self.columns = None
+        self.chunks = 0
+        self.chunk_writer = None # Archive, matrix store or Arrow writer.
+        self.arrow_schema = None
+
+
+    def __write_arrow_chunk(self, output_df: pd.DataFrame) -> None:
+        """
+        Write the next chunk of rows as a Parquet row group or an Arrow IPC
+        record batch. Only these formats need `pyarrow`.
+        """
+        import pyarrow
+
+        chunk_table = pyarrow.Table.from_pandas(
+            output_df, preserve_index = False
+        )
+        if self.chunk_writer is None:
+            self.arrow_schema = chunk_table.schema
+            if self.output_format == "parquet":
+                import pyarrow.parquet
+                self.chunk_writer = pyarrow.parquet.ParquetWriter(
+                    self.file_path, self.arrow_schema
+                )
+
+            else:
+                import pyarrow.ipc
+                self.chunk_writer = pyarrow.ipc.new_file(
+                    self.file_path, self.arrow_schema
+                )
+
+        self.chunk_writer.write_table(chunk_table.cast(self.arrow_schema))
+
+
+    def write(self, output_df: pd.DataFrame) -> None:
+        """
+        Write the next chunk of rows. Text output is appended; binary formats
+        add the chunk as an archive chunk, matrix store shard, Parquet row
+        group or Arrow record batch, so no format holds more than one chunk.
+        """
+        if self.output_format == "tsv":
+            output_df.to_csv(
+                self.file_path, sep = '\t', index = self.write_index,
+                header = not self.header_written,
+                mode = 'a' if self.header_written else 'w'
+            )
+            self.header_written = True
+            return
+
+        output_df = binary_table_df(output_df, self.write_index)
+        if self.columns is None:
+            self.columns = output_df.columns.tolist()
+
+        if self.output_format == "npz":
+            if self.chunk_writer is None:
+                self.chunk_writer = zipfile.ZipFile(self.file_path, 'w')
+
+            write_npz_chunk(self.chunk_writer, output_df, self.chunks)
+
+        elif self.output_format == "f32":
+            if self.chunk_writer is None:
+                self.chunk_writer = matrix_store.MatrixWriter(
+                    self.file_path, self.key_columns
+                )
+
+            self.chunk_writer.write(output_df)
+
+        else:
+            self.__write_arrow_chunk(output_df)
+
+        self.chunks += 1
+
+
+    def close(self) -> None:
+        """
+        Finish the output file. An output without any chunk is written as an
+        empty table.
+        """
+        if self.output_format == "tsv":
+            if not self.header_written:
+                open(self.file_path, 'w').close()
+
+        elif self.chunk_writer is None:
+            write_table(df(), self.file_path)
+
+        else:
+            if self.output_format == "npz":
+                write_npz_header(self.chunk_writer, self.columns, self.chunks)
+
+            self.chunk_writer.close()
+            self.chunk_writer = None
@@ -7,8 +7,10 @@ User interface.
 """
 
 import argparse
-from . import bed_combiner, bin_generator, delta_methylation_and_phenotype, \
-    helpers, methylation_binner, paired_t_tester, phenotype_regressor
+from . import bed_combiner, bed_reader, bin_generator, bin_index, \
+    delta_methylation_and_phenotype, genomic_keys, helpers, \
+    methylation_binner, paired_t_tester, permutation_tester, \
+    phenotype_regressor, result_logger, storage
 
 cultivars = [
     "canda", "cfx1", "cfx2", "crs1", "delores", "finola", "grandi",
@@ -29,6 +31,206 @@ def user_interface():
         default = None, help = bed_combiner_help
     )
 
+    merge_mode_help = helpers.string_builder((
+        "BED combining mode: concat (default), stream (k-way merge), pool ",
+        "(parallel parsing) or checkpoint (single write, resumable)."
+    ))
+    parser.add_argument(
+        "--merge_mode", type = str, choices = bed_combiner.merge_modes,
+        default = "concat", help = merge_mode_help
+    )
+
+    key_format_help = helpers.string_builder((
+        "Site key layout of the combined BED output: a single ",
+        "Scaffold_Position column (string, default) or separate #Scaffold ",
+        "and Position columns (columns)."
+    ))
+    parser.add_argument(
+        "--key_format", type = str, choices = genomic_keys.key_formats,
+        default = "string", help = key_format_help
+    )
+
+    workers_help = helpers.string_builder((
+        "Number of worker processes (defaults to the CPU count; methylation ",
+        "binning runs in one process unless given)."
+    ))
+    parser.add_argument(
+        "--workers", type = int, default = None, help = workers_help
+    )
+
+    chunk_size_help = "Rows read per chunk when streaming input files."
+    parser.add_argument(
+        "--chunk_size", type = int, default = bed_reader.default_chunk_size,
+        help = chunk_size_help
+    )
+
+    coverage_column_help = helpers.string_builder((
+        "BED column (0-based) holding the read coverage of each site, ",
+        "combined into a companion sorted_methylation_coverage table."
+    ))
+    parser.add_argument(
+        "--coverage_column", type = int, default = None,
+        help = coverage_column_help
+    )
+
+    coverage_file_help = helpers.string_builder((
+        "Coverage tables from BED combining, one per -mb methylation file: ",
+        "weight bin methylation by read depth."
+    ))
+    parser.add_argument(
+        "--coverage_file", type = str, nargs = '+', default = None,
+        help = coverage_file_help
+    )
+
+    output_format_help = helpers.string_builder((
+        "Storage format of the output tables: tsv (default), npz, feather, ",
+        "parquet or f32 (memory-mapped float32 matrix store). Inputs are read ",
+        "in the format given by their extension."
+    ))
+    parser.add_argument(
+        "--output_format", type = str, choices = storage.storage_formats,
+        default = "tsv", help = output_format_help
+    )
+
+    bin_size_help = "Bin size in bp for bin generation and binning."
+    parser.add_argument(
+        "--bin_size", type = int, default = bin_index.default_bin_size,
+        help = bin_size_help
+    )
+
+    bin_step_help = helpers.string_builder((
+        "Step between bin starts in bp (defaults to the bin size); a ",
+        "multiple of half the bin size."
+    ))
+    parser.add_argument(
+        "--bin_step", type = int, default = None, help = bin_step_help
+    )
+
+    virtual_bins_help = helpers.string_builder((
+        "Bin methylation into virtual bins: the first -mb argument is a ",
+        "scaffold sizes file instead of a sorted bins file."
+    ))
+    bin_mode_group = parser.add_mutually_exclusive_group()
+    bin_mode_group.add_argument(
+        "--virtual_bins", action = "store_true", help = virtual_bins_help
+    )
+
+    streaming_help = helpers.string_builder((
+        "Bin methylation into virtual bins in one streaming pass, reading ",
+        "--chunk_size sites at a time: the first -mb argument is a scaffold ",
+        "sizes file, in the scaffold order of the methylation file. With ",
+        "-ptt, run all paired t-tests in one pass over --chunk_size bins at a ",
+        "time."
+    ))
+    bin_mode_group.add_argument(
+        "--streaming", action = "store_true", help = streaming_help
+    )
+
+    regions_help = helpers.string_builder((
+        "Bin methylation into annotation regions: the first -mb argument is ",
+        "a BED file of regions (e.g. genes, promoters, DMRs), which may vary ",
+        "in size and overlap."
+    ))
+    bin_mode_group.add_argument(
+        "--regions", action = "store_true", help = regions_help
+    )
+
+    t_test_engine_help = helpers.string_builder((
+        "Cross-cultivar paired t-test engine: vectorized (default, all bins ",
+        "at once) or apply (one bin at a time, logging each bin)."
+    ))
+    parser.add_argument(
+        "--t_test_engine", type = str, choices = paired_t_tester.t_test_engines,
+        default = "vectorized", help = t_test_engine_help
+    )
+
+    regression_engine_help = helpers.string_builder((
+        "Phenotype regression engine: closed_form (default, all bins at ",
+        "once), matrix (all bins and phenotypes at once, in one pass) or ",
+        "formula (one statsmodels fit per bin, logging each model summary)."
+    ))
+    parser.add_argument(
+        "--regression_engine", type = str,
+        choices = phenotype_regressor.regression_engines,
+        default = "closed_form", help = regression_engine_help
+    )
+
+    covariates_help = helpers.string_builder((
+        "Adjust phenotype regression for covariates: a covariate table ",
+        "indexed by cultivar (e.g. the delta phenotype file), optionally ",
+        "followed by the covariate columns to use (defaults to all). Text ",
+        "columns are dummy-coded; phenotypes are not adjusted for themselves."
+    ))
+    parser.add_argument(
+        "--covariates", type = str, nargs = '+', metavar = "covariate",
+        default = None, help = covariates_help
+    )
+
+    memory_budget_help = helpers.string_builder((
+        "Memory budget in MiB of the working arrays of each chunk of bins in ",
+        "vectorized statistics."
+    ))
+    parser.add_argument(
+        "--memory_budget", type = int,
+        default = helpers.default_memory_budget // 2 ** 20,
+        help = memory_budget_help
+    )
+
+    log_level_help = helpers.string_builder((
+        "Log level of the t-test and regression log files: quiet (no log), ",
+        "summary (default) or bins (a text block for every bin)."
+    ))
+    parser.add_argument(
+        "--log_level", type = str, choices = result_logger.log_levels,
+        default = result_logger.default_log_level, help = log_level_help
+    )
+
+    bin_records_help = helpers.string_builder((
+        "Write per-bin t-test and regression results as JSON lines records ",
+        "next to the output tables."
+    ))
+    parser.add_argument(
+        "--bin_records", action = "store_true", help = bin_records_help
+    )
+
+    p_threshold_help = helpers.string_builder((
+        "Write only the per-bin t-test and regression hits with p-values at ",
+        "most P_THRESHOLD, as _hits tables instead of the full outputs."
+    ))
+    parser.add_argument(
+        "--p_threshold", type = float, default = None, help = p_threshold_help
+    )
+
+    top_k_help = helpers.string_builder((
+        "Write only the TOP_K per-bin t-test and regression hits with the ",
+        "smallest p-values (among those passing --p_threshold), as _hits ",
+        "tables instead of the full outputs."
+    ))
+    parser.add_argument(
+        "--top_k", type = int, default = None, help = top_k_help
+    )
+
+    permutations_help = helpers.string_builder((
+        "Number of sign flips per permutation test (every sign flip, for ",
+        "exact p-values, when there are no more)."
+    ))
+    parser.add_argument(
+        "--permutations", type = int,
+        default = permutation_tester.default_permutations,
+        help = permutations_help
+    )
+
+    seed_help = "Seed of the permutation test sign flips."
+    parser.add_argument("--seed", type = int, default = None, help = seed_help)
+
+    early_stop_help = helpers.string_builder((
+        "Stop permutation testing bins as soon as they can no longer be ",
+        "nominally significant."
+    ))
+    parser.add_argument(
+        "--early_stop", action = "store_true", help = early_stop_help
+    )
+
     bin_generator_help = "Generate bins."
     parser.add_argument(
         "-bg", "--bin_generator", type = str, nargs = 2,
@@ -36,11 +238,13 @@ def user_interface():
         default = None, help = bin_generator_help
     )
 
-    methylation_binner_help = "Calculate bin methylation."
+    methylation_binner_help = helpers.string_builder((
+        "Calculate bin methylation: a sorted bins file, one or more ",
+        "methylation files (one per location), then the output directory."
+    ))
     parser.add_argument(
-        "-mb", "--methylation_binner", type = str, nargs = 3,
-        metavar = ("sorted_bins_file", "methylation_file", "output_directory"),
-        default = None, help = methylation_binner_help
+        "-mb", "--methylation_binner", type = str, nargs = '+',
+        metavar = "file", default = None, help = methylation_binner_help
     )
 
     paired_t_tester_help = "Paired t-tests."
@@ -50,6 +254,13 @@ def user_interface():
         default = None, help = paired_t_tester_help
     )
 
+    permutation_tester_help = "Paired sign-flip permutation tests."
+    parser.add_argument(
+        "-pmt", "--permutation_tester", nargs = 3,
+        metavar = ("lethbridge_file", "vegreville_file", "output_directory"),
+        default = None, help = permutation_tester_help
+    )
+
     delta_mp_help = "Delta - Vegreville minus Lethbridge"
     parser.add_argument(
         "-dmp", "--delta_mp", type = str, nargs = 5,
@@ -72,27 +283,84 @@ def user_interface():
 
     # Arguments
     if args.bed_combiner != None:
-        bed_combiner.bed_combiner(cultivars, args[0], args[1])
+        bed_combiner.bed_combiner(
+            cultivars, args.bed_combiner, args.merge_mode, args.key_format,
+            args.workers, args.chunk_size, args.output_format,
+            args.coverage_column
+        )
 
     elif args.bin_generator != None:
-        bg_obj = bin_generator.BinGenerator()
-        bg_obj.bin_generator(args[0], args[1])
+        bg_obj = bin_generator.BinGenerator(args.bin_size, args.bin_step)
+        bg_obj.bin_generator(*args.bin_generator, args.output_format)
 
     elif args.methylation_binner != None:
-        mb_obj = methylation_binner.MethylationBinner()
-        mb_obj.calculate_all_bin_methylation(args[0], args[1], args[2])
+        if len(args.methylation_binner) < 3:
+            parser.error(
+                "-mb needs a bins file, at least one methylation file and an "
+                "output directory."
+            )
+
+        bin_mode = "bins"
+        if args.streaming:
+            bin_mode = "streaming"
+
+        elif args.virtual_bins:
+            bin_mode = "virtual"
+
+        elif args.regions:
+            bin_mode = "regions"
+
+        mb_obj = methylation_binner.MethylationBinner(
+            args.bin_size, args.bin_step,
+            workers = 1 if args.workers is None else args.workers,
+            chunk_size = args.chunk_size
+        )
+        mb_obj.calculate_batch_methylation(
+            args.methylation_binner[0], args.methylation_binner[1:-1],
+            args.methylation_binner[-1], args.output_format,
+            args.coverage_file, bin_mode
+        )
 
     elif args.paired_t_tester != None:
-        paired_t_tester.paired_t_tests(args[0], args[1], args[2])
+        if args.streaming:
+            paired_t_tester.streaming_paired_t_tests(
+                *args.paired_t_tester, args.output_format, args.chunk_size,
+                args.memory_budget * 2 ** 20, args.log_level,
+                args.bin_records, args.p_threshold, args.top_k
+            )
+
+        else:
+            paired_t_tester.paired_t_tests(
+                *args.paired_t_tester, args.output_format,
+                args.t_test_engine, args.memory_budget * 2 ** 20,
+                args.log_level, args.bin_records, args.p_threshold, args.top_k
+            )
+
+    elif args.permutation_tester != None:
+        permutation_tester.permutation_tests(
+            *args.permutation_tester, args.output_format, args.permutations,
+            args.seed, args.early_stop, args.memory_budget * 2 ** 20,
+            args.log_level
+        )
 
     elif args.delta_mp != None:
         delta_methylation_and_phenotype.delta(
-            args[0], args[1], args[2], args[3], args[4]
+            *args.delta_mp, args.output_format
         )
 
     elif args.phenotype_regressor != None:
+        covariate_file_path = None
+        covariate_columns = None
+        if args.covariates != None:
+            covariate_file_path = args.covariates[0]
+            covariate_columns = args.covariates[1:]
+
         phenotype_regressor.phenotype_methylation_regression(
-            args[0], args[1], args[2]
+            *args.phenotype_regressor, args.output_format,
+            args.regression_engine, args.workers,
+            args.memory_budget * 2 ** 20, args.log_level, args.bin_records,
+            covariate_file_path, covariate_columns, args.p_threshold,
+            args.top_k
         )
 
     else:
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tests of the BED combiner merge modes against one another, of compressed and
+chunked reading, of sort checking and of resuming from checkpoints.
+
+"""
+
+import gzip
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from dnam_feature_analysis import bed_combiner, storage
+
+cultivars = ["cultivar_1", "cultivar_2", "cultivar_3"]
+location_labels = ('L', 'V')
+coverage_column = 8
+# Scaffolds in natural order, not lexicographic order.
+scaffolds = ["scaffold_1", "scaffold_2", "scaffold_10"]
+
+
+def write_bed_files(tmp_path: object) -> tuple:
+    """
+    Write coordinate-sorted BED files of every cultivar at both locations,
+    each cultivar holding a different subset of the sites. Returns the BED
+    directory paths.
+    """
+    rng = np.random.default_rng(0)
+    bed_dir_paths = []
+    for location_label in location_labels:
+        bed_dir_path = tmp_path / location_label
+        (bed_dir_path / "cultivars").mkdir(parents = True)
+        for cultivar in cultivars:
+            bed_df = pd.concat(
+                [
+                    pd.DataFrame({
+                        "scaffold": scaffold,
+                        "start": np.sort(rng.choice(60, 12, False))
+                    }) for scaffold in scaffolds
+                ], ignore_index = True
+            )
+            bed_df["end"] = bed_df["start"] + 1
+            bed_df["name"] = 'x'
+            bed_df["score"] = 5
+            bed_df["strand"] = '+'
+            bed_df["methylated"] = rng.integers(0, 30, bed_df.shape[0])
+            bed_df["beta_value"] = rng.random(bed_df.shape[0]).round(4)
+            bed_df["coverage"] = rng.integers(1, 40, bed_df.shape[0])
+            bed_df.to_csv(
+                bed_dir_path / "cultivars" / (
+                    cultivar + '_' + location_label + ".bed"
+                ), sep = '\t', header = False, index = False
+            )
+
+        bed_dir_paths.append(str(bed_dir_path))
+
+    return tuple(bed_dir_paths)
+
+
+def combined_dfs(bed_dir_paths: tuple) -> list:
+    """
+    Combined beta value and coverage tables of both locations.
+    """
+    return [
+        storage.read_table(bed_dir_path + '/' + output_table + ".tsv")
+        for bed_dir_path in bed_dir_paths
+        for output_table in (
+            bed_combiner.levels_table, bed_combiner.coverage_table
+        )
+    ]
+
+
+@pytest.mark.parametrize("key_format", ("string", "columns"))
+def test_merge_modes_write_identical_tables(
+        tmp_path: object, monkeypatch: object, key_format: str
+    ) -> None:
+    monkeypatch.chdir(tmp_path) # The combiners log to the working directory.
+    bed_dir_paths = write_bed_files(tmp_path)
+    mode_dfs = {}
+    for merge_mode in bed_combiner.merge_modes:
+        bed_combiner.bed_combiner(
+            cultivars, bed_dir_paths, merge_mode, key_format, workers = 2,
+            chunk_size = 7, coverage_column = coverage_column
+        )
+        mode_dfs[merge_mode] = combined_dfs(bed_dir_paths)
+
+    for merge_mode in bed_combiner.merge_modes[1:]:
+        for concat_df, mode_df in zip(
+                mode_dfs["concat"], mode_dfs[merge_mode]
+            ):
+            pd.testing.assert_frame_equal(mode_df, concat_df)
+
+    # Sites in natural scaffold order, then position.
+    levels_df = mode_dfs["concat"][0]
+    site_keys = levels_df.iloc[:, 0].astype(str) if key_format == "string" \
+        else levels_df["#Scaffold"] + '_' + levels_df["Position"].astype(str)
+    site_scaffolds = site_keys.str.rsplit('_', n = 1).str[0]
+    site_positions = site_keys.str.rsplit('_', n = 1).str[1].astype(int)
+    assert site_scaffolds.unique().tolist() == scaffolds
+    assert (
+        site_positions.groupby(site_scaffolds, sort = False).diff().dropna() > 0
+    ).all()
+
+
+@pytest.mark.parametrize("merge_mode", ("concat", "stream"))
+def test_compressed_bed_files_match_plain_bed_files(
+        tmp_path: object, monkeypatch: object, merge_mode: str
+    ) -> None:
+    monkeypatch.chdir(tmp_path)
+    bed_dir_paths = write_bed_files(tmp_path)
+    bed_combiner.bed_combiner(
+        cultivars, bed_dir_paths, merge_mode, coverage_column = coverage_column
+    )
+    plain_dfs = combined_dfs(bed_dir_paths)
+
+    # Compressed files are found by their suffix and read a few rows at a
+    # time.
+    for bed_file_path in tmp_path.glob("*/cultivars/*.bed"):
+        with gzip.open(str(bed_file_path) + ".gz", "wb") as bed_file:
+            bed_file.write(bed_file_path.read_bytes())
+
+        bed_file_path.unlink()
+
+    bed_combiner.bed_combiner(
+        cultivars, bed_dir_paths, merge_mode, chunk_size = 5,
+        coverage_column = coverage_column
+    )
+    for plain_df, compressed_df in zip(
+            plain_dfs, combined_dfs(bed_dir_paths)
+        ):
+        pd.testing.assert_frame_equal(compressed_df, plain_df)
+
+
+def test_stream_mode_rejects_unsorted_bed_files(
+        tmp_path: object, monkeypatch: object
+    ) -> None:
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sys, "stdout", sys.stdout) # Restored after logging.
+    bed_dir_paths = write_bed_files(tmp_path)
+    bed_file_path = tmp_path / 'L' / "cultivars" / "cultivar_2_L.bed"
+    bed_lines = bed_file_path.read_text().splitlines(keepends = True)
+    bed_lines[3], bed_lines[4] = bed_lines[4], bed_lines[3]
+    bed_file_path.write_text("".join(bed_lines))
+
+    with pytest.raises(ValueError, match = "cultivar_2_L.bed is not"):
+        bed_combiner.BedCombiner(
+            'L', bed_dir_paths[0], chunk_size = 2
+        ).loc_bed_merger(cultivars)
+
+
+def test_checkpoint_resume_matches_fresh_run(
+        tmp_path: object, monkeypatch: object
+    ) -> None:
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sys, "stdout", sys.stdout)
+    bed_dir_paths = write_bed_files(tmp_path)
+    bed_combiner.bed_combiner(
+        cultivars, bed_dir_paths, "checkpoint",
+        coverage_column = coverage_column
+    )
+    fresh_dfs = combined_dfs(bed_dir_paths)
+
+    # A run crashing on the last cultivar keeps the earlier checkpoints.
+    bed_file_path = tmp_path / 'L' / "cultivars" / "cultivar_3_L.bed"
+    bed_file_path.rename(tmp_path / "cultivar_3_L.bed")
+    with pytest.raises(FileNotFoundError):
+        bed_combiner.BedCombiner(
+            'L', bed_dir_paths[0], coverage_column = coverage_column
+        ).loc_bed_combiner(cultivars, True)
+
+    checkpoint_dir_path = tmp_path / 'L' / (
+        bed_combiner.levels_table + bed_combiner.checkpoint_suffix
+    )
+    assert sorted(
+        checkpoint_path.name for checkpoint_path in
+        checkpoint_dir_path.iterdir()
+    ) == ["cultivar_1.npz", "cultivar_2.npz"]
+
+    (tmp_path / "cultivar_3_L.bed").rename(bed_file_path)
+    bed_combiner.bed_combiner(
+        cultivars, bed_dir_paths, "checkpoint",
+        coverage_column = coverage_column
+    )
+    assert not checkpoint_dir_path.exists()
+    assert "Resuming from checkpoints of 2" in \
+        (tmp_path / "L_bed_combine_stdout.txt").read_text()
+    for fresh_df, resumed_df in zip(fresh_dfs, combined_dfs(bed_dir_paths)):
+        pd.testing.assert_frame_equal(resumed_df, fresh_df)
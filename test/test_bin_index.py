@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tests of the virtual bin index, the region index and the prefix-sum region
+means.
+
+"""
+
+import numpy as np
+import pytest
+
+from dnam_feature_analysis import bin_index, genomic_keys, methylation_binner
+
+scaffold_names = np.array(["scaffold_1", "scaffold_2", "scaffold_10"])
+scaffold_sizes = np.array([1000, 950, 1001])
+
+
+def test_bin_ids_map_sites_to_midpoint_labelled_bins() -> None:
+    virtual_bin_index = bin_index.VirtualBinIndex(
+        scaffold_names, scaffold_sizes, 100
+    )
+    assert virtual_bin_index.num_bins.tolist() == [10, 10, 11]
+    codes = np.array([0, 0, 0, 1, 1, 2, 2, 1, 3])
+    positions = np.array([1, 100, 101, 901, 950, 1001, 1000, 951, 5])
+    bin_ids = virtual_bin_index.bin_ids(codes, positions)
+    # Beyond the scaffold end and on unknown scaffolds: no bin.
+    assert bin_ids.tolist() == [0, 0, 1, 19, 19, 30, 29, -1, -1]
+
+    bin_keys_df = virtual_bin_index.bin_keys_df(bin_ids[:-2])
+    assert bin_keys_df["#Scaffold"].tolist() == [
+        "scaffold_1", "scaffold_1", "scaffold_1", "scaffold_2", "scaffold_2",
+        "scaffold_10", "scaffold_10"
+    ]
+    # A partial last bin is labelled by its midpoint, a 1bp one by its only
+    # position.
+    assert bin_keys_df["Bin_Label"].tolist() == [
+        50, 50, 150, 925, 925, 1001, 950
+    ]
+
+    # Every site lies within the bounds of its bin.
+    bin_starts, bin_ends = virtual_bin_index.bin_bounds(bin_ids[:-2])
+    assert (bin_starts <= positions[:-2]).all()
+    assert (positions[:-2] <= bin_ends).all()
+
+
+def test_bin_ids_skip_gaps_between_bins() -> None:
+    virtual_bin_index = bin_index.VirtualBinIndex(
+        scaffold_names[:1], scaffold_sizes[:1], 100, 200
+    )
+    assert virtual_bin_index.total_bins == 5
+    assert virtual_bin_index.bin_ids(
+        np.zeros(5, dtype = np.int64), np.array([1, 100, 101, 200, 201])
+    ).tolist() == [0, 0, -1, -1, 1]
+
+
+def test_overlapping_bins_are_labelled_but_not_mapped() -> None:
+    virtual_bin_index = bin_index.VirtualBinIndex(
+        scaffold_names[:1], scaffold_sizes[:1], 100, 50
+    )
+    bin_keys_df = virtual_bin_index.bin_keys_df()
+    assert bin_keys_df["Bin_Label"].tolist() == list(range(50, 1000, 50))
+    with pytest.raises(ValueError, match = "non-overlapping"):
+        virtual_bin_index.bin_ids(np.array([0]), np.array([75]))
+
+
+@pytest.mark.parametrize("bin_size, bin_step", ((101, None), (100, 30)))
+def test_bin_grid_rejects_unrecoverable_labels(
+        bin_size: int, bin_step: int
+    ) -> None:
+    with pytest.raises(ValueError):
+        bin_index.VirtualBinIndex(
+            scaffold_names, scaffold_sizes, bin_size, bin_step
+        )
+
+
+def test_region_ranges_cover_bed_start_plus_one_to_end() -> None:
+    region_index = bin_index.RegionIndex(
+        np.array(["scaffold_1", "scaffold_1", "scaffold_2"]),
+        np.array([0, 9, 99]), np.array([10, 20, 100])
+    )
+    assert region_index.region_keys_df()["Bin_Label"].tolist() == [
+        "0-10", "9-20", "99-100"
+    ]
+    site_codes = np.array([0, 0, 0, 0, 0, 1, 1, 1])
+    site_positions = np.array([1, 9, 10, 11, 21, 99, 100, 101])
+    sorted_site_keys = genomic_keys.pack_keys(
+        region_index.scaffold_dictionary.encode(
+            np.array(["scaffold_1", "scaffold_2"])[site_codes]
+        ), site_positions
+    )
+    first_sites, last_sites = region_index.site_ranges(sorted_site_keys)
+    # Regions overlap at position 10; the 1bp region holds position 100 only.
+    assert first_sites.tolist() == [0, 2, 6]
+    assert last_sites.tolist() == [3, 4, 7]
+
+
+def test_region_index_rejects_empty_regions() -> None:
+    with pytest.raises(ValueError, match = "start < end"):
+        bin_index.RegionIndex(
+            np.array(["scaffold_1"]), np.array([10]), np.array([10])
+        )
+
+
+@pytest.mark.parametrize("weighted", (False, True))
+def test_region_means_match_per_region_means(weighted: bool) -> None:
+    rng = np.random.default_rng(0)
+    methylation_values = rng.random((30, 3))
+    methylation_values[rng.random(methylation_values.shape) < 0.2] = np.nan
+    methylation_values[10:15, 1] = np.nan
+    site_weights = rng.integers(0, 20, methylation_values.shape).astype(float) \
+        if weighted else None
+    # Overlapping, nested, empty and all-missing regions.
+    first_sites = np.array([0, 5, 8, 10, 20, 29, 0])
+    last_sites = np.array([10, 25, 12, 15, 20, 30, 30])
+
+    means, region_sites, region_depths = methylation_binner.region_means(
+        first_sites, last_sites, methylation_values, site_weights
+    )
+
+    assert region_sites.tolist() == (last_sites - first_sites).tolist()
+    for region_idx, (first_site, last_site) in enumerate(
+            zip(first_sites, last_sites)
+        ):
+        region_values = methylation_values[first_site:last_site]
+        if last_site == first_site:
+            assert (means[region_idx] == 0).all()
+            assert (region_depths[region_idx] == 0).all()
+            continue
+
+        present = ~np.isnan(region_values)
+        weights = present.astype(float)
+        if weighted:
+            weights *= site_weights[first_site:last_site]
+
+        depths = weights.sum(axis = 0)
+        np.testing.assert_allclose(region_depths[region_idx], depths)
+        with np.errstate(invalid = "ignore"):
+            expected_means = (
+                np.where(present, region_values, 0) * weights
+            ).sum(axis = 0) / depths
+
+        np.testing.assert_allclose(
+            means[region_idx], expected_means, rtol = 1e-10
+        )
+
+    assert np.isnan(means[3, 1])
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tests of the delta methylation of text tables and of matrix stores.
+
+"""
+
+import numpy as np
+import pandas as pd
+
+from dnam_feature_analysis import delta_methylation_and_phenotype, storage
+
+
+def test_store_delta_matches_table_delta(
+        tmp_path: object, monkeypatch: object
+    ) -> None:
+    rng = np.random.default_rng(0)
+    cultivars = ["cultivar_" + str(cultivar_idx) for cultivar_idx in range(4)]
+    for location in ("lethbridge", "vegreville"):
+        methylation_df = pd.DataFrame({
+            "#Scaffold": ["scaffold_1"] * 5 + ["scaffold_2"] * 5,
+            "Bin_Label": np.arange(10) * 100
+        })
+        # Float32 values, as stored, so both deltas start from the same data.
+        methylation_df[cultivars] = rng.random((10, 4)).astype(np.float32)
+        methylation_df.iloc[3, 3] = np.nan
+        phenotype_df = pd.DataFrame(
+            {"height": rng.random(4)}, index = cultivars
+        )
+        for extension in ("tsv", "f32"):
+            storage.write_table(
+                methylation_df, str(tmp_path / (location + '.' + extension)),
+                key_columns = 2
+            )
+
+        storage.write_table(
+            phenotype_df, str(tmp_path / (location + "_phenotype.tsv")),
+            write_index = True
+        )
+
+    # Fewer bins per chunk than bins.
+    monkeypatch.setattr(
+        delta_methylation_and_phenotype, "default_memory_budget", 256
+    )
+    for extension in ("tsv", "f32"):
+        delta_methylation_and_phenotype.delta(
+            str(tmp_path / ("lethbridge." + extension)),
+            str(tmp_path / ("vegreville." + extension)),
+            str(tmp_path / "lethbridge_phenotype.tsv"),
+            str(tmp_path / "vegreville_phenotype.tsv"),
+            str(tmp_path / extension), extension
+        )
+
+    table_delta_df = storage.read_table(
+        str(tmp_path / "tsv" / "delta_methylation_v_minus_l.tsv")
+    )
+    store_delta_df = storage.read_table(
+        str(tmp_path / "f32" / "delta_methylation_v_minus_l.f32")
+    )
+    pd.testing.assert_frame_equal(
+        store_delta_df, table_delta_df, check_dtype = False, rtol = 1e-6
+    )
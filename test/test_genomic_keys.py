@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tests of packing, sorting and parsing integer genomic keys.
+
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from dnam_feature_analysis import genomic_keys
+
+
+def test_packed_keys_unpack_to_codes_and_positions() -> None:
+    codes = np.array([0, 0, 1, 7, 2 ** 31])
+    positions = np.array([1, 2 ** 32 - 1, 0, 123456789, 5])
+    keys = genomic_keys.pack_keys(codes, positions)
+    assert keys.dtype == np.uint64
+
+    unpacked_codes, unpacked_positions = genomic_keys.unpack_keys(keys)
+    np.testing.assert_array_equal(unpacked_codes, codes)
+    np.testing.assert_array_equal(unpacked_positions, positions)
+    # Keys sort by code, then position.
+    assert np.argsort(keys).tolist() == list(range(codes.size))
+
+
+def test_natural_sort_order_sorts_scaffolds_naturally() -> None:
+    scaffold_dictionary = genomic_keys.ScaffoldDictionary()
+    scaffolds = pd.Series([
+        "scaffold_10", "scaffold_2", "scaffold_10", "scaffold_1", "scaffold_2"
+    ])
+    positions = np.array([5, 300, 1, 40, 20])
+    keys = genomic_keys.pack_keys(
+        scaffold_dictionary.encode(scaffolds), positions
+    )
+    assert scaffold_dictionary.scaffolds == [
+        "scaffold_10", "scaffold_2", "scaffold_1"
+    ]
+
+    order = genomic_keys.natural_sort_order(keys, scaffold_dictionary)
+    assert scaffolds[order].tolist() == [
+        "scaffold_1", "scaffold_2", "scaffold_2", "scaffold_10", "scaffold_10"
+    ]
+    assert positions[order].tolist() == [40, 20, 300, 1, 5]
+
+
+def test_split_string_keys_splits_at_the_last_underscore() -> None:
+    scaffold_dictionary = genomic_keys.ScaffoldDictionary(["scaffold_1"])
+    codes, positions = genomic_keys.split_string_keys(
+        pd.Series(["scaffold_1_100", "Un_random_7_2", "scaffold_1_3"]),
+        scaffold_dictionary
+    )
+    assert codes.tolist() == [0, 1, 0]
+    assert positions.tolist() == [100, 2, 3]
+    assert scaffold_dictionary.decode(codes).tolist() == [
+        "scaffold_1", "Un_random_7", "scaffold_1"
+    ]
+
+
+@pytest.mark.parametrize("key_format", genomic_keys.key_formats)
+def test_key_output_df_reads_back_as_site_keys(key_format: str) -> None:
+    scaffold_dictionary = genomic_keys.ScaffoldDictionary(
+        ["scaffold_1", "scaffold_2"]
+    )
+    keys = genomic_keys.pack_keys([0, 0, 1], [10, 20, 5])
+    output_df = genomic_keys.key_output_df(
+        keys, pd.DataFrame({"cultivar_1": [0.1, 0.2, 0.3]}),
+        scaffold_dictionary, key_format
+    )
+    if key_format == "string":
+        assert output_df.index.tolist() == [
+            "scaffold_1_10", "scaffold_1_20", "scaffold_2_5"
+        ]
+        output_df = output_df.reset_index()
+
+    codes, positions, key_columns = genomic_keys.read_site_keys(
+        output_df, genomic_keys.ScaffoldDictionary()
+    )
+    np.testing.assert_array_equal(
+        genomic_keys.pack_keys(codes, positions), keys
+    )
+    assert output_df.columns[key_columns:].tolist() == ["cultivar_1"]
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tests of the hits tables written by hit collectors.
+
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from dnam_feature_analysis import hit_collector, storage
+
+output_columns = ["#Scaffold", "Bin_Label", "P_Value"]
+
+
+@pytest.mark.parametrize("extension", ("tsv", "npz"))
+@pytest.mark.parametrize("top_k", (None, 2))
+def test_hits_table_without_bins_keeps_columns(
+        tmp_path: object, extension: str, top_k: int
+    ) -> None:
+    hits_writer = hit_collector.open_output(
+        "ttest." + extension, str(tmp_path), 0.05, top_k, output_columns
+    )
+    hits_writer.close()
+
+    hits_df = storage.read_table(str(tmp_path / ("ttest_hits." + extension)))
+    assert hits_df.shape[0] == 0
+    assert hits_df.columns.tolist() == output_columns
+
+
+@pytest.mark.parametrize("top_k", (None, 2))
+def test_hits_table_keeps_hits(tmp_path: object, top_k: int) -> None:
+    hits_writer = hit_collector.open_output(
+        "ttest.tsv", str(tmp_path), 0.05, top_k
+    )
+    # A p-value of 0 is a hit unless its bin is filtered.
+    for p_values, filtered in (
+            ([0.5, 0.01, 0.0], None), ([0.04, float("nan"), 0.0], [0, 0, 1])
+        ):
+        hit_collector.write_chunk(
+            hits_writer, pd.DataFrame({
+                "#Scaffold": "scaffold_1", "Bin_Label": range(len(p_values)),
+                "P_Value": p_values
+            }), None if filtered is None else np.array(filtered, dtype = bool)
+        )
+
+    hits_writer.close()
+
+    hits_df = storage.read_table(str(tmp_path / "ttest_hits.tsv"))
+    assert hits_df.columns.tolist() == output_columns
+    expected_p_values = [0.01, 0.0, 0.04] if top_k is None else [0.0, 0.01]
+    assert hits_df["P_Value"].tolist() == expected_p_values
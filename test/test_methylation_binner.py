@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tests of the binning engines and bin modes against one another.
+
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from dnam_feature_analysis import bin_generator, methylation_binner, storage
+
+bin_size = 100
+scaffold_sizes = {"scaffold_1": 1000, "scaffold_2": 950, "scaffold_10": 420}
+cultivars = ["cultivar_1", "cultivar_2", "cultivar_3"]
+
+
+def write_fixture(tmp_path: object) -> None:
+    """
+    Write a scaffold sizes file and a site methylation and coverage table
+    with empty bins, an all-missing bin, partial last bins and scaffolds in
+    natural order.
+    """
+    rng = np.random.default_rng(0)
+    pd.DataFrame({
+        "#Scaffold": list(scaffold_sizes), "Size": list(scaffold_sizes.values())
+    }).to_csv(tmp_path / "scaffold_sizes.tsv", sep = '\t', index = False)
+
+    site_dfs = []
+    for scaffold, size in scaffold_sizes.items():
+        positions = np.sort(rng.choice(np.arange(1, size + 1), 40, False))
+        if scaffold == "scaffold_1":
+            # Bins 301-400 and 501-600 are empty.
+            positions = positions[
+                ((positions < 301) | (positions > 400)) &
+                ((positions < 501) | (positions > 600))
+            ]
+
+        site_dfs.append(pd.DataFrame({
+            "#Scaffold": scaffold, "Position": positions
+        }))
+
+    site_df = pd.concat(site_dfs, ignore_index = True)
+    methylation_df = site_df.copy()
+    methylation_df[cultivars] = rng.random((site_df.shape[0], len(cultivars)))
+    # Every site of bin 101-200 of scaffold 2 is missing.
+    missing_bin = (site_df["#Scaffold"] == "scaffold_2") & \
+        site_df["Position"].between(101, 200)
+    methylation_df.loc[missing_bin, cultivars] = np.nan
+    methylation_df.iloc[5, 3] = np.nan
+    methylation_df.to_csv(
+        tmp_path / "methylation.tsv", sep = '\t', index = False
+    )
+
+    coverage_df = site_df.copy()
+    coverage_df[cultivars] = rng.integers(
+        1, 30, (site_df.shape[0], len(cultivars))
+    ).astype(float)
+    coverage_df.to_csv(tmp_path / "coverage.tsv", sep = '\t', index = False)
+
+
+def bin_output_dfs(output_dir_path: object) -> tuple:
+    """
+    Bin methylation and bin coverage tables of a binning run.
+    """
+    return tuple(
+        storage.read_table(str(output_dir_path / output_file_name))
+        for output_file_name in methylation_binner.bin_mode_output_file_names[
+            "bins"
+        ]
+    )
+
+
+@pytest.mark.parametrize("coverage", (False, True))
+def test_sharded_virtual_bins_match_serial_virtual_bins(
+        tmp_path: object, monkeypatch: object, coverage: bool
+    ) -> None:
+    monkeypatch.chdir(tmp_path)
+    write_fixture(tmp_path)
+    coverage_file_path = str(tmp_path / "coverage.tsv") if coverage else None
+    for workers in (1, 3):
+        methylation_binner.MethylationBinner(
+            bin_size, workers = workers
+        ).calculate_virtual_bin_methylation(
+            str(tmp_path / "scaffold_sizes.tsv"),
+            str(tmp_path / "methylation.tsv"),
+            str(tmp_path / ("workers_" + str(workers))),
+            coverage_file_path = coverage_file_path
+        )
+
+    for serial_df, sharded_df in zip(
+            bin_output_dfs(tmp_path / "workers_1"),
+            bin_output_dfs(tmp_path / "workers_3")
+        ):
+        pd.testing.assert_frame_equal(sharded_df, serial_df)
+
+
+@pytest.mark.parametrize("extension", ("npz", "f32"))
+def test_streaming_bins_match_virtual_bins(
+        tmp_path: object, monkeypatch: object, extension: str
+    ) -> None:
+    monkeypatch.chdir(tmp_path)
+    write_fixture(tmp_path)
+    # Binary inputs, read back a chunk at a time.
+    for table_name in ("methylation", "coverage"):
+        storage.write_table(
+            storage.read_table(str(tmp_path / (table_name + ".tsv"))),
+            str(tmp_path / (table_name + '.' + extension)), key_columns = 2
+        )
+
+    methylation_binner.MethylationBinner(
+        bin_size
+    ).calculate_virtual_bin_methylation(
+        str(tmp_path / "scaffold_sizes.tsv"), str(tmp_path / "methylation.tsv"),
+        str(tmp_path / "virtual"),
+        coverage_file_path = str(tmp_path / "coverage.tsv")
+    )
+    methylation_binner.MethylationBinner(
+        bin_size, chunk_size = 7
+    ).calculate_streaming_bin_methylation(
+        str(tmp_path / "scaffold_sizes.tsv"),
+        str(tmp_path / ("methylation." + extension)),
+        str(tmp_path / "streaming"),
+        coverage_file_path = str(tmp_path / ("coverage." + extension))
+    )
+
+    for virtual_df, streaming_df in zip(
+            bin_output_dfs(tmp_path / "virtual"),
+            bin_output_dfs(tmp_path / "streaming")
+        ):
+        pd.testing.assert_frame_equal(
+            streaming_df, virtual_df, check_exact = False, rtol = 1e-6
+        )
+
+
+@pytest.mark.parametrize("coverage_sites", (-10, 10))
+def test_streaming_bins_reject_mismatched_coverage(
+        tmp_path: object, monkeypatch: object, coverage_sites: int
+    ) -> None:
+    monkeypatch.chdir(tmp_path)
+    write_fixture(tmp_path)
+    # Whole chunks of sites, so that one file runs out of chunks first.
+    for table_name, sites in (
+            ("methylation", 100), ("coverage", 100 + coverage_sites)
+        ):
+        table_df = storage.read_table(str(tmp_path / (table_name + ".tsv")))
+        storage.write_table(
+            pd.concat([table_df] * 2, ignore_index = True).iloc[:sites],
+            str(tmp_path / (table_name + ".tsv"))
+        )
+
+    with pytest.raises(ValueError, match = "coverage.tsv.*methylation.tsv"):
+        methylation_binner.MethylationBinner(
+            bin_size, chunk_size = 10
+        ).calculate_streaming_bin_methylation(
+            str(tmp_path / "scaffold_sizes.tsv"),
+            str(tmp_path / "methylation.tsv"), str(tmp_path / "streaming"),
+            coverage_file_path = str(tmp_path / "coverage.tsv")
+        )
+
+
+def test_searchsorted_bins_match_apply_bins(
+        tmp_path: object, monkeypatch: object
+    ) -> None:
+    monkeypatch.chdir(tmp_path)
+    write_fixture(tmp_path)
+    bin_generator.BinGenerator(bin_size).bin_generator(
+        str(tmp_path / "scaffold_sizes.tsv"), str(tmp_path)
+    )
+    for binning_engine in methylation_binner.binning_engines:
+        methylation_binner.MethylationBinner(
+            bin_size, binning_engine = binning_engine
+        ).calculate_all_bin_methylation(
+            str(tmp_path / "sorted_bins.tsv"),
+            str(tmp_path / "methylation.tsv"), str(tmp_path / binning_engine)
+        )
+
+    # The apply engine writes no bin coverage table.
+    searchsorted_df, apply_df = (
+        storage.read_table(str(
+            tmp_path / binning_engine / "methylation_bins.tsv"
+        )) for binning_engine in ("searchsorted", "apply")
+    )
+    pd.testing.assert_frame_equal(searchsorted_df, apply_df)
+
+    # Empty bins are 0 and the all-missing bin is missing.
+    methylation_df = searchsorted_df.set_index(["#Scaffold", "Bin_Label"])
+    assert (
+        methylation_df.loc[[("scaffold_1", 350), ("scaffold_1", 550)]] == 0
+    ).all().all()
+    assert methylation_df.loc[("scaffold_2", 150)].isna().all()
+    # Partial last bins are labelled by their midpoints.
+    assert ("scaffold_2", 925) in methylation_df.index
+    assert methylation_df.index[-1] == ("scaffold_10", 410)
+
+
+@pytest.mark.parametrize("output_format", ("tsv", "f32"))
+def test_batch_bins_match_single_location_bins(
+        tmp_path: object, monkeypatch: object, output_format: str
+    ) -> None:
+    monkeypatch.chdir(tmp_path)
+    write_fixture(tmp_path)
+    # A second location, with the same sites and other values.
+    for location_label, seed in (('L', 1), ('V', 2)):
+        (tmp_path / location_label).mkdir()
+        for table_name in ("methylation", "coverage"):
+            table_df = storage.read_table(str(tmp_path / (table_name + ".tsv")))
+            table_df[cultivars] = table_df[cultivars].to_numpy() * \
+                np.random.default_rng(seed).random((table_df.shape[0], 1))
+            storage.write_table(
+                table_df, str(tmp_path / location_label / (table_name + ".tsv"))
+            )
+
+    location_file_paths = [
+        [
+            str(tmp_path / location_label / (table_name + ".tsv"))
+            for location_label in ('L', 'V')
+        ] for table_name in ("methylation", "coverage")
+    ]
+    methylation_binner.MethylationBinner(
+        bin_size, workers = 4
+    ).calculate_batch_methylation(
+        str(tmp_path / "scaffold_sizes.tsv"), location_file_paths[0],
+        str(tmp_path / "batch"), output_format, location_file_paths[1],
+        "virtual"
+    )
+    assert methylation_binner.location_labels(location_file_paths[0]) == [
+        'L', 'V'
+    ]
+
+    for location_label, methylation_file_path, coverage_file_path in zip(
+            ('L', 'V'), *location_file_paths
+        ):
+        methylation_binner.MethylationBinner(
+            bin_size
+        ).calculate_virtual_bin_methylation(
+            str(tmp_path / "scaffold_sizes.tsv"), methylation_file_path,
+            str(tmp_path / location_label), output_format, coverage_file_path
+        )
+        for output_file_name in \
+                methylation_binner.bin_mode_output_file_names["virtual"]:
+            output_file_name = storage.output_file_name(
+                output_file_name, output_format
+            )
+            batch_file_name = location_label + '_' + output_file_name
+            pd.testing.assert_frame_equal(
+                storage.read_table(str(tmp_path / "batch" / batch_file_name)),
+                storage.read_table(
+                    str(tmp_path / location_label / output_file_name)
+                )
+            )
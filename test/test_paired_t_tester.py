@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tests of the vectorized and streaming paired T-tests against `scipy.stats`
+and the in-memory T-tests.
+
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+import scipy.stats as sps
+
+from dnam_feature_analysis import paired_t_tester, storage
+
+
+def paired_values(
+        num_bins: int = 40, num_cultivars: int = 6, seed: int = 0
+    ) -> tuple:
+    """
+    Lethbridge and Vegreville (bins x cultivars) beta values with missing
+    values and bins identical at both locations.
+    """
+    rng = np.random.default_rng(seed)
+    lethbridge_values = rng.random((num_bins, num_cultivars))
+    vegreville_values = np.clip(
+        lethbridge_values + rng.normal(0.05, 0.1, lethbridge_values.shape),
+        0, 1
+    )
+    vegreville_values[3] = lethbridge_values[3] # Identical bin.
+    lethbridge_values[5, 2] = np.nan # Missing at one location.
+    lethbridge_values[7, 1] = np.nan # Missing at both locations.
+    vegreville_values[7, 1] = np.nan
+    lethbridge_values[9] = np.nan # Identical, all missing.
+    vegreville_values[9] = np.nan
+    return (lethbridge_values, vegreville_values)
+
+
+def bins_df(values: np.ndarray) -> pd.DataFrame:
+    """
+    Bin methylation table of a (bins x cultivars) matrix.
+    """
+    return pd.concat(
+        [
+            pd.DataFrame({
+                "#Scaffold": "scaffold_1",
+                "Bin_Label": np.arange(values.shape[0]) * 100
+            }),
+            pd.DataFrame(
+                values, columns = [
+                    "cultivar_" + str(cultivar_idx)
+                    for cultivar_idx in range(values.shape[1])
+                ]
+            )
+        ], axis = 1
+    )
+
+
+def test_paired_t_test_matrix_matches_ttest_rel() -> None:
+    lethbridge_values, vegreville_values = paired_values()
+    t_stats, p_values, methylation_ratios, significant, filtered = \
+        paired_t_tester.paired_t_test_matrix(
+            vegreville_values, lethbridge_values
+        )
+
+    assert filtered.tolist() == [
+        bin_idx in (3, 9) for bin_idx in range(lethbridge_values.shape[0])
+    ]
+    for bin_idx in range(lethbridge_values.shape[0]):
+        if filtered[bin_idx]:
+            assert (t_stats[bin_idx], p_values[bin_idx]) == (0, 1)
+            assert methylation_ratios[bin_idx] == 1
+            assert not significant[bin_idx]
+            continue
+
+        model = sps.ttest_rel(
+            vegreville_values[bin_idx], lethbridge_values[bin_idx]
+        )
+        np.testing.assert_allclose(
+            [t_stats[bin_idx], p_values[bin_idx]],
+            [model.statistic, model.pvalue], rtol = 1e-10
+        )
+        assert significant[bin_idx] == (model.pvalue <= 0.05)
+
+    # Missing values propagate, as `sps.ttest_rel` does.
+    assert np.isnan(t_stats[[5, 7]]).all() and np.isnan(p_values[[5, 7]]).all()
+
+
+@pytest.mark.parametrize("chunk_size", (1, 4, 7, 40))
+def test_running_moments_match_in_memory_moments(chunk_size: int) -> None:
+    lethbridge_values, vegreville_values = paired_values()
+    differences = vegreville_values - lethbridge_values
+    moments = paired_t_tester.RunningMoments(differences.shape[1])
+    for chunk_start in range(0, differences.shape[0], chunk_size):
+        moments.update(differences[chunk_start:chunk_start + chunk_size])
+
+    np.testing.assert_allclose(
+        moments.column_means(), np.nanmean(differences, axis = 0),
+        rtol = 1e-12
+    )
+    t_stats, p_values = moments.t_test()
+    model = sps.ttest_rel(vegreville_values, lethbridge_values, axis = 0)
+    np.testing.assert_allclose(t_stats, model.statistic, rtol = 1e-10)
+    np.testing.assert_allclose(p_values, model.pvalue, rtol = 1e-10)
+
+
+@pytest.mark.parametrize("chunk_size", (1, 6, 13, 100))
+def test_streaming_t_tests_match_in_memory_t_tests(
+        tmp_path: object, monkeypatch: object, chunk_size: int
+    ) -> None:
+    monkeypatch.chdir(tmp_path) # The T-tests log to the working directory.
+    lethbridge_values, vegreville_values = paired_values(num_bins = 30)
+    lethbridge_file_path = str(tmp_path / "lethbridge.tsv")
+    vegreville_file_path = str(tmp_path / "vegreville.tsv")
+    storage.write_table(bins_df(lethbridge_values), lethbridge_file_path)
+    storage.write_table(bins_df(vegreville_values), vegreville_file_path)
+
+    paired_t_tester.paired_t_tests(
+        lethbridge_file_path, vegreville_file_path,
+        str(tmp_path / "in_memory")
+    )
+    paired_t_tester.streaming_paired_t_tests(
+        lethbridge_file_path, vegreville_file_path,
+        str(tmp_path / "streaming"), chunk_size = chunk_size
+    )
+
+    for output_file_name in (
+            "cross_variety_methylation_ttest.tsv",
+            "within_variety_methylation_ttest.tsv",
+            "global_methylation_ttest.tsv"
+        ):
+        pd.testing.assert_frame_equal(
+            storage.read_table(str(tmp_path / "streaming" / output_file_name)),
+            storage.read_table(str(tmp_path / "in_memory" / output_file_name)),
+            check_exact = False, rtol = 1e-10
+        )
+
+
+@pytest.mark.parametrize("top_k", (None, 3))
+def test_hits_match_full_table(
+        tmp_path: object, monkeypatch: object, top_k: int
+    ) -> None:
+    monkeypatch.chdir(tmp_path)
+    lethbridge_values, vegreville_values = paired_values(num_bins = 30)
+    # Constant nonzero differences: T infinite, p 0, the strongest hit.
+    vegreville_values[11] = lethbridge_values[11] + 0.25
+    lethbridge_file_path = str(tmp_path / "lethbridge.tsv")
+    vegreville_file_path = str(tmp_path / "vegreville.tsv")
+    storage.write_table(bins_df(lethbridge_values), lethbridge_file_path)
+    storage.write_table(bins_df(vegreville_values), vegreville_file_path)
+
+    paired_t_tester.paired_t_tests(
+        lethbridge_file_path, vegreville_file_path, str(tmp_path / "full")
+    )
+    # A budget of a few bins per chunk.
+    paired_t_tester.paired_t_tests(
+        lethbridge_file_path, vegreville_file_path, str(tmp_path / "hits"),
+        memory_budget = 1024, p_threshold = 0.05, top_k = top_k
+    )
+
+    full_df = storage.read_table(
+        str(tmp_path / "full" / "cross_variety_methylation_ttest.tsv")
+    )
+    expected_df = full_df[full_df["P_Value"] <= 0.05]
+    if top_k is not None:
+        expected_df = expected_df.sort_values(
+            "P_Value", kind = "stable"
+        ).iloc[:top_k]
+
+    hits_df = storage.read_table(
+        str(tmp_path / "hits" / "cross_variety_methylation_ttest_hits.tsv")
+    )
+    assert 11 * 100 in hits_df["Bin_Label"].tolist()
+    pd.testing.assert_frame_equal(
+        hits_df, expected_df.reset_index(drop = True)
+    )
+
+
+def test_store_inputs_match_table_inputs(
+        tmp_path: object, monkeypatch: object
+    ) -> None:
+    monkeypatch.chdir(tmp_path)
+    lethbridge_values, vegreville_values = paired_values(num_bins = 20)
+    for extension in ("tsv", "f32"):
+        # Float32 values, as stored; text keeps them to rounding.
+        for location, values in (
+                ("lethbridge.", lethbridge_values),
+                ("vegreville.", vegreville_values)
+            ):
+            storage.write_table(
+                bins_df(values.astype(np.float32)),
+                str(tmp_path / (location + extension)), key_columns = 2
+            )
+
+        paired_t_tester.paired_t_tests(
+            str(tmp_path / ("lethbridge." + extension)),
+            str(tmp_path / ("vegreville." + extension)),
+            str(tmp_path / extension)
+        )
+
+    for output_file_name in (
+            "cross_variety_methylation_ttest.tsv",
+            "within_variety_methylation_ttest.tsv",
+            "global_methylation_ttest.tsv"
+        ):
+        pd.testing.assert_frame_equal(
+            storage.read_table(str(tmp_path / "f32" / output_file_name)),
+            storage.read_table(str(tmp_path / "tsv" / output_file_name)),
+            check_exact = False, rtol = 1e-4, atol = 1e-5
+        )
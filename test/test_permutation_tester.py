@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tests of the batched sign-flip tests against brute-force enumeration and of
+early stopping against the full tests.
+
+"""
+
+import itertools
+
+import numpy as np
+import pytest
+
+from dnam_feature_analysis import permutation_tester
+
+
+def paired_differences(
+        num_rows: int, num_values: int, seed: int = 0
+    ) -> np.ndarray:
+    """
+    (rows x values) paired differences on a grid of exactly representable
+    values, so that permuted statistics tie with the observed ones, shifted
+    so that some rows are significant.
+    """
+    rng = np.random.default_rng(seed)
+    differences = rng.integers(-4, 5, (num_rows, num_values)) / 8
+    differences[:num_rows // 4] += 0.5
+    differences[1] = 0 # Missing or identical at both locations.
+    return differences
+
+
+def brute_force_p_value(differences: np.ndarray) -> float:
+    """
+    Fraction of all sign flips of a row of differences whose statistic
+    reaches the observed one.
+    """
+    observed = abs(differences.sum())
+    flips = list(itertools.product((1, -1), repeat = differences.size))
+    return sum(
+        abs(np.dot(flip, differences)) >= observed for flip in flips
+    ) / len(flips)
+
+
+def test_sign_flips_enumerate_every_flip_once() -> None:
+    signs, exact = permutation_tester.sign_flips(
+        5, 32, np.random.default_rng(0)
+    )
+    assert exact
+    assert (signs[0] == 1).all()
+    assert len({tuple(flip) for flip in signs}) == 32
+
+    signs, exact = permutation_tester.sign_flips(
+        5, 31, np.random.default_rng(0)
+    )
+    assert not exact and signs.shape == (31, 5)
+
+
+@pytest.mark.parametrize("num_values", (1, 4, 10))
+def test_exact_p_values_match_brute_force(num_values: int) -> None:
+    differences = paired_differences(24, num_values)
+    signs, exact = permutation_tester.sign_flips(
+        num_values, 2 ** num_values, np.random.default_rng(0)
+    )
+    p_values, tested = permutation_tester.sign_flip_p_values(
+        differences, signs, exact
+    )
+
+    assert exact and (tested == 2 ** num_values).all()
+    np.testing.assert_allclose(
+        p_values, [brute_force_p_value(row) for row in differences],
+        rtol = 1e-12
+    )
+
+
+@pytest.mark.parametrize(
+    "num_values, permutations", ((11, 2 ** 11), (16, 3000))
+)
+def test_early_stopping_matches_full_test(
+        num_values: int, permutations: int
+    ) -> None:
+    stop_level = permutation_tester.significance_level
+    differences = paired_differences(200, num_values)
+    signs, exact = permutation_tester.sign_flips(
+        num_values, permutations, np.random.default_rng(0)
+    )
+    full_p_values, full_tested = permutation_tester.sign_flip_p_values(
+        differences, signs, exact
+    )
+    p_values, tested = permutation_tester.sign_flip_p_values(
+        differences, signs, exact, stop_level
+    )
+
+    assert (full_tested == signs.shape[0]).all()
+    stopped = tested < signs.shape[0]
+    assert stopped.any() and not stopped.all()
+    # Rows tested on every sign flip keep their p-values.
+    np.testing.assert_array_equal(p_values[~stopped], full_p_values[~stopped])
+    # Rows stopping early are not significant, before or after stopping.
+    assert (full_p_values[stopped] > stop_level).all()
+    assert (p_values[stopped] > stop_level).all()
+    np.testing.assert_array_equal(
+        p_values <= stop_level, full_p_values <= stop_level
+    )
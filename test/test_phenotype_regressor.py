@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tests of the vectorized phenotype regressions against `statsmodels`, bin by
+bin.
+
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+import statsmodels.api as sm
+import statsmodels.formula.api as smf
+
+from dnam_feature_analysis import helpers, phenotype_regressor
+
+num_cultivars = 9
+constant_bin = 2
+zero_bin = 3
+missing_bins = (4, 5) # Some cultivars missing.
+# `smf.ols` of constant methylation warns of its rank-deficient design.
+pytestmark = pytest.mark.filterwarnings("ignore:The design matrix is rank")
+cultivars = [
+    "cultivar_" + str(cultivar_idx) for cultivar_idx in range(num_cultivars)
+]
+
+
+def methylation_values(num_bins: int = 12, seed: int = 0) -> np.ndarray:
+    """
+    (bins x cultivars) delta methylation with constant, all-zero and missing
+    values.
+    """
+    rng = np.random.default_rng(seed)
+    values = rng.normal(0, 0.2, (num_bins, num_cultivars))
+    values[constant_bin] = 0.25
+    values[zero_bin] = 0
+    values[missing_bins[0], [1, 6]] = np.nan
+    values[missing_bins[1], 0] = np.nan
+    return values
+
+
+def phenotype_values(seed: int = 1) -> np.ndarray:
+    """
+    (cultivars x phenotypes) delta phenotypes, the last missing a cultivar.
+    """
+    rng = np.random.default_rng(seed)
+    values = rng.normal(0, 3, (num_cultivars, 3))
+    values[4, 2] = np.nan
+    return values
+
+
+def assert_matches_ols(
+        bin_values: np.ndarray, phenotype: np.ndarray, results: tuple
+    ) -> None:
+    """
+    Compare the simple regression results of one bin with `smf.ols`.
+    """
+    slope, intercept, r_squared, t_stat, p_value, significant, filtered = \
+        results
+    if np.all(bin_values == 0):
+        assert filtered and not significant
+        assert (slope, intercept, r_squared, t_stat, p_value) == (0, 0, 0, 0, 0)
+        return
+
+    assert not filtered
+    model = smf.ols(
+        "delta_phenotype ~ delta_methylation", data = pd.DataFrame({
+            "delta_phenotype": phenotype, "delta_methylation": bin_values
+        })
+    ).fit()
+    valid = ~np.isnan(bin_values) & ~np.isnan(phenotype)
+    if np.ptp(bin_values[valid]) == 0:
+        # Constant methylation has no slope: the model is the mean.
+        assert np.isnan([slope, t_stat, p_value]).all()
+        assert r_squared == 0 and not significant
+        np.testing.assert_allclose(
+            intercept, model.fittedvalues.iloc[0], rtol = 1e-10
+        )
+        return
+
+    np.testing.assert_allclose(
+        [intercept, slope, r_squared, t_stat, p_value],
+        [
+            model.params.iloc[0], model.params.iloc[1], model.rsquared,
+            model.tvalues.iloc[1], model.pvalues.iloc[1]
+        ], rtol = 1e-8
+    )
+    assert significant == helpers.significance(model.pvalues.tolist())
+
+
+def test_regression_matrix_matches_ols() -> None:
+    methylation = methylation_values()
+    phenotypes = phenotype_values()
+    for phenotype_idx in range(phenotypes.shape[1]):
+        results = phenotype_regressor.regression_matrix(
+            methylation, phenotypes[:, phenotype_idx]
+        )
+        for bin_idx in range(methylation.shape[0]):
+            assert_matches_ols(
+                methylation[bin_idx], phenotypes[:, phenotype_idx],
+                tuple(result[bin_idx] for result in results)
+            )
+
+
+def test_phenotypes_regression_matrix_matches_ols() -> None:
+    methylation = methylation_values()
+    phenotypes = phenotype_values()
+    results = phenotype_regressor.phenotypes_regression_matrix(
+        methylation, phenotypes
+    )
+    assert all(
+        result.shape == (methylation.shape[0], phenotypes.shape[1])
+        for result in results
+    )
+    for phenotype_idx in range(phenotypes.shape[1]):
+        for bin_idx in range(methylation.shape[0]):
+            assert_matches_ols(
+                methylation[bin_idx], phenotypes[:, phenotype_idx],
+                tuple(result[bin_idx, phenotype_idx] for result in results)
+            )
+
+
+def covariate_df(seed: int = 2) -> pd.DataFrame:
+    """
+    Covariates of every cultivar, including the phenotype itself.
+    """
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        {
+            "height": rng.normal(0, 1, num_cultivars),
+            "age": rng.normal(10, 2, num_cultivars),
+            "row": rng.integers(1, 4, num_cultivars).astype(float)
+        }, index = cultivars
+    )
+
+
+def test_adjusted_regression_matrix_matches_ols() -> None:
+    covariates = covariate_df()
+    design = phenotype_regressor.covariate_design(
+        covariates, "height", cultivars
+    )
+    assert design.shape == (num_cultivars, 3) # Intercept, age and row.
+    methylation = methylation_values()
+    # Methylation the covariates explain.
+    collinear_bin = methylation.shape[0] - 1
+    methylation[collinear_bin] = 0.1 * covariates["age"].to_numpy() - 1
+    phenotype = phenotype_values()[:, 0]
+    coefficients, standard_errors, r_squared, t_stats, p_values, \
+        significant, filtered = phenotype_regressor.adjusted_regression_matrix(
+            methylation, phenotype, design
+        )
+
+    covariate_model = sm.OLS(phenotype, design).fit()
+    for bin_idx in range(methylation.shape[0]):
+        if bin_idx == zero_bin:
+            assert filtered[bin_idx] and not significant[bin_idx]
+            assert (
+                coefficients[bin_idx], standard_errors[bin_idx],
+                r_squared[bin_idx], t_stats[bin_idx], p_values[bin_idx]
+            ) == (0, 0, 0, 0, 0)
+            continue
+
+        assert not filtered[bin_idx]
+        if bin_idx in (constant_bin, collinear_bin):
+            assert np.isnan([
+                coefficients[bin_idx], standard_errors[bin_idx],
+                t_stats[bin_idx], p_values[bin_idx]
+            ]).all()
+            np.testing.assert_allclose(
+                r_squared[bin_idx], covariate_model.rsquared, rtol = 1e-8
+            )
+            assert not significant[bin_idx]
+            continue
+
+        model = sm.OLS(
+            phenotype, np.column_stack((methylation[bin_idx], design)),
+            missing = "drop"
+        ).fit()
+        np.testing.assert_allclose(
+            [
+                coefficients[bin_idx], standard_errors[bin_idx],
+                r_squared[bin_idx], t_stats[bin_idx], p_values[bin_idx]
+            ],
+            [
+                model.params[0], model.bse[0], model.rsquared,
+                model.tvalues[0], model.pvalues[0]
+            ], rtol = 1e-8
+        )
+        assert significant[bin_idx] == (model.pvalues[0] <= 0.05)
+
+
+def test_covariate_design_rejects_missing_cultivars() -> None:
+    with pytest.raises(ValueError, match = "cultivar_9"):
+        phenotype_regressor.covariate_design(
+            covariate_df(), "height", cultivars + ["cultivar_9"]
+        )
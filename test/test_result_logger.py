@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tests of the per-bin records written by result loggers.
+
+"""
+
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from dnam_feature_analysis import result_logger
+
+
+def reject_constant(constant: str) -> None:
+    """
+    Strict JSON: NaN, Infinity and -Infinity are not JSON values.
+    """
+    raise ValueError(constant)
+
+
+@pytest.mark.parametrize("log_level", result_logger.log_levels)
+def test_records_are_strict_json(tmp_path: object, log_level: str) -> None:
+    logger = result_logger.open_logger(
+        str(tmp_path / "ttest_stdout.txt"), log_level, str(tmp_path),
+        "ttest.tsv"
+    )
+    logger.record_df(pd.DataFrame({
+        "#Scaffold": ["scaffold_1", "scaffold_1", "scaffold_2"],
+        "Bin_Label": np.array([200, 600, 200], dtype = np.int64),
+        "T_Statistic": [np.inf, -np.inf, 1.5],
+        "P_Value": np.array([0, np.nan, 0.25], dtype = np.float32),
+        "Significant?": [True, False, False]
+    }))
+    logger.record({
+        "#Scaffold": "scaffold_3", "T_Statistic": np.float64(np.nan)
+    })
+    logger.close()
+
+    with open(tmp_path / "ttest_records.jsonl") as record_file:
+        records = [
+            json.loads(line, parse_constant = reject_constant)
+            for line in record_file
+        ]
+
+    assert [record["T_Statistic"] for record in records] == [
+        None, None, 1.5, None
+    ]
+    assert [record.get("P_Value") for record in records] == [
+        0, None, 0.25, None
+    ]
+    assert records[0] == {
+        "#Scaffold": "scaffold_1", "Bin_Label": 200, "T_Statistic": None,
+        "P_Value": 0.0, "Significant?": True
+    }
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tests of handing tables to worker processes through shared memory.
+
+"""
+
+import multiprocessing
+import os
+import pickle
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from dnam_feature_analysis import shared_arrays
+
+package_dir_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+attach_script = """
+import pickle, sys
+import numpy as np
+shared_input = pickle.load(sys.stdin.buffer)
+print(np.nansum(shared_input.attach().iloc[:, 2:].to_numpy()))
+"""
+
+
+def bins_df() -> pd.DataFrame:
+    """
+    Bin methylation table with text and integer keys.
+    """
+    return pd.DataFrame({
+        "#Scaffold": ["scaffold_1", "scaffold_1", "scaffold_2"],
+        "Bin_Label": [200, 600, 200], "cultivar_1": [0.1, 0.2, 0.3],
+        "cultivar_2": [0.4, np.nan, 0.6]
+    })
+
+
+def attached_df(shared_input: shared_arrays.SharedTable) -> pd.DataFrame:
+    """
+    Worker: a copy of an attached shared table.
+    """
+    return shared_input.attach().copy()
+
+
+@pytest.mark.parametrize("start_method", ("fork", "spawn"))
+def test_workers_attach_shared_tables(
+        capfd: object, start_method: str
+    ) -> None:
+    shared_input = shared_arrays.SharedTable(bins_df(), 2)
+    try:
+        with multiprocessing.get_context(start_method).Pool(2) as pool:
+            worker_dfs = pool.map(attached_df, [shared_input] * 4)
+
+    finally:
+        shared_input.unlink()
+
+    for worker_df in worker_dfs:
+        pd.testing.assert_frame_equal(worker_df, bins_df())
+
+    # Workers never unregister the segments from the shared tracker.
+    assert "Traceback" not in capfd.readouterr().err
+
+
+def test_processes_with_their_own_tracker_leave_segments_shared() -> None:
+    shared_input = shared_arrays.SharedTable(bins_df(), 2)
+    try:
+        # Processes not started by `multiprocessing` run their own resource
+        # tracker. The segments outlive the first process.
+        for process_idx in range(2):
+            attach_process = subprocess.run(
+                [sys.executable, "-c", attach_script],
+                input = pickle.dumps(shared_input), capture_output = True,
+                cwd = package_dir_path
+            )
+            assert attach_process.returncode == 0
+            assert float(attach_process.stdout) == pytest.approx(1.6)
+            assert b"leaked" not in attach_process.stderr
+
+    finally:
+        shared_input.unlink()
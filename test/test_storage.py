@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tests of writing and reading tables in every storage format, whole and in
+chunks.
+
+"""
+
+import os
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from dnam_feature_analysis import matrix_store, storage
+
+
+def methylation_df(num_bins: int = 11) -> pd.DataFrame:
+    """
+    Bin methylation table with scaffold names of growing width and missing
+    values, exactly representable as float32.
+    """
+    rng = np.random.default_rng(0)
+    values = rng.integers(0, 256, (num_bins, 3)) / 256
+    values[2, 1] = np.nan
+    return pd.concat(
+        [
+            pd.DataFrame({
+                "#Scaffold": [
+                    "scaffold_" + str(10 ** (bin_idx // 4))
+                    for bin_idx in range(num_bins)
+                ],
+                "Bin_Label": np.arange(num_bins) * 400 + 200
+            }),
+            pd.DataFrame(
+                values, columns = ["cultivar_1", "cultivar_2", "cultivar_3"]
+            )
+        ], axis = 1
+    )
+
+
+def skip_without_pyarrow(storage_format: str) -> None:
+    """
+    Skip a test of the Arrow formats when `pyarrow` is not installed.
+    """
+    if storage_format in ("feather", "parquet"):
+        pytest.importorskip("pyarrow")
+
+
+def expected_df(input_df: pd.DataFrame, storage_format: str) -> pd.DataFrame:
+    """
+    A table as read back: matrix stores hold float32 values.
+    """
+    if storage_format == "f32":
+        return input_df.astype({
+            column: np.float32 for column in input_df.columns[2:]
+        })
+
+    return input_df
+
+
+@pytest.mark.parametrize("storage_format", storage.storage_formats)
+def test_tables_round_trip(tmp_path: object, storage_format: str) -> None:
+    skip_without_pyarrow(storage_format)
+    input_df = methylation_df()
+    file_path = str(tmp_path / storage.output_file_name(
+        "methylation_bins.tsv", storage_format
+    ))
+    storage.write_table(input_df, file_path, key_columns = 2)
+
+    pd.testing.assert_frame_equal(
+        storage.read_table(file_path), expected_df(input_df, storage_format),
+        check_dtype = storage_format != "tsv"
+    )
+    pd.testing.assert_frame_equal(
+        storage.read_table(file_path, usecols = ["Bin_Label", "cultivar_2"]),
+        expected_df(input_df, storage_format)[["Bin_Label", "cultivar_2"]],
+        check_dtype = storage_format != "tsv"
+    )
+
+
+@pytest.mark.parametrize("storage_format", storage.storage_formats)
+@pytest.mark.parametrize("chunk_size", (1, 4, 11))
+def test_chunked_tables_match_whole_tables(
+        tmp_path: object, storage_format: str, chunk_size: int
+    ) -> None:
+    skip_without_pyarrow(storage_format)
+    input_df = methylation_df()
+    file_path = str(tmp_path / storage.output_file_name(
+        "methylation_bins.tsv", storage_format
+    ))
+    table_writer = storage.TableWriter(file_path, key_columns = 2)
+    for chunk_start in range(0, input_df.shape[0], chunk_size):
+        table_writer.write(input_df.iloc[chunk_start:chunk_start + chunk_size])
+
+    table_writer.close()
+
+    pd.testing.assert_frame_equal(
+        storage.read_table(file_path), expected_df(input_df, storage_format),
+        check_dtype = storage_format != "tsv"
+    )
+    # Only the Arrow formats are read whole.
+    with warnings.catch_warnings(record = True) as caught_warnings:
+        warnings.simplefilter("always")
+        chunk_dfs = list(storage.read_table_chunks(file_path, 3))
+
+    assert len(caught_warnings) == (
+        storage_format in ("feather", "parquet")
+    )
+    assert [chunk_df.shape[0] for chunk_df in chunk_dfs] == [3, 3, 3, 2]
+    pd.testing.assert_frame_equal(
+        pd.concat(chunk_dfs), expected_df(input_df, storage_format),
+        check_dtype = storage_format != "tsv"
+    )
+
+
+def test_matrix_writer_joins_shards(tmp_path: object) -> None:
+    input_df = methylation_df()
+    store_path = str(tmp_path / "methylation_bins.f32")
+    matrix_writer = matrix_store.MatrixWriter(store_path, key_columns = 2)
+    for chunk_start in range(0, input_df.shape[0], 4):
+        matrix_writer.write(input_df.iloc[chunk_start:chunk_start + 4])
+
+    matrix_writer.close()
+
+    # Only the joined arrays are left, text keys as wide as the widest shard.
+    assert sorted(os.listdir(store_path)) == [
+        "columns.npy", "key_0.npy", "key_1.npy", "values.npy"
+    ]
+    scaffolds = np.load(store_path + "/key_0.npy")
+    assert scaffolds.dtype == np.dtype("<U12")
+    assert scaffolds.tolist() == input_df["#Scaffold"].tolist()
+    values = matrix_store.open_values(store_path)
+    assert values.dtype == np.float32 and not values.flags.writeable
+    np.testing.assert_array_equal(values, input_df.iloc[:, 2:].to_numpy())
+    assert matrix_store.read_columns(store_path) == input_df.columns.tolist()
+